@@ -0,0 +1,100 @@
+# Measures how many samples per second Monitor gets out of each channel,
+# using the simulated devices. Run from the repository root:
+#
+#     python -m benchmarks.monitor_throughput [config.json] [--duration 10]
+#
+# --wavemeters N copies the channels of the config onto N simulated wave
+# meters, measured in parallel. --record session.wms records the run, for
+# benchmarks.session_replay.
+
+import sys
+import time
+import argparse
+from collections import Counter
+
+from wavemeter_dashboard import config
+from wavemeter_dashboard.controller.monitor_group import (
+    MonitorGroup, create_monitor)
+from wavemeter_dashboard.controller.channel_scheduler import SCHEDULERS
+from wavemeter_dashboard.controller.session import SessionRecorder
+from wavemeter_dashboard.model.channel_model import ChannelModel
+
+
+def copy_onto_wavemeters(wavemeters):
+    channels = config.config.get("channels", [])
+    config.config.set("wavemeters", [{"channel_offset": 16 * i}
+                                     for i in range(wavemeters)])
+    config.config.set("channels", [
+        dict(chan, channel_num=chan["channel_num"] + 16 * i)
+        for i in range(wavemeters) for chan in channels])
+
+
+def run(duration, record=None):
+    config.config.set("monitor_in_subprocess", False)
+    monitor = create_monitor(simulate=True)
+    members = monitor.monitors if isinstance(monitor, MonitorGroup) else [monitor]
+
+    recorder = SessionRecorder(record) if record else None
+    for chan in config.config.get("channels", []):
+        channel = monitor.add_channel(ChannelModel.from_settings_dict(chan))
+        if recorder:
+            recorder.add_channel(channel)
+
+    # a visit can take more than one sample (dwell), the history has them all
+    before = {num: channel.history.total
+              for num, channel in monitor.channels.items()}
+
+    start = time.time()
+    monitor.start_monitoring()
+    time.sleep(duration)
+    monitor.stop_monitoring()
+    elapsed = time.time() - start
+
+    samples = Counter({num: channel.history.total - before[num]
+                       for num, channel in monitor.channels.items()})
+    if recorder:
+        recorder.close()
+
+    total = 0
+    print(f"{'CHANNEL':>8} {'SAMPLES':>8} {'RATE (1/s)':>11} {'SCHEDULER (1/s)':>16}")
+    for num, channel in monitor.channels.items():
+        if not channel.monitor_enabled:
+            continue
+        total += samples[num]
+        print(f"{num:>8} {samples[num]:>8} {samples[num] / elapsed:>11.2f} "
+              f"{channel.sample_rate:>16.2f}")
+    print(f"{'TOTAL':>8} {total:>8} {total / elapsed:>11.2f}")
+
+    if members[0].profiler.enabled:
+        print("\nWHERE THE TIME WENT")
+        print(monitor.get_latency_report())
+
+    if members[0].settle_time_learner:
+        print("\nLEARNED SETTLE TIME (channel, expo, expo2): seconds")
+        for member in members:
+            for key, estimate in member.settle_time_learner.estimates.items():
+                print(f"  {key}: {estimate:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", nargs="?", default="config.json")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--acquisition-mode", choices=["poll", "event"])
+    parser.add_argument("--scheduler", choices=list(SCHEDULERS.keys()))
+    parser.add_argument("--wavemeters", type=int, default=1)
+    parser.add_argument("--switcher", choices=["fiber", "internal"])
+    parser.add_argument("--record")
+    args = parser.parse_args()
+
+    config.config.load_config(args.config)
+    if args.acquisition_mode:
+        config.config.set("acquisition_mode", args.acquisition_mode)
+    if args.scheduler:
+        config.config.set("channel_scheduler", args.scheduler)
+    if args.switcher:
+        config.config.set("switcher", args.switcher)
+    if args.wavemeters > 1:
+        copy_onto_wavemeters(args.wavemeters)
+    run(args.duration, args.record)
+    sys.exit(0)
@@ -0,0 +1,105 @@
+# Compares the memory allocated per interference pattern read, between a new
+# ctypes array for every read (how WavemeterWS7 used to do it) and
+# PatternBufferPool. GetPatternData is stood in for by a memmove, so this runs
+# without the dll. Run from the repository root:
+#
+#     python -m benchmarks.pattern_allocation [--reads 10000] [--length 2048]
+
+import gc
+import sys
+import time
+import argparse
+import tracemalloc
+from ctypes import c_ushort, c_ulong, POINTER, cast, memmove
+
+import numpy as np
+
+from wavemeter_dashboard.controller.wavemeter_ws7 import PatternBufferPool
+
+
+def make_get_pattern_data(length):
+    source = (np.arange(length) % 4096).astype(np.ushort)
+
+    def get_pattern_data(pointer):
+        memmove(pointer, source.ctypes.data, source.nbytes)
+        return 2
+
+    return get_pattern_data
+
+
+def read_fresh(get_pattern_data, length):
+    patterns = (c_ushort * length)()
+    get_pattern_data(cast(patterns, POINTER(c_ulong)))
+    return np.frombuffer(patterns, dtype=np.ushort)
+
+
+def make_read_pooled(pool):
+    def read_pooled(get_pattern_data, length):
+        buffer = pool.acquire(length)
+        get_pattern_data(buffer.ctypes.data_as(POINTER(c_ulong)))
+        return pool.view(buffer)
+
+    return read_pooled
+
+
+def read_all(read, reads, length, pool=None, on_read=None):
+    get_pattern_data = make_get_pattern_data(length)
+    shown = None  # like ChannelModel.wide_pattern_data
+
+    for _ in range(reads):
+        pattern = read(get_pattern_data, length)
+        if on_read:
+            on_read()
+
+        # Monitor replaces the shown pattern, the buffer is reused once the
+        # name lets go of it
+        if pool:
+            pool.retire(shown)
+        shown = pattern
+
+
+def run(read, reads, length, pool=None):
+    # bytes allocated per read, from the peak of the traced memory during it
+    allocated = 0
+
+    def on_read():
+        nonlocal allocated
+        current, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before[0]
+        tracemalloc.reset_peak()
+        before[0] = current
+
+    tracemalloc.start()
+    before = [tracemalloc.get_traced_memory()[0]]
+    read_all(read, reads, length, pool, on_read)
+    tracemalloc.stop()
+
+    # timed separately, tracemalloc slows everything down
+    gc.collect()
+    collections = sum(stat['collections'] for stat in gc.get_stats())
+    start = time.perf_counter()
+    read_all(read, reads, length, pool)
+    elapsed = time.perf_counter() - start
+    collections = sum(stat['collections'] for stat in gc.get_stats()) - collections
+
+    return allocated / reads, collections, reads / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reads", type=int, default=10000)
+    parser.add_argument("--length", type=int, default=2048)
+    args = parser.parse_args()
+
+    pool = PatternBufferPool()
+    results = [
+        ("ctypes array", run(read_fresh, args.reads, args.length)),
+        ("buffer pool", run(make_read_pooled(pool), args.reads, args.length, pool)),
+    ]
+
+    print(f"{'':>14} {'BYTES/READ':>11} {'GC RUNS':>8} {'READS/s':>10}")
+    for name, (per_read, collections, rate) in results:
+        print(f"{name:>14} {per_read:>11.0f} {collections:>8} {rate:>10.0f}")
+    print(f"\nbuffers allocated by the pool: {pool.allocations}, "
+          f"reused: {pool.reuses}")
+    sys.exit(0)
@@ -0,0 +1,83 @@
+# Plays a recorded session into the channels and AlertTracker, without the
+# screen, and measures how fast they keep up. Run from the repository root:
+#
+#     python -m benchmarks.session_replay session.wms [config.json] [--speed 100]
+#
+# Sessions are recorded with "session_record_path" in the config, or with
+# python -m benchmarks.monitor_throughput --record session.wms.
+
+import sys
+import time
+import argparse
+from collections import Counter
+
+from PyQt5.QtCore import QCoreApplication
+
+from wavemeter_dashboard import config
+from wavemeter_dashboard.controller.alert_tracker import AlertTracker
+from wavemeter_dashboard.controller.session import (
+    SessionReplay, read_session)
+from wavemeter_dashboard.model.channel_model import ChannelModel
+
+
+def run(path, speed):
+    app = QCoreApplication([])
+
+    # the channels of the session, with the settings of the config if there
+    channels = {}
+    for chan in config.config.get("channels", []):
+        channel = ChannelModel.from_settings_dict(chan)
+        channels[channel.channel_num] = channel
+
+    frames = Counter()
+    session_start = session_end = None
+    for header, _ in read_session(path):
+        num = int(header['channel'])
+        frames[num] += 1
+        if num not in channels:
+            channels[num] = ChannelModel(num)
+        if session_start is None:
+            session_start = header['time']
+        session_end = header['time']
+
+    if session_start is None:
+        print("The session is empty.")
+        return
+
+    alert_tracker = AlertTracker()
+    for channel in channels.values():
+        alert_tracker.add_channel(channel)
+
+    replay = SessionReplay(path, channels, speed)
+    replay.on_replay_finished.connect(app.quit)
+
+    start = time.time()
+    replay.start()
+    app.exec_()
+    # what the replay queued for AlertTracker
+    app.processEvents()
+    elapsed = time.time() - start
+
+    samples = Counter({num: channel.history.total
+                       for num, channel in channels.items()})
+    print(f"SESSION {session_end - session_start:.1f} s, "
+          f"PLAYED IN {elapsed:.1f} s ({speed:g}x asked)")
+    print(f"{'CHANNEL':>8} {'FRAMES':>8} {'SAMPLES':>8} {'RATE (1/s)':>11}")
+    for num in sorted(frames):
+        print(f"{num:>8} {frames[num]:>8} {samples[num]:>8} "
+              f"{samples[num] / elapsed:>11.2f}")
+    total = sum(frames.values())
+    print(f"{'TOTAL':>8} {total:>8} {sum(samples.values()):>8} "
+          f"{sum(samples.values()) / elapsed:>11.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("session")
+    parser.add_argument("config", nargs="?", default="config.json")
+    parser.add_argument("--speed", type=float, default=100)
+    args = parser.parse_args()
+
+    config.config.load_config(args.config)
+    run(args.session, args.speed)
+    sys.exit(0)
@@ -1,19 +1,27 @@
 # This Python file uses the following encoding: utf-8
 import sys
 import os
+import argparse
 from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox
 from PyQt5.QtCore import Qt, QCoreApplication
 
 from wavemeter_dashboard.controller.alert_tracker import AlertTracker
-from wavemeter_dashboard.controller.monitor import Monitor
-from wavemeter_dashboard.controller.wavemeter_ws7 import WavemeterWS7
-from wavemeter_dashboard.controller.fiber_switch import FiberSwitch
-from wavemeter_dashboard.controller.arduino_dac import DAC
+from wavemeter_dashboard.controller.monitor_group import create_monitor
 from wavemeter_dashboard.util import solve_filepath
 from wavemeter_dashboard import config
 from wavemeter_dashboard.view.main_window import MainWindow
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # runs without the lab devices, overriding "simulate_devices" in the
+    # config
+    parser.add_argument("--simulate", action="store_true")
+    # plays a recorded session instead, with the devices simulated and the
+    # monitor left stopped
+    parser.add_argument("--replay", metavar="SESSION")
+    parser.add_argument("--speed", type=float, default=1)
+    args = parser.parse_args()
+
     QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
     app = QApplication([])
 
@@ -27,20 +35,13 @@ if __name__ == "__main__":
                              f"{config_path}.")
         exit(1)
 
-    assert config.config.has("fiberswitch_com_port")
-    assert config.config.has("dac_com_port")
-    fbs_port = config.config.get("fiberswitch_com_port")
-    dac_port = config.config.get("dac_com_port")
-
-    wm = WavemeterWS7()
-    fs = FiberSwitch(fbs_port)
-    dac = DAC(dac_port)
+    # None leaves it to the config
+    simulate = True if args.simulate or args.replay else None
 
-    # wm = None
-    # fs = None
-    # dac = None
+    # one monitor per wave meter, in child processes if configured
+    monitor = create_monitor(simulate)
+    app.aboutToQuit.connect(monitor.close)
 
-    monitor = Monitor(wm, fs, dac)
     alert_tracker = AlertTracker()
 
     window = MainWindow(monitor, alert_tracker)
@@ -52,4 +53,9 @@ if __name__ == "__main__":
 
     window.switch_to_dashboard()
 
+    if window.session_recorder:
+        app.aboutToQuit.connect(window.session_recorder.close)
+    if args.replay:
+        window.start_replay(args.replay, args.speed)
+
     sys.exit(app.exec_())
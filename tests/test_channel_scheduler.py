@@ -0,0 +1,62 @@
+from collections import deque
+
+from wavemeter_dashboard.controller.channel_scheduler import (
+    RoundRobinScheduler, DeadlineScheduler)
+from wavemeter_dashboard.model.channel_alert import ChannelAlertCode
+from wavemeter_dashboard.model.channel_model import ChannelModel
+
+
+def test_round_robin_goes_through_all_channels():
+    channels = [ChannelModel(num) for num in (1, 2, 3)]
+    scheduler = RoundRobinScheduler()
+
+    current = None
+    visited = []
+    for _ in range(4):
+        current = scheduler.next_channel(channels, current)
+        visited.append(current.channel_num)
+    assert visited == [1, 2, 3, 1]
+
+
+def test_sample_rate():
+    channel = ChannelModel(1)
+    scheduler = RoundRobinScheduler()
+    assert scheduler.get_sample_rate(1) == 0
+
+    scheduler.sample_times[1] = deque([0.0, 0.5, 1.0])
+    assert scheduler.get_sample_rate(1) == 2
+    scheduler.on_channel_visited(channel, 0)
+    assert 1 in scheduler.last_visit
+
+
+def test_alerting_channel_goes_first():
+    quiet, railed = ChannelModel(1), ChannelModel(2)
+    railed.total_alerts.append(ChannelAlertCode.PID_DAC_RAILED)
+    scheduler = DeadlineScheduler()
+    scheduler.on_channel_visited(quiet)
+    scheduler.on_channel_visited(railed)
+
+    assert scheduler.get_interval_and_weight(railed) == \
+        (scheduler.urgent_interval, 4)
+    scheduler.last_visit = {1: 0, 2: 0}
+    assert scheduler.next_channel([quiet, railed]) is railed
+
+
+def test_no_signal_backs_off():
+    channel = ChannelModel(1)
+    channel.total_alerts.append(ChannelAlertCode.WAVEMETER_NO_SIGNAL)
+    scheduler = DeadlineScheduler()
+
+    intervals = []
+    for _ in range(6):
+        intervals.append(scheduler.get_interval_and_weight(channel)[0])
+        scheduler.on_channel_visited(channel, 0)
+
+    urgent = scheduler.urgent_interval
+    assert intervals[:3] == [urgent, 2 * urgent, 4 * urgent]
+    assert max(intervals) == scheduler.quiet_interval
+    assert intervals == sorted(intervals)
+
+    # a sample ends the back-off
+    scheduler.on_channel_visited(channel, 1)
+    assert scheduler.get_interval_and_weight(channel)[0] == urgent
@@ -0,0 +1,67 @@
+import numpy as np
+
+from wavemeter_dashboard.model.compact_history import (
+    CompactEncoder, CompactChunk, decode)
+from wavemeter_dashboard.model.longterm_data import ChannelHistory
+
+
+def make_records(n, start=1.7e9, setpoint=4.3e14):
+    rng = np.random.default_rng(0)
+    records = np.zeros(n, dtype=ChannelHistory.DTYPE)
+    records['time'] = start + np.cumsum(rng.uniform(0.01, 0.5, n))
+    records['frequency'] = setpoint + rng.normal(0, 1e6, n)
+    records['error'] = records['frequency'] - setpoint
+    records['dac'] = rng.uniform(0, 5, n)
+    records['flags'] = rng.integers(0, 2, n)
+    return records
+
+
+def assert_close(decoded, records):
+    assert np.allclose(decoded['time'], records['time'], rtol=0, atol=1e-6)
+    assert np.allclose(decoded['frequency'], records['frequency'], rtol=0,
+                       atol=1, equal_nan=True)
+    assert np.allclose(decoded['error'], records['error'], rtol=0, atol=2,
+                       equal_nan=True)
+    assert np.array_equal(decoded['dac'].astype('f4'),
+                          records['dac'].astype('f4'), equal_nan=True)
+    assert np.array_equal(decoded['flags'], records['flags'])
+
+
+def test_roundtrip_in_pieces():
+    records = make_records(1000)
+    encoder = CompactEncoder()
+    segments, packed = [], []
+    for piece in np.array_split(records, [1, 2, 300, 301, 999]):
+        s, p = encoder.encode(piece)
+        segments.append(s)
+        packed.append(p)
+
+    segments = np.concatenate(segments)
+    packed = np.concatenate(packed)
+    assert packed.itemsize == 13
+    # nothing changed, one segment
+    assert len(segments) == 1
+    assert_close(decode(segments, packed), records)
+
+
+def test_new_segments():
+    records = make_records(10)
+    records['frequency'][3:] += 1e9  # a jump
+    records['error'][3:] = records['frequency'][3:] - 4.3e14
+    records['error'][6:] -= 5e6  # a new setpoint
+    records['frequency'][8] = records['error'][8] = np.nan  # a DAC output
+    records['error'][9] = np.nan  # no setpoint
+    records['time'][9] += 1e4  # a gap longer than a uint32 of us
+
+    segments, packed = CompactEncoder().encode(records)
+    # the DAC output has no setpoint either
+    assert segments['index'].tolist() == [0, 3, 6, 8, 9]
+    assert_close(decode(segments, packed), records)
+
+
+def test_chunk():
+    records = make_records(100)
+    chunk = CompactChunk(records)
+    assert chunk.nbytes < records.nbytes / 2
+    assert chunk.last['time'] == records['time'][-1]
+    assert_close(chunk.decode(), records)
@@ -0,0 +1,130 @@
+import time
+from threading import Thread
+
+import pytest
+
+from wavemeter_dashboard.controller.arduino_dac import (
+    DAC, DACWorker, DACOutOfBoundException, DACTimeoutException)
+from wavemeter_dashboard.controller.arduino_dac import dac as dac_module
+from wavemeter_dashboard.controller.arduino_dac.simulated_dac import (
+    SimulatedDAC)
+
+
+class CountingDAC(SimulatedDAC):
+    # counts the values asked from the device, and the serial writes
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.queries = 0
+        self.writes = 0
+
+    def query(self, qry):
+        self.queries += 1
+        return super().query(qry)
+
+    def write(self, w):
+        self.writes += 1
+        super().write(w)
+
+
+def test_values_go_out_in_one_write():
+    dac = CountingDAC()
+    railed = dac.set_dac_values({1: 100, 2: 70000, 3: -5})
+    assert dac.writes == 1
+    assert sorted(railed) == [2, 3]
+    assert [dac.values[ch] for ch in (1, 2, 3)] == [100, dac.DAC_MAX,
+                                                    dac.DAC_MIN]
+
+
+def test_without_shadow_register_the_device_is_asked():
+    dac = CountingDAC()
+    dac.set_dac_value(1, 1000)
+    assert dac.get_shadow_value(1) is None
+    assert dac.get_dac_value(1) == 1000
+    assert dac.queries == 1
+
+
+def test_shadow_register():
+    dac = CountingDAC(shadow_register=True)
+    dac.set_dac_value(1, 1000.7)
+    dac.set_dac_values({2: 2000, 3: 70000})
+    with pytest.raises(DACOutOfBoundException):
+        dac.set_dac_value(4, -1)
+    dac.reset_dac(5)
+
+    # the Arduino keeps integers
+    assert [dac.get_dac_value(ch) for ch in range(1, 6)] == [
+        1000, 2000, dac.DAC_MAX, dac.DAC_MIN, 32000]
+    assert dac.queries == 0
+
+    # read from the hardware, then kept
+    assert dac.read_dac_value(1) == 1000
+    dac.get_dac_value(1)
+    assert dac.queries == 1
+
+
+def test_shadow_register_is_refreshed():
+    dac = CountingDAC(shadow_register=True, refresh_interval=0.05)
+    dac.set_dac_value(1, 1000)
+    dac.values[1] = 1234  # moved behind our back
+    assert dac.get_dac_value(1) == 1000
+
+    time.sleep(0.06)
+    assert dac.get_dac_value(1) == 1234
+    assert dac.queries == 1
+    # writes don't count as a refresh
+    dac.set_dac_value(1, 1000)
+    time.sleep(0.06)
+    dac.get_dac_value(1)
+    assert dac.queries == 2
+
+
+def test_worker_reads_the_device_once():
+    dac = CountingDAC()
+    results = []
+    worker = DACWorker(dac, lambda *result: results.append(result))
+
+    assert worker.get_dac_value(3) == 32000
+    assert worker.get_dac_value(3) == 32000
+    assert dac.queries == 1
+
+    worker.set_dac_value(3, 70000)
+    worker.set_dac_value(4, 1000)
+    assert worker.flush(1)
+    assert sorted(results) == [(3, True, None, 70000), (4, False, None, 1000)]
+    assert worker.get_dac_value(3) == dac.DAC_MAX
+    assert worker.get_dac_value(4) == 1000
+    assert dac.queries == 1  # channel 4 was written before it was asked for
+    worker.close()
+
+
+def test_worker_reads_without_waiting_for_a_write():
+    dac = CountingDAC()
+    worker = DACWorker(dac)
+    worker.get_dac_value(3)
+    worker.set_dac_value(3, 1000)
+    worker.flush(1)
+
+    # a write stuck on the serial port
+    with worker._io_lock:
+        read = Thread(target=lambda: results.append(worker.get_dac_value(3)))
+        results = []
+        read.start()
+        read.join(1)
+        assert results == [1000]
+    worker.close()
+
+
+def test_missing_answer_times_out(monkeypatch):
+    class SilentSerial:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def write(self, data):
+            pass
+
+        def readline(self):
+            return b"12"  # cut short by the read timeout
+
+    monkeypatch.setattr(dac_module, 'Serial', SilentSerial)
+    with pytest.raises(DACTimeoutException):
+        DAC("COM1").get_dac_value(1)
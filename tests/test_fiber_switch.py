@@ -0,0 +1,69 @@
+import pytest
+
+from wavemeter_dashboard.controller.fiber_switch import (
+    FiberSwitch, FiberSwitchMismatchException, FiberSwitchTimeoutException,
+    fiberswitch)
+
+
+class FakeSerial:
+    # answers "ch?" with the channel it's on, or with `answer` if set. Lines
+    # without a newline are what a read timing out returns.
+    def __init__(self, *args, **kwargs):
+        self.channel = 1
+        self.answer = None
+        self.lines = []
+        self.written = []
+
+    def write(self, data):
+        for line in data.decode().split("\r\n"):
+            if not line:
+                continue
+            self.written.append(line)
+            if line == "firmware?":
+                self.lines.append(b"1.0\n")
+            elif line == "ch?":
+                self.lines.append(self.answer or f"{self.channel}\n".encode())
+            elif line.startswith("ch"):
+                self.channel = int(line[2:])
+
+    def readline(self):
+        return self.lines.pop(0) if self.lines else b""
+
+
+@pytest.fixture
+def switch(monkeypatch):
+    monkeypatch.setattr(fiberswitch, 'Serial', FakeSerial)
+    return FiberSwitch("COM1")
+
+
+def test_switch_is_read_back(switch):
+    switch.switch_channel(3)
+    assert switch.serial.channel == 3
+    assert switch.pending_channel is None
+
+    switch.serial.answer = b"4\n"
+    with pytest.raises(FiberSwitchMismatchException):
+        switch.switch_channel(5)
+
+
+def test_read_back_later(switch):
+    switch.switch_channel(3, verify=False)
+    # asked for in the same write, not read yet
+    assert switch.serial.written[-2:] == ["ch3", "ch?"]
+    assert switch.pending_channel == 3
+    switch.verify_switch()
+    assert not switch.serial.lines
+    switch.verify_switch()  # nothing pending
+
+    # the next switch doesn't leave an answer in the buffer either
+    switch.switch_channel(4, verify=False)
+    switch.switch_channel(5)
+    assert not switch.serial.lines
+
+
+def test_missing_answer_times_out(switch):
+    switch.serial.answer = b"3"  # cut short by the read timeout
+    with pytest.raises(FiberSwitchTimeoutException):
+        switch.switch_channel(3)
+    # not read back again
+    switch.verify_switch()
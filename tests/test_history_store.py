@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import pytest
+
+from wavemeter_dashboard.model import history_store
+from wavemeter_dashboard.model.history_store import HistoryStore
+from wavemeter_dashboard.model.longterm_data import ChannelHistory
+
+DAY = HistoryStore.SECONDS_PER_DAY
+MIDNIGHT = 19844 * DAY  # 2024-05-01
+
+
+def make_records(times):
+    records = np.zeros(len(times), dtype=ChannelHistory.DTYPE)
+    records['time'] = times
+    records['frequency'] = 4e14 + np.arange(len(times)) * 1e3
+    records['error'] = records['frequency'] - 4e14
+    records['dac'] = np.nan
+    return records
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_append_and_read_across_midnight(tmp_path, compact):
+    store = HistoryStore(str(tmp_path), sync_interval=0, compact=compact)
+    records = make_records(MIDNIGHT + np.arange(-5.0, 5.0))
+    store.append(9, records[:3])
+    store.append(9, records[3:])
+    store.close()
+
+    store = HistoryStore(str(tmp_path), sync_interval=0)
+    assert store.channels() == [9]
+    assert store.days(9) == [MIDNIGHT // DAY - 1, MIDNIGHT // DAY]
+
+    read = store.read(9)
+    assert np.allclose(read['time'], records['time'], atol=1e-6)
+    assert np.allclose(read['frequency'], records['frequency'], atol=1)
+    assert np.allclose(read['error'], records['error'], atol=1)
+
+    read = store.read(9, MIDNIGHT - 1, MIDNIGHT + 1)
+    assert np.allclose(read['time'], [MIDNIGHT - 1, MIDNIGHT, MIDNIGHT + 1])
+    assert len(store.read_recent(9, 4)) == 4
+
+
+def test_half_record_after_a_crash_is_dropped(tmp_path):
+    store = HistoryStore(str(tmp_path), sync_interval=0)
+    store.append(9, make_records([MIDNIGHT + 1, MIDNIGHT + 2]))
+    store.close()
+
+    path = store._path(9, MIDNIGHT // DAY)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert len(store.read(9)) == 2
+
+    store = HistoryStore(str(tmp_path), sync_interval=0)
+    store.append(9, make_records([MIDNIGHT + 3]))
+    store.close()
+    assert store.read(9)['time'].tolist() == [MIDNIGHT + 1, MIDNIGHT + 2,
+                                              MIDNIGHT + 3]
+
+
+def test_day_is_synced_before_it_is_closed(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(history_store.os, 'fsync',
+                        lambda fd: synced.append(os.fstat(fd).st_size))
+
+    store = HistoryStore(str(tmp_path), sync_interval=0)
+    store.append(9, make_records([MIDNIGHT - 1]))
+    # the sync thread would take the file now, and fsync it after the
+    # rollover below has closed it
+    store.append(9, make_records([MIDNIGHT + 1]))
+    assert synced == [ChannelHistory.DTYPE.itemsize]
+
+    store.close()
+    assert len(synced) == 2
+
+
+def test_preload(tmp_path):
+    store = HistoryStore(str(tmp_path), sync_interval=0)
+    store.append(9, make_records(MIDNIGHT + np.arange(10.0)))
+    store.close()
+
+    history = ChannelHistory()
+    store.preload(9, history)
+    assert len(history) == 10
+    assert history.tail(1)['time'][0] == MIDNIGHT + 9
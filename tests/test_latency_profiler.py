@@ -0,0 +1,57 @@
+import csv
+import io
+
+import pytest
+
+from wavemeter_dashboard.controller.latency_profiler import (
+    LatencyHistogram, LatencyProfiler)
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for _ in range(98):
+        histogram.add(0.0011)
+    histogram.add(0.5)
+    histogram.add(0.7)
+
+    assert histogram.count == 100
+    assert histogram.mean() == pytest.approx((0.1078 + 1.2) / 100)
+    # the upper edge of the bin, within 10 ** 0.1 of it
+    assert 0.0011 <= histogram.percentile(50) <= 0.0011 * 10 ** 0.1
+    assert 0.5 <= histogram.percentile(99) <= 0.7
+    assert histogram.percentile(100) == histogram.max == 0.7
+    assert LatencyHistogram().percentile(50) == 0
+
+
+def test_disabled_records_nothing():
+    profiler = LatencyProfiler(enabled=False)
+    with profiler.measure("switch", 1):
+        pass
+    assert not profiler.breakdown()
+
+
+def test_breakdown_and_report():
+    profiler = LatencyProfiler()
+    for ch in (1, 2):
+        profiler.record("visit", ch, 0.1)
+        profiler.record("settle", ch, 0.06)
+        profiler.record("frequency", ch, 0.03)
+    profiler.record("sample_age", 1, 5)
+
+    rows = profiler.breakdown()
+    assert [op for op, _, _ in rows] == [
+        "sample_age", "visit", "settle", "frequency"]
+    assert rows[2][2].count == 2 and rows[2][1] is None
+    assert len(profiler.breakdown(per_channel=True)) == 7
+
+    report = list(csv.DictReader(io.StringIO(profiler.report("csv"))))
+    shares = {row['operation']: row['share'] for row in report}
+    # of the time spent visiting, outside the sweep has none
+    assert float(shares['settle']) == pytest.approx(0.6)
+    assert float(shares['visit']) == 1
+    assert shares['sample_age'] == ''
+    assert report[-1]['operation'] == 'sample_age'
+
+    assert "settle" in profiler.report()
+    profiler.reset()
+    assert not profiler.breakdown()
@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.model.compact_history import CompactChunk
+from wavemeter_dashboard.model.longterm_data import (
+    StructuredRing, ChunkedRing, ChannelHistory, LongtermData, MinMaxPyramid)
+
+
+def make_records(start, n):
+    records = np.zeros(n, dtype=ChannelHistory.DTYPE)
+    records['time'] = np.arange(start, start + n, dtype=float)
+    records['frequency'] = 4e14 + np.arange(start, start + n)
+    records['error'] = np.nan
+    records['dac'] = np.nan
+    return records
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setitem(config.config_dict, 'longterm_length_limit', 0)
+    monkeypatch.setitem(config.config_dict, 'longterm_chunk_size', 64)
+
+
+def test_structured_ring_keeps_the_newest():
+    ring = StructuredRing(ChannelHistory.DTYPE, 100)
+    for start in range(0, 1000, 7):
+        ring.extend(make_records(start, 7))
+
+    assert len(ring) == 100 and ring.total == 1001
+    assert ring.view()['time'][0] == 901 and ring.tail(1)['time'][0] == 1000
+    assert np.all(np.diff(ring.view()['time']) == 1)
+    assert ring.slice(10, 12)['time'].tolist() == [911, 912]
+    assert ring.searchsorted('time', 950.5) == 50
+
+
+def test_structured_ring_view_does_not_copy():
+    ring = StructuredRing(ChannelHistory.DTYPE, 100)
+    ring.extend(make_records(0, 10))
+    assert np.shares_memory(ring.view(), ring.array)
+    assert not ring.view().flags.writeable
+
+
+def test_chunked_ring_across_chunks():
+    ring = ChunkedRing(ChannelHistory.DTYPE, chunk_size=16)
+    for start in range(0, 100, 10):
+        ring.extend(make_records(start, 10))
+
+    assert len(ring) == 100 and len(ring.chunks) == 7
+    assert ring.tail(3)['time'].tolist() == [97, 98, 99]
+    assert ring.tail(20)['time'].tolist() == list(range(80, 100))
+    assert ring.slice(14, 34)['time'].tolist() == list(range(14, 34))
+    assert ring.searchsorted('time', 40) == 40
+    assert ring.searchsorted('time', 40, 'right') == 41
+    assert ring.searchsorted('time', 1000) == 100
+
+
+def test_chunked_ring_has_no_full_view():
+    # joining every chunk would copy the whole history
+    assert not hasattr(ChunkedRing(ChannelHistory.DTYPE), 'view')
+
+
+def test_chunked_ring_drops_the_oldest_chunk():
+    chunk_bytes = 16 * ChannelHistory.DTYPE.itemsize
+    ring = ChunkedRing(ChannelHistory.DTYPE, chunk_size=16,
+                       memory_limit=3 * chunk_bytes)
+    ring.extend(make_records(0, 100))
+
+    assert len(ring.chunks) == 3 and ring.total == 100
+    assert ring.slice(0, 1)['time'][0] == 64
+    assert ring.tail(1)['time'][0] == 99
+
+
+def test_chunked_ring_sealed_chunks():
+    ring = ChunkedRing(ChannelHistory.DTYPE, chunk_size=16, seal=CompactChunk)
+    ring.extend(make_records(0, 100))
+
+    assert isinstance(ring.chunks[0], CompactChunk)
+    assert isinstance(ring.chunks[-1], np.ndarray)
+    times = ring.slice(0, 100)['time']
+    assert np.allclose(times, np.arange(100), atol=1e-6)
+    assert ring.searchsorted('time', 20.5) == 21
+
+
+def test_query_by_time(small_chunks):
+    history = ChannelHistory()
+    history.extend(np.arange(200.0), 4e14 + np.arange(200.0))
+    data = LongtermData(history, 'frequency')
+
+    times, values = data.query(50, 59.5)
+    assert times.tolist() == list(range(50, 60))
+    assert values[0] == 4e14 + 50
+
+    times, _ = data.get_data()
+    assert len(times) == 200
+    assert data.get_time_range() == (0, 199)
+
+    times, values = data.query(max_points=20)
+    assert len(times) < 200
+    assert values.min() == 4e14 and values.max() == 4e14 + 199
+
+
+def test_sparse_column_time_range(small_chunks):
+    history = ChannelHistory()
+    history.extend(np.arange(200.0), 4e14 + np.arange(200.0))
+    history.set_dac(1.0, t=120.0)
+    history.set_dac(2.0, t=150.0)
+    data = LongtermData(history, 'dac')
+
+    assert data.get_time_range() == (120, 150)
+    assert data.get_data()[1].tolist() == [1.0, 2.0]
+    assert data.get_newest_point() == (150, 2.0)
+
+
+def make_noisy_history(n, seed=0):
+    rng = np.random.default_rng(seed)
+    history = ChannelHistory()
+    history.extend(np.cumsum(rng.uniform(0.1, 1, n)),
+                   4e14 + rng.normal(0, 1e6, n))
+    return history
+
+
+@pytest.mark.parametrize('limit', [0, 3000])
+def test_downsampled_query_stays_in_the_window(monkeypatch, limit):
+    monkeypatch.setitem(config.config_dict, 'longterm_length_limit', limit)
+    monkeypatch.setitem(config.config_dict, 'longterm_chunk_size', 512)
+    history = make_noisy_history(5000)
+    data = LongtermData(history, 'frequency')
+    records = history.slice(0, len(history))
+
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        t_start, t_end = np.sort(rng.uniform(records['time'][0] - 10,
+                                             records['time'][-1] + 10, 2))
+        max_points = int(rng.integers(4, 400))
+        times, values = data.query(t_start, t_end, max_points)
+
+        inside = records[(records['time'] >= t_start) &
+                         (records['time'] <= t_end)]
+        if len(inside) <= max_points:
+            continue
+        assert times.min() >= t_start and times.max() <= t_end
+        assert values.min() == inside['frequency'].min()
+        assert values.max() == inside['frequency'].max()
+        assert len(times) <= 4 * max_points
+        # all of them are samples
+        found = np.searchsorted(records['time'], times)
+        assert np.array_equal(records['frequency'][found], values)
+
+
+def test_pyramid_buckets_match_numpy(small_chunks):
+    history = make_noisy_history(6000)
+    # DAC outputs on some of the samples, NaN on the others
+    for t in history.slice(0, len(history))['time'][::7]:
+        history.set_dac(float(t) % 13, t=t)
+    history.extend([history.tail(1)['time'][0] + 1], [4e14])
+    records = history.slice(0, len(history))
+
+    for field in ['frequency', 'dac']:
+        pyramid = MinMaxPyramid(history, field)
+        pyramid.update()
+        assert len(pyramid.levels) == 3  # buckets of 16, 256 and 4096
+
+        for level, (ring, next_bucket) in enumerate(pyramid.levels, 1):
+            size = MinMaxPyramid.FACTOR ** level
+            buckets = ring.slice(0, len(ring))
+            first = next_bucket - len(ring)
+            for k, bucket in enumerate(buckets, first):
+                samples = records[k * size:(k + 1) * size]
+                values = samples[field]
+                if np.isnan(values).all():
+                    assert np.isnan(bucket['vmin']) and np.isnan(bucket['vmax'])
+                    continue
+                assert bucket['vmin'] == np.nanmin(values)
+                assert bucket['vmax'] == np.nanmax(values)
+                # when they happened, in the bucket
+                assert samples['time'][np.nanargmin(values)] == bucket['tmin']
+                assert samples['time'][np.nanargmax(values)] == bucket['tmax']
@@ -0,0 +1,273 @@
+import time
+from threading import Thread, current_thread
+
+import numpy as np
+from PyQt5.QtCore import Qt
+
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.controller.alert_tracker import AlertTracker
+from wavemeter_dashboard.controller.arduino_dac.simulated_dac import (
+    SimulatedDAC)
+from wavemeter_dashboard.controller.fiber_switch import (
+    FiberSwitchTimeoutException, SimulatedFiberSwitch)
+from wavemeter_dashboard.controller.monitor import Monitor
+from wavemeter_dashboard.controller.settle_time_learner import (
+    SettleTimeLearner)
+from wavemeter_dashboard.controller.wavemeter_ws7 import (
+    SimulatedWavemeterWS7, WavemeterWS7NoSignalException)
+from wavemeter_dashboard.model.channel_alert import ChannelAlertCode
+from wavemeter_dashboard.model.channel_model import ChannelModel
+from wavemeter_dashboard.model.longterm_data import ChannelHistory
+
+
+class FakeWavemeter:
+    # get_frequency answers with the readings given, in THz, an exception
+    # instance is raised instead
+    def __init__(self, readings):
+        self.readings = list(readings)
+
+    def set_exposure(self, exposure, exposure2):
+        pass
+
+    def get_frequency(self):
+        reading = self.readings.pop(0) if len(self.readings) > 1 \
+            else self.readings[0]
+        if isinstance(reading, Exception):
+            raise reading
+        return reading
+
+
+class FakeFiberSwitch:
+    def __init__(self, failures=0):
+        self.failures = failures  # switches that time out first
+
+    def switch_channel(self, channel, verify=True):
+        if self.failures:
+            self.failures -= 1
+            raise FiberSwitchTimeoutException("No answer")
+
+    def verify_switch(self):
+        pass
+
+
+def make_monitor(readings, switch_failures=0):
+    monitor = Monitor(FakeWavemeter(readings),
+                      FakeFiberSwitch(switch_failures), None)
+    monitor.after_switch_wait_time = 0
+
+    channel = ChannelModel(1)
+    channel.monitor_enabled = True
+    monitor.add_channel(channel)
+
+    alerts = []
+    channel.on_new_alert.connect(
+        lambda code: alerts.append(('new', code)), Qt.DirectConnection)
+    channel.on_alert_cleared.connect(
+        lambda code: alerts.append(('cleared', code)), Qt.DirectConnection)
+    return monitor, channel, alerts
+
+
+def test_alert_after_a_partial_burst_is_cleared():
+    no_signal = WavemeterWS7NoSignalException()
+    # the burst fails on its third read, all 6 attempts of it
+    monitor, channel, alerts = make_monitor([400, 400] + [no_signal] * 6 + [400])
+    channel.dwell_samples = 3
+
+    assert monitor._update_one_channel(1) == 2
+    assert ('new', ChannelAlertCode.WAVEMETER_NO_SIGNAL) in alerts
+    assert channel.frequency == 400e12
+
+    alerts.clear()
+    assert monitor._update_one_channel(1) == 3
+    assert ('cleared', ChannelAlertCode.WAVEMETER_NO_SIGNAL) in alerts
+    assert 1 not in monitor.failed_reads
+
+
+def test_failed_visit_is_cleared_by_the_next_sample():
+    no_signal = WavemeterWS7NoSignalException()
+    monitor, channel, alerts = make_monitor([no_signal] * 6 + [400])
+
+    assert monitor._update_one_channel(1) == 0
+    assert channel.frequency is None
+
+    alerts.clear()
+    assert monitor._update_one_channel(1) == 1
+    assert ('cleared', ChannelAlertCode.WAVEMETER_NO_SIGNAL) in alerts
+
+    # and only once
+    alerts.clear()
+    monitor._update_one_channel(1)
+    assert not alerts
+
+
+def test_dac_results_are_handled_on_the_monitor_thread():
+    monitor, channel, alerts = make_monitor([400])
+    channel.pid_enabled = True
+    channel.dac_channel_num = 2
+
+    # the DAC worker reports from its own thread
+    worker = Thread(target=monitor._queue_dac_result, args=(2, True, None))
+    worker.start()
+    worker.join()
+    assert not alerts
+
+    threads = []
+    channel.on_new_alert.connect(lambda code: threads.append(current_thread()),
+                                 Qt.DirectConnection)
+    monitor._handle_dac_results()
+    assert alerts == [('new', ChannelAlertCode.PID_DAC_RAILED)]
+    assert threads == [current_thread()]
+    assert channel.dac_railed
+
+
+def test_switch_failure_raises_an_alert_until_the_next_switch():
+    monitor, channel, alerts = make_monitor([400], switch_failures=1)
+    tracker = AlertTracker()
+    tracker.add_channel(channel)
+    errors = []
+    monitor.on_channel_error.connect(lambda num, msg: errors.append(num),
+                                     Qt.DirectConnection)
+
+    assert monitor._update_one_channel(1) == 0
+    assert errors == [1]
+    assert ChannelAlertCode.FIBER_SWITCH_ERROR in channel.total_alerts
+
+    assert monitor._update_one_channel(1) == 1
+    assert ChannelAlertCode.FIBER_SWITCH_ERROR not in channel.total_alerts
+
+
+def test_async_dac_output_is_flagged_by_its_own_result(monkeypatch):
+    monkeypatch.setitem(config.config_dict, 'dac_async_writes', True)
+    monitor = Monitor(FakeWavemeter([400]), FakeFiberSwitch(), SimulatedDAC())
+    channel = ChannelModel(1, dac_channel_num=2)
+    channel.pid_enabled = True
+    channel.pid_p_prop_val = 1
+    channel.pid_i_prop_val = 0
+    monitor.add_channel(channel)
+
+    def step(t, error):
+        channel.history.extend([t], [400e12], [error])
+        monitor._run_pid(channel, error)
+        # the flag isn't known before the worker has written it
+        assert not channel.history.tail(1)['flags'][0]
+        monitor.dac_worker.flush(1)
+        monitor._handle_dac_results()
+
+    step(1, 1e20)  # over the top
+    step(2, -1e16)
+    step(3, -1e16)
+    assert channel.history.tail(3)['flags'].tolist() == [
+        ChannelHistory.FLAG_DAC_RAILED, 0, 0]
+    assert not channel.dac_railed
+    monitor.close()
+
+
+def make_simulated_monitor(channel_nums=(1,), **wavemeter_params):
+    # the simulated devices, exposures always fine
+    wavemeter = SimulatedWavemeterWS7(seed=0, **wavemeter_params)
+    wavemeter.set_auto_exposure(True)
+    monitor = Monitor(wavemeter, SimulatedFiberSwitch(wavemeter), SimulatedDAC())
+    monitor.after_switch_wait_time = 0
+
+    channels = []
+    for num in channel_nums:
+        channel = ChannelModel(num)
+        channel.expo_time = channel.expo2_time = 5
+        channel.monitor_enabled = True
+        monitor.add_channel(channel)
+        channels.append(channel)
+    return monitor, channels
+
+
+def test_event_mode_samples_every_measurement(monkeypatch):
+    monkeypatch.setitem(config.config_dict, 'acquisition_mode', 'event')
+    monitor, (channel,) = make_simulated_monitor()
+    channel.dwell_samples = 4
+
+    start = time.time()
+    assert monitor._update_one_channel(1) == 4
+    # no 50 ms poll waits, a measurement every 10 ms of exposure
+    assert time.time() - start < 0.15
+
+    times = channel.history.tail(4)['time']
+    assert np.allclose(np.diff(times), 0.01, atol=1e-6)
+    assert times[-1] <= time.time()
+    assert (channel.history.tail(4)['frequency'] > 4e14).all()
+
+
+def test_adaptive_settle_time_skips_the_previous_channel(monkeypatch):
+    monkeypatch.setitem(config.config_dict, 'adaptive_settle_time', True)
+    monkeypatch.setitem(config.config_dict, 'wait_time_after_switch', 0)
+    # the old channel is read for 50 ms after a switch
+    monitor, (first, second) = make_simulated_monitor((1, 2), settle_time=0.05)
+
+    assert monitor._update_one_channel(1) == 1
+    start = time.time()
+    assert monitor._update_one_channel(2) == 1
+    assert time.time() - start >= 0.05
+    assert abs(second.frequency - 4.02e14) < 1e8
+
+    learner = monitor.settle_time_learner
+    waited = learner.estimates[SettleTimeLearner.make_key(2, 5, 5)]
+    assert 0 < waited <= 0.05
+
+
+def test_latency_profile_of_a_visit(monkeypatch):
+    monkeypatch.setitem(config.config_dict, 'latency_profiling', True)
+    monitor, _ = make_simulated_monitor((1, 2))
+    monitor._update_one_channel(1)
+    monitor._update_one_channel(2)
+
+    rows = monitor.profiler.breakdown(per_channel=True)
+    recorded = {(op, ch): h.count for op, ch, h in rows}
+    for op in ("switch", "exposure", "settle", "verify_switch", "frequency",
+               "sample_age"):
+        assert recorded[(op, 1)] == recorded[(op, 2)] == 1
+    assert "frequency" in monitor.get_latency_report()
+
+
+class HungWavemeter(SimulatedWavemeterWS7):
+    # a dll call that takes its time, once asked to
+    hang = 0
+
+    def get_frequency(self):
+        time.sleep(self.hang)
+        return super().get_frequency()
+
+
+def test_stop_interrupts_the_settle_wait():
+    monitor, (channel,) = make_simulated_monitor()
+    monitor.after_switch_wait_time = 10
+    monitor.start_monitoring()
+    time.sleep(0.1)
+
+    start = time.time()
+    monitor.stop_monitoring()
+    assert time.time() - start < 0.5
+    assert not monitor.monitor_thread.is_alive()
+    assert channel.history.total == 0
+
+
+def test_stop_does_not_wait_for_a_hung_device(monkeypatch):
+    monkeypatch.setitem(config.config_dict, 'monitor_stop_timeout', 0.2)
+    wavemeter = HungWavemeter(seed=0)
+    wavemeter.set_auto_exposure(True)
+    monitor = Monitor(wavemeter, SimulatedFiberSwitch(wavemeter), SimulatedDAC())
+    monitor.after_switch_wait_time = 0
+    channel = ChannelModel(1)
+    channel.expo_time = channel.expo2_time = 5
+    channel.monitor_enabled = True
+    monitor.add_channel(channel)
+
+    monitor.start_monitoring()
+    while not channel.history.total:
+        time.sleep(0.01)
+    wavemeter.hang = 1
+
+    time.sleep(0.1)
+    start = time.time()
+    monitor.stop_monitoring()
+    assert time.time() - start < 0.5
+    # the visit finishes by itself
+    monitor.monitor_thread.join(2)
+    assert not monitor.monitor_thread.is_alive()
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import signal
+
+import numpy as np
+import pytest
+from PyQt5.QtCore import QCoreApplication
+
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.controller.monitor import Monitor
+from wavemeter_dashboard.controller.monitor_process import (
+    MonitorProcess, MonitorProcessException, RingPublisher)
+from wavemeter_dashboard.controller.sample_ring import (
+    SampleRing, PatternRing, RingRecordKind)
+from wavemeter_dashboard.model.channel_alert import ChannelAlertCode
+from wavemeter_dashboard.model.channel_model import ChannelModel
+
+
+@pytest.fixture
+def rings():
+    sample_ring = SampleRing(capacity=8)
+    pattern_ring = PatternRing(slots=4, max_length=16)
+    yield sample_ring, pattern_ring
+    sample_ring.close(unlink=True)
+    pattern_ring.close(unlink=True)
+
+
+def test_sample_ring_wraps_around(rings):
+    sample_ring, _ = rings
+    # another end, as the child process has
+    reader = SampleRing(sample_ring.name, sample_ring.capacity)
+
+    for i in range(5):
+        sample_ring.put(RingRecordKind.SAMPLE, 1, t=i, value=i)
+    assert reader.get_new()['time'].tolist() == [0, 1, 2, 3, 4]
+    assert not len(reader.get_new())
+
+    sample_ring.put_many(RingRecordKind.SAMPLE, 2, np.arange(5, 11.0),
+                         np.zeros(6))
+    sample_ring.put(RingRecordKind.MONITOR_STOPPED)
+    records = reader.get_new()
+    assert records['time'].tolist() == [5, 6, 7, 8, 9, 10, 0]
+    assert records['channel'].tolist() == [2] * 6 + [0]
+    assert reader.lost == 0
+    reader.close()
+
+
+def test_sample_ring_counts_what_it_lost(rings):
+    sample_ring, _ = rings
+    for i in range(10):
+        sample_ring.put(RingRecordKind.SAMPLE, 1, t=i)
+    assert sample_ring.get_new()['time'].tolist() == list(range(2, 10))
+    assert sample_ring.lost == 2
+
+    # more than fits in one go
+    sample_ring.put_many(RingRecordKind.SAMPLE, 1, np.arange(20.0),
+                         np.zeros(20))
+    assert sample_ring.get_new()['time'].tolist() == list(range(12, 20))
+    assert sample_ring.lost == 14
+
+
+def test_pattern_ring(rings):
+    _, pattern_ring = rings
+    first = pattern_ring.put(np.arange(20, dtype=np.uint16))
+    assert pattern_ring.get(first).tolist() == list(range(16))  # cut short
+    assert len(pattern_ring.get(pattern_ring.put(None))) == 0
+    assert pattern_ring.get(first + 2) is None  # not written yet
+
+    for i in range(3):
+        pattern_ring.put(np.full(3, i, dtype=np.uint16))
+    assert pattern_ring.get(first) is None  # overwritten
+    assert pattern_ring.get(first + 4).tolist() == [2, 2, 2]
+
+
+def test_publisher_puts_the_channel_in_the_rings(rings):
+    sample_ring, pattern_ring = rings
+    monitor = Monitor(None, None, None)
+    publisher = RingPublisher(monitor, sample_ring, pattern_ring)
+    channel = ChannelModel(3)
+    channel.history.extend([1.0], [400e12])
+    publisher.attach(channel)  # from the history store, not published
+
+    channel.history.extend([2.0, 3.0], [401e12, 402e12])
+    channel.sample_rate = 2
+    channel.on_freq_changed.emit()
+    channel.dac_output = 1000
+    channel.dac_railed = True
+    channel.on_pid_changed.emit()
+    channel.on_new_alert.emit(ChannelAlertCode.PID_DAC_RAILED)
+
+    publisher.request_patterns(channel, True, False)
+    channel.pattern_data = np.array([1, 2, 3], dtype=np.uint16)
+    channel.on_pattern_changed.emit()
+    channel.on_wide_pattern_changed.emit()  # not asked for
+
+    records = sample_ring.get_new()
+    assert [RingRecordKind(k) for k in records['kind']] == [
+        RingRecordKind.SAMPLE, RingRecordKind.SAMPLE,
+        RingRecordKind.SAMPLE_RATE, RingRecordKind.PID,
+        RingRecordKind.NEW_ALERT, RingRecordKind.PATTERN]
+    assert (records['channel'] == 3).all()
+    assert records['value'][:3].tolist() == [401e12, 402e12, 2]
+    # the output goes with the sample it was worked out from
+    assert records['time'][3] == 3 and records['extra'][3] == 1
+    assert records['code'][4] == ChannelAlertCode.PID_DAC_RAILED.value
+    assert ChannelAlertCode.PID_DAC_RAILED in channel.total_alerts
+    assert pattern_ring.get(int(records['extra'][5])).tolist() == [1, 2, 3]
+
+
+@pytest.fixture
+def monitor_process(tmp_path, monkeypatch):
+    app = QCoreApplication.instance() or QCoreApplication([])
+    path = tmp_path / "config.json"
+    settings = {"simulate_devices": True, "wait_time_after_switch": 0,
+                "monitor_process_stop_timeout": 2}
+    path.write_text(json.dumps(settings))
+    monkeypatch.setattr(config, 'path', str(path))
+    monkeypatch.setattr(config, 'config_dict', settings)
+
+    process = MonitorProcess(simulate=True)
+    yield process
+    if process.process.is_alive():
+        os.kill(process.process.pid, signal.SIGCONT)
+    process.close()
+    del app
+
+
+def test_samples_come_from_the_child(monitor_process):
+    channel = ChannelModel(1)
+    channel.expo_time, channel.expo2_time = 10, 22
+    channel.monitor_enabled = True
+    monitor_process.add_channel(channel)
+    monitor_process.start_monitoring()
+
+    deadline = time.time() + 20
+    while channel.history.total < 3 and time.time() < deadline:
+        time.sleep(0.05)
+        monitor_process._drain()
+    monitor_process.stop_monitoring()
+
+    assert channel.history.total >= 3
+    assert channel.frequency == channel.history.tail(1)['frequency'][0]
+    assert isinstance(monitor_process.get_latency_report(), str)
+
+
+def test_request_to_a_hung_child_times_out(monitor_process):
+    # the child answers once it's up
+    assert monitor_process._request("reset_latency_profile") is None
+
+    os.kill(monitor_process.process.pid, signal.SIGSTOP)
+    start = time.time()
+    with pytest.raises(MonitorProcessException):
+        monitor_process.reset_latency_profile()
+    assert time.time() - start < 3
+
+    # the late reply isn't taken for the next one's
+    os.kill(monitor_process.process.pid, signal.SIGCONT)
+    assert isinstance(monitor_process.get_latency_report(), str)
+
+    monitor_process.process.kill()
+    monitor_process.process.join()
+    with pytest.raises(MonitorProcessException):
+        monitor_process.get_latency_report()
@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+
+from wavemeter_dashboard.model.channel_alert import ChannelAlertCode
+from wavemeter_dashboard.model.pattern_archive import (
+    PatternArchive, compress_pattern, decompress_pattern)
+
+
+def make_pattern(phase, length=2048):
+    x = np.arange(length)
+    return (30000 + 20000 * np.sin(x / 200 + phase)).astype(np.ushort)
+
+
+def test_pattern_roundtrip():
+    pattern = make_pattern(0)
+    payload = compress_pattern(pattern)
+    assert len(payload) < pattern.nbytes / 2
+    assert np.array_equal(decompress_pattern(payload, len(pattern)), pattern)
+
+    # wrapping around in uint16
+    pattern = np.array([65535, 0, 1, 65535, 0], dtype=np.ushort)
+    assert np.array_equal(
+        decompress_pattern(compress_pattern(pattern), 5), pattern)
+
+
+def test_patterns_around_an_alert(tmp_path):
+    archive = PatternArchive(str(tmp_path), pre_trigger=3, post_trigger=2)
+    t = 1.7e9
+    for i in range(5):
+        archive.add(9, make_pattern(i), t=t + i)
+    # not a trigger
+    archive.on_alert(9, ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL)
+    archive.on_alert(9, ChannelAlertCode.WAVEMETER_BAD_SIGNAL)
+    # comes again while it lasts, no change
+    archive.on_alert(9, ChannelAlertCode.WAVEMETER_BAD_SIGNAL)
+    for i in range(5, 10):
+        archive.add(9, make_pattern(i), wide=True, t=t + i)
+    archive.close()
+
+    archive = PatternArchive(str(tmp_path), pre_trigger=3, post_trigger=2)
+    events = archive.events(9)
+    assert len(events) == 1
+    assert events[0]['code'] == ChannelAlertCode.WAVEMETER_BAD_SIGNAL.value
+    assert not events[0]['cleared']
+
+    # the trigger time is now, after all the made up frame times
+    frames = archive.read_event(9, events[0])
+    assert [f[0] for f in frames] == [t + 2, t + 3, t + 4, t + 5, t + 6]
+    assert [f[1] for f in frames] == [False] * 3 + [True] * 2
+    assert np.array_equal(frames[0][2], make_pattern(2))
+    assert np.array_equal(frames[-1][2], make_pattern(6))
+
+
+def test_alert_without_patterns_before_it(tmp_path):
+    # a file of today from before, then an alert with nothing kept before it
+    archive = PatternArchive(str(tmp_path), pre_trigger=0, post_trigger=2)
+    now = time.time()
+    archive.add(9, make_pattern(0), t=now - 2)
+    archive.on_alert(9, ChannelAlertCode.PID_DAC_RAILED)
+    archive.add(9, make_pattern(1), t=now + 1)
+    archive.close()
+
+    archive = PatternArchive(str(tmp_path), pre_trigger=0, post_trigger=2)
+    archive.on_alert(9, ChannelAlertCode.PID_DAC_RAILED)
+    archive.on_alert(9, ChannelAlertCode.PID_DAC_RAILED, cleared=True)
+    for i in range(2, 5):
+        archive.add(9, make_pattern(i), t=now + i)
+    archive.close()
+
+    events = archive.events(9)
+    assert events['cleared'].tolist() == [0, 0, 1]
+    # each from the first pattern after it
+    assert [f[0] for f in archive.read_event(9, events[0])] == \
+        [now + 1, now + 2]
+    for event in events[1:]:
+        assert [f[0] for f in archive.read_event(9, event)] == \
+            [now + 2, now + 3]
@@ -0,0 +1,67 @@
+import numpy as np
+
+from wavemeter_dashboard.controller.wavemeter_ws7 import PatternBufferPool
+
+
+def read(pool, value, length=16):
+    buffer = pool.acquire(length)
+    buffer[:] = value
+    return pool.view(buffer)
+
+
+def test_view_is_read_only():
+    pool = PatternBufferPool()
+    pattern = read(pool, 1)
+    assert not pattern.flags.writeable
+
+
+def test_retired_buffer_is_reused():
+    pool = PatternBufferPool()
+    old = read(pool, 1)
+    pool.retire(old)
+    del old
+
+    new = read(pool, 2)
+    assert pool.allocations == 1 and pool.reuses == 1
+    assert (new == 2).all()
+
+
+def test_buffer_still_referred_to_is_not_reused():
+    pool = PatternBufferPool()
+    old = read(pool, 1)
+    drawn = old[2:10]  # e.g. kept by a chart
+    pool.retire(old)
+    del old
+
+    read(pool, 2)
+    assert pool.reuses == 0
+    assert (drawn == 1).all()
+
+    del drawn
+    read(pool, 3)
+    assert pool.reuses == 1
+
+
+def test_current_pattern_is_not_reused():
+    pool = PatternBufferPool()
+    shown = read(pool, 1)
+    for value in range(2, 10):
+        shown, old = read(pool, value), shown
+        pool.retire(old)
+        del old
+        assert (shown == value).all()
+    assert pool.allocations == 2
+
+
+def test_foreign_arrays_are_ignored():
+    pool = PatternBufferPool()
+    pool.retire(None)
+    pool.retire(np.zeros(16, dtype=np.ushort))
+    pattern = read(pool, 1)
+    pool.retire(pattern)
+    pool.retire(pattern)  # twice
+    del pattern
+
+    read(pool, 2)
+    read(pool, 3)
+    assert pool.reuses == 1
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+import pytest
+
+from wavemeter_dashboard.model.longterm_data import StructuredRing, ChannelHistory
+from wavemeter_dashboard.model.rolling_statistics import (
+    RollingWindow, RollingStatistics)
+
+
+def make_history(n):
+    history = StructuredRing(ChannelHistory.DTYPE, n)
+    return history
+
+
+def add(history, times, errors):
+    records = np.zeros(len(times), dtype=ChannelHistory.DTYPE)
+    records['time'] = times
+    records['error'] = errors
+    history.extend(records)
+
+
+def test_window_matches_brute_force():
+    rng = np.random.default_rng(1)
+    times = np.cumsum(rng.uniform(0.1, 1, 500))
+    values = rng.normal(3, 2, 500)
+    window = RollingWindow(10)
+
+    for k, (t, x) in enumerate(zip(times, values)):
+        window.add(t, x)
+        window.expire(t)
+        inside = values[:k + 1][times[:k + 1] > t - 10]
+        assert window.n == len(inside)
+        assert window.mean == pytest.approx(inside.mean())
+        assert window.std == pytest.approx(inside.std(), abs=1e-9)
+        assert window.rms == pytest.approx(np.sqrt(np.mean(inside ** 2)))
+        assert window.min == inside.min() and window.max == inside.max()
+
+
+def test_empty_window_is_nan():
+    window = RollingWindow(10)
+    for stat in RollingStatistics.STATS:
+        assert math.isnan(window.get(stat))
+
+
+def test_statistics_follow_the_history():
+    history = make_history(1000)
+    statistics = RollingStatistics(history, 'error', [10, 60], 100)
+
+    add(history, np.arange(100.0), np.arange(100.0))
+    statistics.update()
+    # the 10 s window has 90..99, the 60 s one 40..99
+    assert statistics.get(0, 'min', now=99) == 90
+    assert statistics.get(1, 'mean', now=99) == pytest.approx(69.5)
+
+    # NaN errors (no setpoint) are skipped
+    add(history, [100.0], [np.nan])
+    statistics.update()
+    assert statistics.get(0, 'max', now=99) == 99
+
+    times, values = statistics.get_data(0, 'peak_to_peak')
+    assert len(times) == 1 and values[0] == 9
+
+
+def test_quiet_channel_runs_empty():
+    history = make_history(1000)
+    statistics = RollingStatistics(history, 'error', [10], 100)
+    add(history, [1000.0, 1001.0], [1.0, 3.0])
+    statistics.update()
+
+    assert statistics.get(0, 'mean', now=1005) == 2
+    assert statistics.get(0, 'mean', now=1010.5) == 3
+    assert math.isnan(statistics.get(0, 'rms', now=1020))
+
+
+def test_get_data_is_a_copy():
+    history = make_history(1000)
+    statistics = RollingStatistics(history, 'error', [10], 4)
+    add(history, [1.0], [1.0])
+    statistics.update()
+    times, _ = statistics.get_data(0, 'mean')
+
+    for t in range(2, 20):
+        add(history, [float(t)], [1.0])
+        statistics.update()
+    assert times.tolist() == [1.0]
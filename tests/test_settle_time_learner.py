@@ -0,0 +1,40 @@
+import pytest
+
+from wavemeter_dashboard.controller.settle_time_learner import (
+    SettleTimeLearner)
+
+
+def test_wait_follows_the_switches():
+    learner = SettleTimeLearner(initial_wait=0.2, margin=0.02, max_wait=1.0,
+                                decay=0.5)
+    key = SettleTimeLearner.make_key(3, 10, 20)
+    assert learner.get_wait_time(key) == 0.2
+
+    # too short, the last transient reading came 0.3 s after the switch
+    learner.record(key, 0.3)
+    assert learner.get_wait_time(key) == pytest.approx(0.32)
+
+    # clean switches probe it downwards
+    learner.record(key)
+    learner.record(key)
+    assert learner.get_wait_time(key) == pytest.approx(0.075 + 0.02)
+
+    # capped both ways
+    learner.record(key, 5)
+    assert learner.get_wait_time(key) == 1.0
+    # the others keep their own
+    assert learner.get_wait_time(SettleTimeLearner.make_key(3, 10, 30)) == 0.2
+
+
+def test_transient_looks_like_the_previous_channel():
+    learner = SettleTimeLearner(tolerance=1e9)
+    assert not learner.is_transient(2, None, 4e14)
+    assert not learner.is_transient(2, 1, 4e14)  # nothing known about 1
+
+    learner.remember_frequency(1, 4e14)
+    assert learner.is_transient(2, 1, 4e14 + 1e8)
+    assert not learner.is_transient(2, 1, 4.1e14)
+
+    # unless this channel is there too
+    learner.remember_frequency(2, 4e14 + 5e8)
+    assert not learner.is_transient(2, 1, 4e14 + 1e8)
@@ -1 +1,3 @@
-from .dac import DAC, DACOutOfBoundException
\ No newline at end of file
+from .dac import DAC, DACOutOfBoundException, DACTimeoutException
+from .simulated_dac import SimulatedDAC
+from .dac_worker import DACWorker, DACWorkerQueueFullException
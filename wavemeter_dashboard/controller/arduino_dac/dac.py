@@ -1,45 +1,123 @@
-from serial import Serial
+import time
+
+from serial import Serial, SerialTimeoutException
 
 
 class DACOutOfBoundException(Exception):
     pass
 
 
+class DACTimeoutException(Exception):
+    pass
+
+
 class DAC:
     DAC_MIN = 0
     DAC_MAX = 64000
 
-    def __init__(self, com_port, channel_num=16):
+    def __init__(self, com_port, channel_num=16, shadow_register=False,
+                 refresh_interval=None, timeout=1):
+        # timeout: seconds to wait for an answer, or for a write to go out
         self.channel_num = channel_num
-        self.serial = Serial(com_port, 115200, timeout=10)
+        self.serial = Serial(com_port, 115200, timeout=timeout,
+                             write_timeout=timeout)
+        self._init_shadow_register(shadow_register, refresh_interval)
+
+    def _init_shadow_register(self, enabled, refresh_interval):
+        # With the shadow register, get_dac_value returns the last value
+        # written instead of asking the Arduino every time. The hardware is
+        # still read every refresh_interval seconds (never if None), or
+        # whenever read_dac_value is called.
+        self.shadow_register = enabled
+        self.refresh_interval = refresh_interval
+        self.shadow = {}  # ch -> value
+        self.shadow_updated_at = {}  # ch -> time
+
+    def _update_shadow(self, ch, val, from_hardware=False):
+        # the Arduino keeps integers
+        self.shadow[ch] = int(val)
+        if from_hardware or ch not in self.shadow_updated_at:
+            self.shadow_updated_at[ch] = time.time()
+
+    def _invalidate_shadow(self, ch):
+        self.shadow.pop(ch, None)
+        self.shadow_updated_at.pop(ch, None)
 
     def query(self, qry):
         self.write(qry)
-        return self.serial.readline().rstrip()
+        reply = self.serial.readline()
+        if not reply.endswith(b"\n"):
+            raise DACTimeoutException(f"No answer to {qry!r}, got {reply!r}")
+        return reply.rstrip()
 
     def write(self, w):
-        self.serial.write(w.encode("utf-8") + b"\n")
+        try:
+            self.serial.write(w.encode("utf-8") + b"\n")
+        except SerialTimeoutException as e:
+            raise DACTimeoutException(str(e))
 
     def is_railed(self, ch):
         return self.DAC_MIN < self.get_dac_value(ch) < self.DAC_MAX
 
+    def get_shadow_value(self, ch):
+        # None if the shadow register is off, or doesn't have a fresh value
+        if self.shadow_register and ch in self.shadow:
+            if self.refresh_interval is None or \
+                    time.time() - self.shadow_updated_at[ch] < self.refresh_interval:
+                return self.shadow[ch]
+
+        return None
+
     def get_dac_value(self, ch):
-        return int(self.query(f"Q {ch}"))
+        val = self.get_shadow_value(ch)
+        if val is not None:
+            return val
+
+        return self.read_dac_value(ch)
+
+    def read_dac_value(self, ch):
+        # always asks the hardware
+        val = int(self.query(f"Q {ch}"))
+        self._update_shadow(ch, val, from_hardware=True)
+        return val
 
     def set_dac_value(self, ch, val):
         if val <= self.DAC_MIN:
             self.write(f"S {ch} {self.DAC_MIN}")
+            self._update_shadow(ch, self.DAC_MIN)
             raise DACOutOfBoundException
         elif val >= self.DAC_MAX:
             self.write(f"S {ch} {self.DAC_MAX}")
+            self._update_shadow(ch, self.DAC_MAX)
             raise DACOutOfBoundException
 
         self.write(f"S {ch} {val}")
+        self._update_shadow(ch, val)
+
+    def set_dac_values(self, values):
+        # sets several channels in a single serial write, values: {ch: val}.
+        # Returns the channels clamped to the range, instead of raising.
+        railed = []
+        lines = []
+        for ch, val in values.items():
+            if val <= self.DAC_MIN or val >= self.DAC_MAX:
+                val = self.DAC_MIN if val <= self.DAC_MIN else self.DAC_MAX
+                railed.append(ch)
+            lines.append(f"S {ch} {val}")
+
+        self.write("\n".join(lines))
+        for ch, val in values.items():
+            self._update_shadow(ch, min(max(val, self.DAC_MIN), self.DAC_MAX))
+
+        return railed
 
     def reset_dac(self, ch):
         self.write(f"S {ch} 32000")
+        self._update_shadow(ch, 32000)
 
     def set_dac_inc(self, ch, inc):
         self.write(f"D {ch} {inc}")
+        # where it ends up is up to the Arduino
+        self._invalidate_shadow(ch)
         if self.is_railed(ch):
             raise DACOutOfBoundException
@@ -0,0 +1,121 @@
+import time
+from threading import Thread, Condition, Lock
+
+from .dac import DAC
+
+
+class DACWorkerQueueFullException(Exception):
+    pass
+
+
+class DACWorker:
+    # Does the serial I/O of a DAC on its own thread, so a slow or hung
+    # USB-serial adapter doesn't hold up the monitor thread.
+    #
+    # Writes to a channel that is still waiting to be sent replace the
+    # pending value, and everything pending is sent in one serial write. The
+    # outcome of every channel goes to on_result(ch, railed, error, val),
+    # called from the worker thread.
+    #
+    # get_dac_value answers from the last value written, the device is only
+    # asked the first time, for what it starts with.
+
+    def __init__(self, dac: DAC, on_result=None, max_pending=64, put_timeout=1):
+        # max_pending: channels waiting to be written before set_dac_value
+        #     blocks, for up to put_timeout seconds
+        self.dac = dac
+        self.on_result = on_result
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+
+        self._pending = {}  # ch -> value
+        self._last = {}  # ch -> value last written, clamped
+        self._cv = Condition()
+        self._io_lock = Lock()  # the serial port isn't thread safe
+        self._stop = False
+        self._writing = False
+
+        self.batches = 0
+        self.writes = 0  # values asked for, coalesced or not
+
+        self.thread = Thread(name="DAC", target=self._run, daemon=True)
+        self.thread.start()
+
+    def set_dac_value(self, ch, val):
+        with self._cv:
+            if ch not in self._pending and len(self._pending) >= self.max_pending:
+                if not self._cv.wait_for(
+                        lambda: len(self._pending) < self.max_pending,
+                        self.put_timeout):
+                    raise DACWorkerQueueFullException
+
+            self._pending[ch] = val
+            self.writes += 1
+            self._cv.notify_all()
+
+    def reset_dac(self, ch):
+        self.set_dac_value(ch, 32000)
+
+    def get_dac_value(self, ch):
+        # the value it's going to be, if there is a write on the way
+        with self._cv:
+            if ch in self._pending:
+                return self._clamp(self._pending[ch])
+            if ch in self._last:
+                return self._last[ch]
+
+        with self._io_lock:
+            val = self.dac.get_dac_value(ch)
+        with self._cv:
+            # unless a write went out in the meantime
+            return self._last.setdefault(ch, val)
+
+    def _clamp(self, val):
+        return min(max(val, self.dac.DAC_MIN), self.dac.DAC_MAX)
+
+    def flush(self, timeout=None):
+        # waits until everything pending is written
+        with self._cv:
+            return self._cv.wait_for(
+                lambda: not self._pending and not self._writing, timeout)
+
+    def close(self, timeout=1):
+        with self._cv:
+            self._stop = True
+            self._cv.notify_all()
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cv:
+                self._cv.wait_for(lambda: self._pending or self._stop)
+                if self._stop and not self._pending:
+                    return
+                batch = self._pending
+                self._pending = {}
+                self._writing = True
+                self._cv.notify_all()
+
+            error = None
+            railed = []
+            try:
+                with self._io_lock:
+                    railed = self.dac.set_dac_values(batch)
+            except Exception as e:
+                # most likely the serial port, let the alerts tell
+                error = e
+            self.batches += 1
+
+            with self._cv:
+                if not error:
+                    for ch, val in batch.items():
+                        self._last[ch] = self._clamp(val)
+                self._writing = False
+                self._cv.notify_all()
+
+            if self.on_result:
+                for ch, val in batch.items():
+                    self.on_result(ch, ch in railed, error, val)
+
+            if error:
+                time.sleep(0.1)  # don't spin on a broken port
@@ -0,0 +1,34 @@
+import time
+
+from .dac import DAC
+
+
+class SimulatedDAC(DAC):
+    # Keeps the DAC values in memory instead of talking to the Arduino. The
+    # range checks and the command format are inherited from DAC.
+
+    def __init__(self, channel_num=16, latency=0.0, shadow_register=False,
+                 refresh_interval=None):
+        self.channel_num = channel_num
+        self.latency = latency
+        self._init_shadow_register(shadow_register, refresh_interval)
+        self.values = {ch: 32000 for ch in range(1, channel_num + 1)}
+        self._last_reply = b""
+
+    def query(self, qry):
+        self.write(qry)
+        return self._last_reply
+
+    def write(self, w):
+        if self.latency:
+            time.sleep(self.latency)
+
+        # one write can carry several commands, one per line
+        for line in w.splitlines():
+            cmd, *args = line.split()
+            if cmd == "Q":
+                self._last_reply = str(int(self.values.get(int(args[0]), 0))).encode()
+            elif cmd == "S":
+                self.values[int(args[0])] = float(args[1])
+            elif cmd == "D":
+                self.values[int(args[0])] = self.values.get(int(args[0]), 0) + float(args[1])
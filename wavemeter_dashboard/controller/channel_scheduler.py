@@ -0,0 +1,155 @@
+import time
+from collections import deque
+from typing import List
+
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.model.channel_alert import ChannelAlertCode
+from wavemeter_dashboard.model.channel_model import ChannelModel
+
+
+class ChannelScheduler:
+    # Decides which channel Monitor measures next. Also keeps track of how
+    # many samples each channel actually got.
+
+    def __init__(self):
+        self.rate_window = config.get('scheduler_rate_window', 60)
+        self.last_visit = {}  # channel_num -> time
+        self.sample_times = {}  # channel_num -> deque of sample times
+
+    def reset(self):
+        self.last_visit = {}
+        self.sample_times = {}
+
+    def next_channel(self, channels: List[ChannelModel],
+                     current: ChannelModel = None) -> ChannelModel:
+        raise NotImplementedError
+
+    def on_channel_visited(self, channel: ChannelModel, samples=1):
+        now = time.time()
+        self.last_visit[channel.channel_num] = now
+
+        if channel.channel_num not in self.sample_times:
+            self.sample_times[channel.channel_num] = deque()
+        times = self.sample_times[channel.channel_num]
+        times.extend([now] * samples)
+
+        while times and times[0] < now - self.rate_window:
+            times.popleft()
+
+    def get_sample_rate(self, channel_num):
+        # samples per second over the last rate_window seconds
+        times = self.sample_times.get(channel_num)
+        if not times or len(times) < 2 or times[-1] == times[0]:
+            return 0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+
+class RoundRobinScheduler(ChannelScheduler):
+    def next_channel(self, channels, current=None):
+        if current not in channels:
+            return channels[0]
+
+        return channels[(channels.index(current) + 1) % len(channels)]
+
+
+class DeadlineScheduler(ChannelScheduler):
+    # Every channel gets a maximum revisit interval and a weight from its
+    # state, and the one with the earliest deadline goes first:
+    #  - alerting channels (deviating, out of lock, DAC railed) are urgent,
+    #  - channels without a usable signal are retried at the urgent interval,
+    #    doubled after every visit that got no sample, up to the quiet one,
+    #    so a laser that's off doesn't take the time of the others,
+    #  - PID channels that are not locked yet come next,
+    #  - locked channels get the longest interval, shortened as the error
+    #    gets closer to freq_max_error,
+    #  - monitor-only channels sit in between.
+    # Since every interval is finite, no channel is starved.
+
+    URGENT_ALERTS = [
+        ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL,
+        ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING,
+        ChannelAlertCode.PID_DAC_RAILED,
+    ]
+
+    SIGNAL_ALERTS = [
+        ChannelAlertCode.WAVEMETER_UNKNOWN_ERROR,
+        ChannelAlertCode.WAVEMETER_UNDER_EXPOSED,
+        ChannelAlertCode.WAVEMETER_OVER_EXPOSED,
+        ChannelAlertCode.WAVEMETER_NO_SIGNAL,
+        ChannelAlertCode.WAVEMETER_BAD_SIGNAL,
+    ]
+
+    def __init__(self):
+        super().__init__()
+        self.urgent_interval = config.get('scheduler_urgent_interval', 0.5)
+        self.active_interval = config.get('scheduler_active_interval', 1)
+        self.monitor_only_interval = config.get('scheduler_monitor_only_interval', 3)
+        self.quiet_interval = config.get('scheduler_quiet_interval', 5)
+        # staying on the current channel saves a switch, which is worth
+        # about this many seconds
+        self.switch_cost = config.get('scheduler_switch_cost', 0.2)
+        self.failed_visits = {}  # channel_num -> visits in a row without samples
+
+    def reset(self):
+        super().reset()
+        self.failed_visits = {}
+
+    def on_channel_visited(self, channel: ChannelModel, samples=1):
+        super().on_channel_visited(channel, samples)
+        if samples:
+            self.failed_visits.pop(channel.channel_num, None)
+        else:
+            self.failed_visits[channel.channel_num] = \
+                self.failed_visits.get(channel.channel_num, 0) + 1
+
+    def get_interval_and_weight(self, channel: ChannelModel):
+        if any(code in channel.total_alerts for code in self.URGENT_ALERTS):
+            return self.urgent_interval, 4
+
+        if any(code in channel.total_alerts for code in self.SIGNAL_ALERTS):
+            failed = self.failed_visits.get(channel.channel_num, 0)
+            # capped, 2 ** failed gets big quickly
+            interval = self.urgent_interval * 2 ** min(failed, 16)
+            return min(interval, self.quiet_interval), 1
+
+        if not channel.pid_enabled:
+            return self.monitor_only_interval, 1
+
+        if ChannelAlertCode.PID_LOCKED not in channel.total_alerts:
+            return self.active_interval, 2
+
+        interval = self.quiet_interval
+        if channel.freq_max_error and channel.error is not None:
+            ratio = min(abs(channel.error) / channel.freq_max_error, 1)
+            interval -= (self.quiet_interval - self.active_interval) * ratio
+
+        return interval, 1
+
+    def next_channel(self, channels, current=None):
+        now = time.time()
+        best, best_key = None, None
+
+        for channel in channels:
+            interval, weight = self.get_interval_and_weight(channel)
+            deadline = self.last_visit.get(channel.channel_num, 0) + interval
+
+            if deadline < now:
+                # overdue, the more important it is, the more overdue it
+                # looks, so the sooner it comes
+                key = now - (now - deadline) * weight
+            else:
+                key = deadline
+
+            if channel is current:
+                key -= self.switch_cost
+
+            if best_key is None or key < best_key:
+                best, best_key = channel, key
+
+        return best
+
+
+SCHEDULERS = {
+    "round_robin": RoundRobinScheduler,
+    "deadline": DeadlineScheduler,
+}
@@ -0,0 +1,112 @@
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.controller.wavemeter_ws7 import (
+    WavemeterWS7, SimulatedWavemeterWS7)
+from wavemeter_dashboard.controller.fiber_switch import (
+    FiberSwitch, SimulatedFiberSwitch)
+from wavemeter_dashboard.controller.arduino_dac import DAC, SimulatedDAC
+
+
+def get_instruments():
+    # One dict per wave meter, from "wavemeters" in the config. The keys:
+    #   "wlm_index": given to PresetWLMIndex, which wlmServer instance to use
+    #   "fiberswitch_com_port", "dac_com_port": its own fiber switch and DAC
+    #   "channel_offset": dashboard channel n is fiber switch channel
+    #       n - channel_offset of this wave meter
+    #   "channel_num": channels of its fiber switch, 16 by default
+    # Without "wavemeters" there is one, set up by the top level keys.
+    return config.get("wavemeters", None) or [{}]
+
+
+def find_instrument(channel_num):
+    # index of the wave meter a dashboard channel is measured by, or None
+    for i, instrument in enumerate(get_instruments()):
+        offset = instrument.get("channel_offset", 0)
+        if offset < channel_num <= offset + instrument.get("channel_num", 16):
+            return i
+
+    return None
+
+
+def get_channel_range():
+    # dashboard channel numbers that are on some fiber switch
+    instruments = get_instruments()
+    return (min(i.get("channel_offset", 0) for i in instruments) + 1,
+            max(i.get("channel_offset", 0) + i.get("channel_num", 16)
+                for i in instruments))
+
+
+def is_simulating(simulate=None):
+    # simulate=None means following "simulate_devices" in the config
+    if simulate is None:
+        return config.get("simulate_devices", False)
+    return simulate
+
+
+def uses_fiber_switch():
+    # "switcher": "internal" means the wavemeter's own multichannel switcher
+    return config.get("switcher", "fiber") == "fiber"
+
+
+def create_devices(simulate=None, instrument=None):
+    # returns (wavemeter, fiberswitch, dac) according to the config, of the
+    # instrument-th wave meter if given. fiberswitch is None with the
+    # internal switcher.
+    instrument = get_instruments()[instrument or 0]
+
+    if is_simulating(simulate):
+        return create_simulated_devices(instrument)
+
+    fbs_port = instrument.get("fiberswitch_com_port",
+                              config.get("fiberswitch_com_port"))
+    dac_port = instrument.get("dac_com_port", config.get("dac_com_port"))
+    assert fbs_port or not uses_fiber_switch()
+    assert dac_port
+
+    wm = WavemeterWS7(instrument.get("wlm_index", None))
+    fs = None
+    if uses_fiber_switch():
+        fs = FiberSwitch(fbs_port, instrument.get("channel_num", 16),
+                         timeout=config.get("fiberswitch_timeout", 1))
+    dac = DAC(dac_port, timeout=config.get("dac_timeout", 1), **_dac_options())
+
+    return wm, fs, dac
+
+
+def _dac_options():
+    return {
+        'shadow_register': config.get("dac_shadow_register", False),
+        'refresh_interval': config.get("dac_shadow_refresh_interval", 10),
+    }
+
+
+def create_simulated_devices(instrument=None):
+    params = config.get("simulation", {})
+    instrument = instrument or {}
+    offset = instrument.get("channel_offset", 0)
+    channel_num = instrument.get("channel_num", 16)
+
+    # make the simulated lasers sit near their setpoints. They are keyed by
+    # the fiber switch channel.
+    base_frequencies = {}
+    for chan in config.get("channels", []):
+        if chan.get("freq_setpoint") and \
+                offset < chan["channel_num"] <= offset + channel_num:
+            base_frequencies[chan["channel_num"] - offset] = chan["freq_setpoint"]
+
+    wm = SimulatedWavemeterWS7(
+        base_frequencies,
+        latency=params.get("latency", 0.0),
+        noise=params.get("noise", 1e6),
+        drift=params.get("drift", 0.0),
+        dropout_rate=params.get("dropout_rate", 0.0),
+        bad_signal_rate=params.get("bad_signal_rate", 0.0),
+        settle_time=params.get("settle_time", 0.0),
+        seed=params.get("seed", None))
+    fs = None
+    if uses_fiber_switch():
+        fs = SimulatedFiberSwitch(wm, channel_num,
+                                  latency=params.get("serial_latency", 0.0))
+    dac = SimulatedDAC(latency=params.get("serial_latency", 0.0),
+                       **_dac_options())
+
+    return wm, fs, dac
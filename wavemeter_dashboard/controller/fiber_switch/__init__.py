@@ -1 +1,4 @@
-from .fiberswitch import FiberSwitch
\ No newline at end of file
+from .fiberswitch import (
+    FiberSwitch, FiberSwitchException, FiberSwitchMismatchException,
+    FiberSwitchTimeoutException)
+from .simulated_fiberswitch import SimulatedFiberSwitch
@@ -1,23 +1,69 @@
-from serial import Serial
+from serial import Serial, SerialTimeoutException
+
+
+class FiberSwitchException(Exception):
+    pass
+
+
+class FiberSwitchMismatchException(FiberSwitchException):
+    pass
+
+
+class FiberSwitchTimeoutException(FiberSwitchException):
+    pass
+
 
 class FiberSwitch:
-    def __init__(self, com_port, channel_num=16):
+    def __init__(self, com_port, channel_num=16, timeout=1):
+        # timeout: seconds to wait for an answer, or for a write to go out
         self.channel_num = channel_num
-        self.serial = Serial(com_port, 57600, timeout=200)
+        self.serial = Serial(com_port, 57600, timeout=timeout,
+                             write_timeout=timeout)
+        self.pending_channel = None  # switched without reading back yet
 
         assert self.query("firmware?")  # check serial connection
 
     def query(self, qry):
         self.write(qry)
-        return self.serial.readline().rstrip()
+        return self.read_reply()
+
+    def read_reply(self):
+        reply = self.serial.readline()
+        if not reply.endswith(b"\n"):
+            raise FiberSwitchTimeoutException(f"No answer, got {reply!r}")
+        return reply.rstrip()
 
     def write(self, w):
-        self.serial.write(w.encode("utf-8") + b"\r\n")
+        try:
+            self.serial.write(w.encode("utf-8") + b"\r\n")
+        except SerialTimeoutException as e:
+            raise FiberSwitchTimeoutException(str(e))
 
-    def switch_channel(self, channel):
+    def switch_channel(self, channel, verify=True):
+        # verify=False doesn't wait for the read back. It is asked for in the
+        # same write, and checked by verify_switch() later, e.g. after the
+        # light settled down.
         assert isinstance(channel, int) and 1 <= channel <= self.channel_num
-        self.write(f"ch{channel}")
-        assert self.query_channel() == channel
+        self.verify_switch()  # don't leave an answer in the buffer
+
+        if verify:
+            self.write(f"ch{channel}")
+            self.pending_channel = channel
+            self.write("ch?")
+            self.verify_switch()
+        else:
+            self.write(f"ch{channel}\r\nch?")
+            self.pending_channel = channel
+
+    def verify_switch(self):
+        if self.pending_channel is None:
+            return
+
+        channel, self.pending_channel = self.pending_channel, None
+        reply = self.read_reply()
+        if reply != str(channel).encode():
+            raise FiberSwitchMismatchException(
+                f"Switched to {channel}, fiber switch says {reply!r}")
 
     def query_channel(self):
         return int(self.query("ch?"))
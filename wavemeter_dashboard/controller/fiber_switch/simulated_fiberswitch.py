@@ -0,0 +1,44 @@
+import time
+from collections import deque
+
+from .fiberswitch import FiberSwitch
+
+
+class SimulatedFiberSwitch(FiberSwitch):
+    # Talks like FiberSwitch, without a serial port. If a simulated wavemeter
+    # is given, it is told which channel is now in the fiber.
+
+    def __init__(self, wavemeter=None, channel_num=16, latency=0.0):
+        self.channel_num = channel_num
+        self.wavemeter = wavemeter
+        self.latency = latency
+        self.channel = 1
+        self.pending_channel = None
+        self._replies = deque()  # (time it arrives, reply)
+
+    def read_reply(self):
+        if not self._replies:
+            return b""
+
+        arrives_at, reply = self._replies.popleft()
+        if arrives_at > time.time():
+            time.sleep(arrives_at - time.time())
+        return reply
+
+    def write(self, w):
+        if self.latency:
+            time.sleep(self.latency)
+
+        for line in w.split("\r\n"):
+            if line.startswith("ch") and line[2:].isdigit():
+                self.channel = int(line[2:])
+                if self.wavemeter:
+                    self.wavemeter.select_channel(self.channel)
+            elif line == "ch?":
+                self._reply(str(self.channel).encode())
+            elif line == "firmware?":
+                self._reply(b"simulated")
+
+    def _reply(self, reply):
+        # takes another trip over the serial line
+        self._replies.append((time.time() + self.latency, reply))
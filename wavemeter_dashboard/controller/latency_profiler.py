@@ -0,0 +1,161 @@
+import csv
+import io
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from threading import Lock
+
+
+class LatencyHistogram:
+    # Durations in logarithmic bins, 10 per decade from 10 us to 100 s.
+    # Adding a value is a bisect and a few additions, cheap enough for every
+    # call on the monitor path.
+
+    BIN_EDGES = [10 ** (e / 10) for e in range(-50, 21)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BIN_EDGES) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_right(self.BIN_EDGES, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram'):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, q):
+        # upper edge of the bin the q-th percentile falls in, at most max
+        if not self.count:
+            return 0
+
+        target = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                if i < len(self.BIN_EDGES):
+                    return min(self.BIN_EDGES[i], self.max)
+                return self.max
+
+        return self.max
+
+
+class LatencyProfiler:
+    # Latency histograms of what Monitor spends its time on, per operation
+    # and channel. The operations Monitor records:
+    OPERATIONS = [
+        "switch",  # fiber switch command
+        "verify_switch",  # reading back the fiber switch
+        "exposure",  # setting the exposure after switching
+        "settle",  # waiting for the light to settle down
+        "frequency",  # a frequency reading, successful or not
+        "retry_wait",  # sleeping between failed readings
+        "poll_wait",  # sleeping between readings, in poll mode
+        "pattern",  # interference pattern fetch
+        "dac_query",  # reading the DAC value for the PID
+        "dac_write",  # writing (or queueing) the PID output
+        "visit",  # a whole visit of a channel, all of the above
+        "sample_age",  # from the measurement to its data reaching the model
+    ]
+
+    # not part of the sweep, no share of it to show. "display" is recorded
+    # by the dashboard: from the measurement to the frequency being drawn.
+    OUTSIDE_SWEEP = {"sample_age", "display"}
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}  # (operation, channel_num) -> LatencyHistogram
+            self.started_at = time.time()
+
+    def record(self, operation, channel_num, seconds):
+        if not self.enabled:
+            return
+
+        key = (operation, channel_num)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.add(seconds)
+
+    @contextmanager
+    def measure(self, operation, channel_num=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(operation, channel_num, time.perf_counter() - start)
+
+    def breakdown(self, per_channel=False):
+        # rows of (operation, channel_num, histogram), sorted by the time
+        # spent. channel_num is None unless per_channel.
+        with self._lock:
+            merged = {}
+            for (operation, channel_num), histogram in self.histograms.items():
+                key = (operation, channel_num if per_channel else None)
+                if key not in merged:
+                    merged[key] = LatencyHistogram()
+                merged[key].merge(histogram)
+
+        return sorted(((op, ch, h) for (op, ch), h in merged.items()),
+                      key=lambda row: row[2].total, reverse=True)
+
+    def report(self, fmt="text", per_channel=False):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        rows = self.breakdown(per_channel)
+        visits = sum(h.total for op, _, h in rows if op == "visit")
+        rows.sort(key=lambda row: row[0] in self.OUTSIDE_SWEEP)
+
+        header = ["operation", "channel", "count", "total_s", "share",
+                  "mean_ms", "p50_ms", "p99_ms", "max_ms"]
+        lines = []
+        for operation, channel_num, h in rows:
+            # share of the sweep, i.e. of the time spent visiting channels
+            share = h.total / visits if visits else h.total / elapsed
+            if operation in self.OUTSIDE_SWEEP:
+                share = None
+            lines.append([operation, "" if channel_num is None else channel_num,
+                          h.count, round(h.total, 3),
+                          "" if share is None else round(share, 4),
+                          round(h.mean() * 1e3, 3),
+                          round(h.percentile(50) * 1e3, 3),
+                          round(h.percentile(99) * 1e3, 3),
+                          round(h.max * 1e3, 3)])
+
+        if fmt == "csv":
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(header)
+            writer.writerows(lines)
+            return out.getvalue()
+
+        summary = f"{elapsed:.1f}s profiled"
+        if visits:
+            summary += f", {visits:.1f}s visiting channels"
+        text = [summary,
+                f"{'OPERATION':<14}{'CH':>3}{'COUNT':>8}{'TOTAL':>9}{'SHARE':>7}"
+                f"{'MEAN':>9}{'P50':>9}{'P99':>9}{'MAX':>9}"]
+        for operation, channel_num, count, total, share, mean, p50, p99, max_ in lines:
+            share = f"{share:>7.1%}" if share != "" else f"{'-':>7}"
+            text.append(f"{operation:<14}{channel_num!s:>3}{count:>8}{total:>8.2f}s"
+                        f"{share}{mean:>7.1f}ms{p50:>7.1f}ms{p99:>7.1f}ms"
+                        f"{max_:>7.1f}ms")
+        return "\n".join(text)
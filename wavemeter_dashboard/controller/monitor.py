@@ -1,19 +1,29 @@
 from typing import Dict
 import time
+from collections import deque
 import numpy as np
-from threading import Thread, Lock, Condition
+from threading import Thread, Lock, Event
 from functools import partial
-from PyQt5.QtCore import pyqtSignal, QObject
+from PyQt5.QtCore import pyqtSignal, QObject, Qt
 
 from wavemeter_dashboard.controller.wavemeter_ws7 import (
     WavemeterWS7, WavemeterWS7Exception,
     WavemeterWS7BadSignalException, WavemeterWS7LowSignalException,
-    WavemeterWS7NoSignalException, WavemeterWS7HighSignalException)
-from wavemeter_dashboard.controller.fiber_switch import FiberSwitch
-from wavemeter_dashboard.controller.arduino_dac import DAC, DACOutOfBoundException
+    WavemeterWS7NoSignalException, WavemeterWS7HighSignalException,
+    WavemeterWS7TimeoutException)
+from wavemeter_dashboard.controller.fiber_switch import (
+    FiberSwitch, FiberSwitchException)
+from wavemeter_dashboard.controller.arduino_dac import (
+    DAC, DACOutOfBoundException, DACTimeoutException, DACWorker,
+    DACWorkerQueueFullException)
+from wavemeter_dashboard.controller.settle_time_learner import SettleTimeLearner
+from wavemeter_dashboard.controller.channel_scheduler import SCHEDULERS
+from wavemeter_dashboard.controller.latency_profiler import LatencyProfiler
 from wavemeter_dashboard.config import config
 from wavemeter_dashboard.model.channel_alert import ChannelAlertCode
 from wavemeter_dashboard.model.channel_model import ChannelModel
+from wavemeter_dashboard.model.history_store import open_history_store
+from wavemeter_dashboard.model.pattern_archive import open_pattern_archive
 
 
 class Monitor(QObject):
@@ -23,18 +33,28 @@ class Monitor(QObject):
     on_monitoring_channel = pyqtSignal(int)
     on_channel_error = pyqtSignal(int, str)
 
-    def __init__(self, wavemeter: WavemeterWS7, fiberswitch: FiberSwitch, dac: DAC):
+    def __init__(self, wavemeter: WavemeterWS7, fiberswitch: FiberSwitch, dac: DAC,
+                 channel_offset=0):
+        # channel_offset: channel n is fiber switch channel n - channel_offset,
+        # when there are several wave meters and switches
         super().__init__()
         self.wavemeter = wavemeter
         self.fiberswitch = fiberswitch
         self.dac = dac
+        self.channel_offset = channel_offset
 
         self.monitor_thread = None
         self.channels: Dict[ChannelModel] = {}
 
-        self.stop_monitoring_flag = False
+        self.monitoring = False
+        self.stop_event = Event()
         self.monitoring_lock = Lock()
-        self.monitor_stop_cv = Condition()
+
+        # stop_monitoring returns after this long even if the monitor thread
+        # is stuck in a device call. Blocking waits are made of pieces of
+        # stop_check_interval, checking stop_event in between.
+        self.stop_timeout = config.get('monitor_stop_timeout', 1)
+        self.stop_check_interval = config.get('monitor_stop_check_interval', 0.1)
 
         self.last_monitored_channel = None
 
@@ -43,8 +63,67 @@ class Monitor(QObject):
         self.out_of_lock_error_wait_time = config.get('wait_time_before_out_of_lock_error', 10)
         self.locked_wait_time = config.get('wait_time_before_locked', 10)
 
+        # "poll": read the frequency, retry with sleeps in between.
+        # "event": block on the wavemeter's new measurement event instead.
+        self.acquisition_mode = config.get('acquisition_mode', 'poll')
+        self.event_acquisition_timeout = config.get('event_acquisition_timeout', 0.5)
+
+        self.settle_time_learner = None
+        if config.get('adaptive_settle_time', False):
+            self.settle_time_learner = SettleTimeLearner(
+                initial_wait=self.after_switch_wait_time,
+                margin=config.get('settle_time_margin', 0.02),
+                max_wait=config.get('settle_time_max', 1.0),
+                tolerance=config.get('settle_transient_tolerance', 1e9))
+        self.scheduler = SCHEDULERS[config.get('channel_scheduler', 'round_robin')]()
+
+        # write the DAC from a background thread, the results are queued
+        # back to the monitor thread, which raises the alerts
+        self.dac_worker = None
+        self.dac_results = deque()  # (dac_channel_num, railed, error, value)
+        # channel_num -> (time, value) of the sample whose DAC output is on
+        # the way, its railed flag is set once the worker has written it
+        self.dac_records = {}
+        if config.get('dac_async_writes', False):
+            self.dac_worker = DACWorker(
+                dac, self._queue_dac_result,
+                max_pending=config.get('dac_queue_size', 64))
+
+        self.profiler = LatencyProfiler(config.get('latency_profiling', False))
+
+        # every sample also goes to disk, if "history_store_path" is set
+        self.history_store = open_history_store()
+
+        # the patterns around alerts go to disk, if "pattern_archive_path" is
+        # set. The patterns are then read all the time, not only when shown.
+        self.pattern_archive = open_pattern_archive()
+
+        # "fiber": the serial fiber switch, one channel at a time.
+        # "internal": the wavemeter's own multichannel switcher goes through
+        #     the channels by itself, and all of them are read in each pass.
+        self.switcher = config.get('switcher', 'fiber')
+        self.switcher_setup = {}  # channel_num -> (expo, expo2) given to it
+        self.switcher_last_frequency = {}  # channel_num -> Hz
+        self.last_measured_at = {}  # channel_num -> time of the last sample
+
+        # don't wait for the fiber switch to confirm before settling, check
+        # its answer afterwards
+        self.optimistic_switch = config.get('fiberswitch_optimistic_switch', False)
+
+        self.switched_at = 0
+        self.previous_channel_num = None
+        self.last_failed_read_at = 0
+        # channels with a wavemeter alert raised since their last sample, a
+        # burst can end with a failed read after some good ones
+        self.failed_reads = set()
+
     def start_monitoring(self):
-        self.monitor_thread = Thread(name="Monitor", target=self._monitor, daemon=True)
+        # a new event every time, a thread left over from the last run still
+        # holds on to its own (set) one
+        self.stop_event = Event()
+        self.monitoring = True
+        self.monitor_thread = Thread(name="Monitor", target=self._monitor,
+                                     args=(self.stop_event,), daemon=True)
         self.monitor_thread.start()
         self.on_monitor_started.emit()
 
@@ -62,7 +141,11 @@ class Monitor(QObject):
         channel.deviate_since = 0
         channel.stable_since = 0
 
-    def _monitor(self):
+    def _sleep(self, seconds):
+        # returns True if stopped while sleeping
+        return self.stop_event.wait(seconds)
+
+    def _monitor(self, stop_event):
         with self.monitoring_lock:
             for channel in self.channels.values():
                 if not channel.monitor_enabled:
@@ -71,183 +154,602 @@ class Monitor(QObject):
                 self.before_monitoring_channel_setup(channel)
 
             self.wavemeter.set_auto_exposure(False)
-            while not self.stop_monitoring_flag:
-                for channel in self.channels.values():
-                    if not channel.monitor_enabled:
-                        continue
+            self.scheduler.reset()
+            if self.switcher == "internal":
+                self._run_internal_switcher(stop_event)  # until stopped
+
+            while not stop_event.is_set():
+                channels = [channel for channel in self.channels.values()
+                            if channel.monitor_enabled]
+                if not channels:
+                    stop_event.wait(0.05)
+                    continue
 
-                    if self.stop_monitoring_flag:
-                        break
+                channel = self.scheduler.next_channel(
+                    channels, self.last_monitored_channel)
 
-                    # t = time.time()
+                with self.profiler.measure("visit", channel.channel_num):
                     if not self.last_monitored_channel or self.last_monitored_channel != channel:
                         self.on_monitoring_channel.emit(channel.channel_num)
                         channel.on_new_alert.emit(ChannelAlertCode.MONTIROING)
-                        self._update_one_channel(channel.channel_num)
+                        samples = self._update_one_channel(channel.channel_num)
                         channel.on_alert_cleared.emit(ChannelAlertCode.MONTIROING)
                     else:
-                        self._update_one_channel(channel.channel_num)
-                    # print(f"fps {1/(time.time() - t)}")
-
-        self.stop_monitoring_flag = False
-        self.last_monitored_channel = None
+                        samples = self._update_one_channel(channel.channel_num)
+
+                self.scheduler.on_channel_visited(channel, samples)
+                channel.sample_rate = self.scheduler.get_sample_rate(
+                    channel.channel_num)
+                self._handle_dac_results()
+
+            self.last_monitored_channel = None
+
+    def _run_internal_switcher(self, stop_event):
+        self.wavemeter.set_switcher_mode(True)
+        self.switcher_setup = {}
+        self.switcher_last_frequency = {}
+
+        while not stop_event.is_set():
+            channels = [channel for channel in self.channels.values()
+                        if channel.monitor_enabled]
+            self._setup_internal_switcher(channels)
+            if not channels:
+                stop_event.wait(0.05)
+                continue
+
+            # one pass per finished measurement, or every 50ms
+            if self.acquisition_mode == "event":
+                try:
+                    self.wavemeter.wait_for_switcher_measurement(
+                        self.stop_check_interval)
+                except WavemeterWS7TimeoutException:
+                    continue
+            elif stop_event.wait(0.05):
+                break
 
-        with self.monitor_stop_cv:
-            self.monitor_stop_cv.notify_all()
+            for channel in channels:
+                with self.profiler.measure("visit", channel.channel_num):
+                    samples = self._update_switcher_channel(channel)
+
+                self.scheduler.on_channel_visited(channel, samples)
+                channel.sample_rate = self.scheduler.get_sample_rate(
+                    channel.channel_num)
+            self._handle_dac_results()
+
+    def _setup_internal_switcher(self, channels):
+        # tells the wavemeter which channels to measure, with what exposure
+        wanted = {channel.channel_num: (channel.expo_time, channel.expo2_time)
+                  for channel in channels}
+
+        for num in set(self.switcher_setup) - set(wanted):
+            self.wavemeter.set_switcher_signal(num - self.channel_offset, False)
+            del self.switcher_setup[num]
+            self.switcher_last_frequency.pop(num, None)
+
+        for num, exposures in wanted.items():
+            if self.switcher_setup.get(num) == exposures:
+                continue
+            with self.profiler.measure("exposure", num):
+                self.wavemeter.set_exposure_num(num - self.channel_offset,
+                                                *exposures)
+                if num not in self.switcher_setup:
+                    self.wavemeter.set_switcher_signal(
+                        num - self.channel_offset, True)
+            self.switcher_setup[num] = exposures
+
+    def _update_switcher_channel(self, ch: ChannelModel):
+        # takes the latest frequency of the channel if it's a new one,
+        # returns the number of new samples
+        not_successful_last_time = ch.frequency is None or \
+            ch.channel_num in self.failed_reads
+
+        with self.profiler.measure("frequency", ch.channel_num):
+            frequency = self._alert_on_error(
+                ch, self.wavemeter.get_frequency_num,
+                ch.channel_num - self.channel_offset)
+
+        if frequency is None:
+            if ch.channel_num in self.switcher_last_frequency:
+                ch.frequency = None  # failed, not just waiting for the switcher
+                del self.switcher_last_frequency[ch.channel_num]
+            return 0
+
+        frequency *= 1e12
+        if self.switcher_last_frequency.get(ch.channel_num) == frequency:
+            return 0  # not measured again since the last pass
+        self.switcher_last_frequency[ch.channel_num] = frequency
+
+        # the interference pattern is of whichever channel is measured now,
+        # so it isn't read
+        self._on_new_frequencies(ch, [frequency], [self._measurement_time(ch)],
+                                 not_successful_last_time,
+                                 ch.pid_enabled and ch.freq_setpoint,
+                                 read_patterns=False)
+        return 1
 
     def _update_one_channel(self, channel_num):
         ch: ChannelModel = self.channels[channel_num]
 
+        just_switched = False
         if not self.last_monitored_channel or self.last_monitored_channel != ch:
-            self.fiberswitch.switch_channel(channel_num)
-            time.sleep(0.2)
-
-            self.wavemeter.set_exposure(ch.expo_time, ch.expo2_time)
+            self.previous_channel_num = self.last_monitored_channel.channel_num \
+                if self.last_monitored_channel else None
+            self.switched_at = time.time()
+            self.last_failed_read_at = 0
+            try:
+                with self.profiler.measure("switch", channel_num):
+                    self.fiberswitch.switch_channel(
+                        channel_num - self.channel_offset, verify=not self.optimistic_switch)
+
+                # the exposure setting can be changed while the light settles down
+                with self.profiler.measure("exposure", channel_num):
+                    self.wavemeter.set_exposure(ch.expo_time, ch.expo2_time)
+                with self.profiler.measure("settle", channel_num):
+                    if self._sleep(self._get_settle_time(ch)):
+                        self.last_monitored_channel = None
+                        return 0
+
+                with self.profiler.measure("verify_switch", channel_num):
+                    self.fiberswitch.verify_switch()
+            except FiberSwitchException as e:
+                # whatever the wavemeter sees now isn't this channel
+                self.last_monitored_channel = None
+                self.on_channel_error.emit(channel_num, str(e))
+                if ChannelAlertCode.FIBER_SWITCH_ERROR not in ch.total_alerts:
+                    ch.on_new_alert.emit(ChannelAlertCode.FIBER_SWITCH_ERROR)
+                return 0
+
+            if ChannelAlertCode.FIBER_SWITCH_ERROR in ch.total_alerts:
+                ch.on_alert_cleared.emit(ChannelAlertCode.FIBER_SWITCH_ERROR)
             self.last_monitored_channel = ch
-        else:
-            time.sleep(0.05)  # stop the PC from burning
+            just_switched = True
+        elif self.acquisition_mode != "event":
+            with self.profiler.measure("poll_wait", channel_num):
+                if self._sleep(0.05):  # stop the PC from burning
+                    return 0
+
+        not_successful_last_time = ch.frequency is None or \
+            ch.channel_num in self.failed_reads
+
+        times = []
+        frequencies = []
+        taken = 0  # handed over to _on_new_frequencies already
+        dwell_until = time.time() + ch.dwell_time / 1000 if ch.dwell_time else 0
+        run_pid = ch.pid_enabled and ch.freq_setpoint
+        failed = False  # the last read raised an alert
+
+        while True:
+            frequency = self._read_frequency(ch, just_switched and not frequencies)
+            if frequency is None:
+                failed = True
+                break
 
-        not_successful_last_time = (ch.frequency is None)
-        success = False
-        max_attempts = 6
-        for attempt in range(max_attempts - 1):
-            # we don't know how long it needs for the wavemeter to settle down
-            # let's try for 300ms
-            try:
-                ch.frequency = self.wavemeter.get_frequency() * 1e12
-                success = True
+            times.append(self._measurement_time(ch))
+            frequencies.append(frequency)
+
+            if dwell_until:
+                if times[-1] >= dwell_until:
+                    break
+            elif len(frequencies) >= max(ch.dwell_samples or 1, 1):
                 break
-            except WavemeterWS7Exception as e:
-                pass
-            time.sleep(0.05)
-        if not success:
-            # last chance before throwing out errors
-            try:
-                ch.frequency = self.wavemeter.get_frequency() * 1e12
-                success = True
-            except WavemeterWS7NoSignalException:
-                ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_NO_SIGNAL)
-            except WavemeterWS7BadSignalException:
-                ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_BAD_SIGNAL)
-            except WavemeterWS7HighSignalException:
-                ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_OVER_EXPOSED)
-            except WavemeterWS7LowSignalException:
-                ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_UNDER_EXPOSED)
-            except WavemeterWS7Exception:
-                ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_UNKNOWN_ERROR)
-        
-        if not success:
+
+            if self.stop_event.is_set():
+                break
+
+            if run_pid and ch.dwell_pid_every_sample:
+                # one at a time, so each PID output goes with its sample
+                self._on_new_frequencies(ch, frequencies[taken:], times[taken:],
+                                         not_successful_last_time and not taken,
+                                         run_pid, read_patterns=False)
+                taken = len(frequencies)
+
+            if self.acquisition_mode != "event":
+                with self.profiler.measure("poll_wait", channel_num):
+                    if self._sleep(0.05):
+                        break
+
+        if not frequencies:
             ch.frequency = None
-            return
-        
+            return 0
+
+        if taken < len(frequencies):
+            # the alert of a failed read after them stays up, until a
+            # sample comes after it
+            self._on_new_frequencies(ch, frequencies[taken:], times[taken:],
+                                     not_successful_last_time and not taken
+                                     and not failed, run_pid)
+        return len(frequencies)
+
+    def _measurement_time(self, ch: ChannelModel):
+        # When the wavemeter took the reading just made, from its events.
+        # In poll mode, or if the wavemeter didn't tell, it's now.
+        now = time.time()
+        measured_at = None
+        if self.acquisition_mode == "event":
+            measured_at = self.wavemeter.get_measurement_time(
+                ch.channel_num - self.channel_offset
+                if self.switcher == "internal" else 1)
+
+        # the event of this reading may not have come through yet
+        if measured_at is None or measured_at > now or \
+                measured_at <= self.last_measured_at.get(ch.channel_num, 0):
+            measured_at = now
+
+        self.last_measured_at[ch.channel_num] = measured_at
+        return measured_at
+
+    def _on_new_frequencies(self, ch: ChannelModel, frequencies, times,
+                            not_successful_last_time, run_pid,
+                            read_patterns=True):
+        # how long the samples took from the wavemeter to here
+        now = time.time()
+        for t in times:
+            self.profiler.record("sample_age", ch.channel_num, now - t)
+
         if not_successful_last_time:
+            self.failed_reads.discard(ch.channel_num)
             ch.on_alert_cleared.emit(ChannelAlertCode.WAVEMETER_NO_SIGNAL)
             ch.on_alert_cleared.emit(ChannelAlertCode.WAVEMETER_BAD_SIGNAL)
             ch.on_alert_cleared.emit(ChannelAlertCode.WAVEMETER_OVER_EXPOSED)
             ch.on_alert_cleared.emit(ChannelAlertCode.WAVEMETER_UNDER_EXPOSED)
             ch.on_alert_cleared.emit(ChannelAlertCode.WAVEMETER_UNKNOWN_ERROR)
         
-        ch.freq_longterm_data.append(ch.frequency)
+        ch.frequency = frequencies[-1]
 
+        errors = None
         if ch.freq_setpoint:
-            ch.error = ch.frequency - ch.freq_setpoint
-            ch.err_longterm_data.append(ch.error)
+            errors = np.array(frequencies) - ch.freq_setpoint
+            ch.error = float(errors[-1])
+
+        ch.history.extend(times, frequencies, errors)
+
+        if errors is not None:
             if ch.freq_max_error:
-                if abs(ch.error) > ch.freq_max_error:
-                    ch.stable_since = 0
-                    if ch.deviate_since == 0:
-                        ch.deviate_since = time.time()
-
-                    time_elapsed = time.time() - ch.deviate_since
-                    if time_elapsed > self.out_of_lock_error_wait_time:
-                        if ch.pid_enabled and ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING \
-                                not in ch.total_alerts:
-                            ch.on_new_alert.emit(
-                                ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING)
-                    elif time_elapsed > self.deviate_warning_wait_time:
-                        if ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL\
-                                not in ch.total_alerts:
-                            ch.on_alert_cleared.emit(ChannelAlertCode.PID_LOCKED)
-                            ch.on_new_alert.emit(
-                                ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL)
-                else:
-                    ch.deviate_since = 0
-                    if ch.stable_since == 0:
-                        ch.stable_since = time.time()
-                        if ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING in ch.total_alerts or \
-                                ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL in ch.total_alerts:
-                            ch.on_alert_cleared.emit(
-                                ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL)
-                            ch.on_alert_cleared.emit(
-                                ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING)
-
-                    if ch.pid_enabled and time.time() - ch.stable_since > self.locked_wait_time:
-                        if ChannelAlertCode.PID_LOCKED not in ch.total_alerts:
-                            ch.on_new_alert.emit(ChannelAlertCode.PID_LOCKED)
+                self._check_error_bound(ch)
 
         ch.on_freq_changed.emit()
 
-        if ch.isSignalConnected(ch.on_pattern_changed_meta):
-            ch.pattern_data = self.wavemeter.get_next_pattern()
-            ch.on_pattern_changed.emit()
+        if read_patterns and (self.pattern_archive or
+                              ch.isSignalConnected(ch.on_pattern_changed_meta)):
+            self._update_pattern(ch, False)
+
+        if read_patterns and ch.isSignalConnected(ch.on_wide_pattern_changed_meta):
+            self._update_pattern(ch, True)
 
-        if ch.isSignalConnected(ch.on_wide_pattern_changed_meta):
-            ch.wide_pattern_data = self.wavemeter.get_next_pattern(True)
+        if run_pid:
+            if ch.dwell_pid_every_sample:
+                self._run_pid(ch, errors[-1])
+            else:
+                # one correction for the whole burst, averaging out the noise
+                self._run_pid(ch, float(np.mean(errors)))
+
+        # after the PID, so the DAC output is on the records as well
+        if self.history_store:
+            self.history_store.append(ch.channel_num,
+                                      ch.history.tail(len(frequencies)))
+
+    def _update_pattern(self, ch: ChannelModel, wide):
+        try:
+            with self.profiler.measure("pattern", ch.channel_num):
+                pattern = self._wait_for_pattern(ch, wide)
+        except WavemeterWS7TimeoutException:
+            return  # keep showing the old one
+
+        if self.pattern_archive:
+            self.pattern_archive.add(ch.channel_num, pattern, wide)
+
+        if wide:
+            old_pattern, ch.wide_pattern_data = ch.wide_pattern_data, pattern
             ch.on_wide_pattern_changed.emit()
+        else:
+            old_pattern, ch.pattern_data = ch.pattern_data, pattern
+            ch.on_pattern_changed.emit()
 
-        if ch.pid_enabled and ch.freq_setpoint:
-            if ch.pid_i_last_time != 0:
-                ch.pid_i += ch.error / 1e12 * time.time() - ch.pid_i_last_time
-            prev_dac_output = self.dac.get_dac_value(ch.dac_channel_num)
-            output = prev_dac_output + ch.pid_p_prop_val * ch.error / 1e12 + ch.pid_i_prop_val * ch.pid_i
-            ch.pid_i_last_time = time.time()
+        # the old buffer is reused once nothing refers to it any more
+        self.wavemeter.pattern_pool.retire(old_pattern)
 
+    def _archive_pattern(self, ch: ChannelModel):
+        # what the wavemeter saw when it couldn't make out a frequency
+        if not self.pattern_archive:
+            return
+
+        try:
+            pattern = self._wait_for_pattern(ch, False)
+        except WavemeterWS7Exception:
+            return
+        self.pattern_archive.add(ch.channel_num, pattern)
+        self.wavemeter.pattern_pool.retire(pattern)
+
+    def _read_frequency(self, ch: ChannelModel, just_switched):
+        # returns the frequency in Hz, or None after raising an alert
+        return self._alert_on_error(ch, self._acquire_frequency, ch, just_switched)
+
+    def _alert_on_error(self, ch: ChannelModel, read, *args):
+        # returns what read(*args) does, or None after raising an alert
+        try:
+            return read(*args)
+        except WavemeterWS7TimeoutException:
+            # not the wavemeter's fault if we gave up waiting to stop
+            if self.stop_event.is_set():
+                return None
+            ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_UNKNOWN_ERROR)
+        except WavemeterWS7NoSignalException:
+            ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_NO_SIGNAL)
+        except WavemeterWS7BadSignalException:
+            ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_BAD_SIGNAL)
+            self._archive_pattern(ch)
+        except WavemeterWS7HighSignalException:
+            ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_OVER_EXPOSED)
+            self._archive_pattern(ch)
+        except WavemeterWS7LowSignalException:
+            ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_UNDER_EXPOSED)
+            self._archive_pattern(ch)
+        except WavemeterWS7Exception:
+            ch.on_new_alert.emit(ChannelAlertCode.WAVEMETER_UNKNOWN_ERROR)
+
+        self.failed_reads.add(ch.channel_num)
+        return None
+
+    def _check_error_bound(self, ch: ChannelModel):
+        if abs(ch.error) > ch.freq_max_error:
+            ch.stable_since = 0
+            if ch.deviate_since == 0:
+                ch.deviate_since = time.time()
+
+            time_elapsed = time.time() - ch.deviate_since
+            if time_elapsed > self.out_of_lock_error_wait_time:
+                if ch.pid_enabled and ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING \
+                        not in ch.total_alerts:
+                    ch.on_new_alert.emit(
+                        ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING)
+            elif time_elapsed > self.deviate_warning_wait_time:
+                if ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL\
+                        not in ch.total_alerts:
+                    ch.on_alert_cleared.emit(ChannelAlertCode.PID_LOCKED)
+                    ch.on_new_alert.emit(
+                        ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL)
+        else:
+            ch.deviate_since = 0
+            if ch.stable_since == 0:
+                ch.stable_since = time.time()
+                if ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING in ch.total_alerts or \
+                        ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL in ch.total_alerts:
+                    ch.on_alert_cleared.emit(
+                        ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_TEMPORAL)
+                    ch.on_alert_cleared.emit(
+                        ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING)
+
+            if ch.pid_enabled and time.time() - ch.stable_since > self.locked_wait_time:
+                if ChannelAlertCode.PID_LOCKED not in ch.total_alerts:
+                    ch.on_new_alert.emit(ChannelAlertCode.PID_LOCKED)
+
+    def _run_pid(self, ch: ChannelModel, error):
+        if ch.pid_i_last_time != 0:
+            ch.pid_i += error / 1e12 * time.time() - ch.pid_i_last_time
+        dac = self.dac_worker if self.dac_worker else self.dac
+        try:
+            with self.profiler.measure("dac_query", ch.channel_num):
+                prev_dac_output = dac.get_dac_value(ch.dac_channel_num)
+        except DACTimeoutException as e:
+            self._on_dac_result(ch.dac_channel_num, False, e)
+            return
+        output = prev_dac_output + ch.pid_p_prop_val * error / 1e12 + ch.pid_i_prop_val * ch.pid_i
+        ch.pid_i_last_time = time.time()
+
+        if self.dac_worker:
+            try:
+                with self.profiler.measure("dac_write", ch.channel_num):
+                    self.dac_worker.set_dac_value(ch.dac_channel_num, output)
+            except DACWorkerQueueFullException:
+                if ChannelAlertCode.PID_DAC_UNKNOWN_ERROR not in ch.total_alerts:
+                    ch.on_new_alert.emit(ChannelAlertCode.PID_DAC_UNKNOWN_ERROR)
+        else:
             try:
-                self.dac.set_dac_value(ch.dac_channel_num, output)
-                if ChannelAlertCode.PID_DAC_RAILED in ch.total_alerts:
-                    ch.on_alert_cleared.emit(ChannelAlertCode.PID_DAC_RAILED)
-                ch.dac_railed = False
+                with self.profiler.measure("dac_write", ch.channel_num):
+                    self.dac.set_dac_value(ch.dac_channel_num, output)
+                self._on_dac_result(ch.dac_channel_num, False, None)
             except DACOutOfBoundException:
-                ch.dac_railed = True
-                if ChannelAlertCode.PID_DAC_RAILED not in ch.total_alerts:
-                    ch.on_new_alert.emit(ChannelAlertCode.PID_DAC_RAILED)
+                self._on_dac_result(ch.dac_channel_num, True, None)
+            except DACTimeoutException as e:
+                self._on_dac_result(ch.dac_channel_num, False, e)
+
+        ch.dac_output = output
+        if self.dac_worker:
+            ch.history.set_dac(output)
+            self.dac_records[ch.channel_num] = (
+                float(ch.history.tail(1)['time'][0]), output)
+        else:
+            ch.history.set_dac(output, ch.dac_railed)
+
+        ch.on_pid_changed.emit()
+
+    def _queue_dac_result(self, dac_channel_num, railed, error, value=None):
+        # from the DAC worker thread. The alerts are raised on the monitor
+        # thread, the one everything listening to the channels expects them
+        # from (the shared-memory ring of a child process has one writer).
+        self.dac_results.append((dac_channel_num, railed, error, value))
+
+    def _handle_dac_results(self):
+        while self.dac_results:
+            dac_channel_num, railed, error, value = self.dac_results.popleft()
+            self._on_dac_result(dac_channel_num, railed, error)
+
+            for ch in list(self.channels.values()):
+                record = self.dac_records.get(ch.channel_num)
+                # a result for a value since replaced isn't this one's
+                if ch.dac_channel_num != dac_channel_num or not record or \
+                        record[1] != value:
+                    continue
+                del self.dac_records[ch.channel_num]
+                if not error:
+                    ch.history.set_dac(value, railed, record[0])
+
+    def _on_dac_result(self, dac_channel_num, railed, error):
+        # on the monitor thread
+        for ch in list(self.channels.values()):
+            if ch.dac_channel_num != dac_channel_num or not ch.pid_enabled:
+                continue
+
+            if error:
+                if ChannelAlertCode.PID_DAC_UNKNOWN_ERROR not in ch.total_alerts:
+                    ch.on_new_alert.emit(ChannelAlertCode.PID_DAC_UNKNOWN_ERROR)
+                continue
+            elif ChannelAlertCode.PID_DAC_UNKNOWN_ERROR in ch.total_alerts:
+                ch.on_alert_cleared.emit(ChannelAlertCode.PID_DAC_UNKNOWN_ERROR)
+
+            ch.dac_railed = railed
+            if railed and ChannelAlertCode.PID_DAC_RAILED not in ch.total_alerts:
+                ch.on_new_alert.emit(ChannelAlertCode.PID_DAC_RAILED)
+            elif not railed and ChannelAlertCode.PID_DAC_RAILED in ch.total_alerts:
+                ch.on_alert_cleared.emit(ChannelAlertCode.PID_DAC_RAILED)
+
+    def _get_settle_time(self, ch: ChannelModel):
+        if not self.settle_time_learner:
+            return self.after_switch_wait_time
+
+        key = SettleTimeLearner.make_key(ch.channel_num, ch.expo_time, ch.expo2_time)
+        return self.settle_time_learner.get_wait_time(key)
+
+    def _acquire_frequency(self, ch: ChannelModel, just_switched):
+        # returns the frequency in Hz, or raises the WavemeterWS7Exception of
+        # the last failed attempt
+        learner = self.settle_time_learner
+        fresh = just_switched
+
+        while True:
+            if self.acquisition_mode == "event":
+                frequency = self._wait_for_frequency(ch, fresh) * 1e12
+            else:
+                frequency = self._poll_frequency(ch) * 1e12
+            fresh = False
+
+            if not learner:
+                return frequency
+
+            if just_switched:
+                settling = time.time() - self.switched_at < learner.max_wait
+                if settling and learner.is_transient(
+                        ch.channel_num, self.previous_channel_num, frequency):
+                    # still seeing the previous channel, try again
+                    self.last_failed_read_at = time.time()
+                    if self.acquisition_mode != "event":
+                        with self.profiler.measure("retry_wait", ch.channel_num):
+                            self._sleep(0.01)
+                    if self.stop_event.is_set():
+                        raise WavemeterWS7TimeoutException("Stopped")
+                    continue
 
-            ch.dac_output = output
-            ch.dac_longterm_data.append(output)
+                key = SettleTimeLearner.make_key(
+                    ch.channel_num, ch.expo_time, ch.expo2_time)
+                if self.last_failed_read_at:
+                    learner.record(key, self.last_failed_read_at - self.switched_at)
+                else:
+                    learner.record(key)
 
-            ch.on_pid_changed.emit()
+            learner.remember_frequency(ch.channel_num, frequency)
+            return frequency
+
+    def _poll_frequency(self, ch: ChannelModel):
+        max_attempts = 6
+        for attempt in range(max_attempts - 1):
+            # we don't know how long it needs for the wavemeter to settle down
+            # let's try for 300ms
+            try:
+                with self.profiler.measure("frequency", ch.channel_num):
+                    return self.wavemeter.get_frequency()
+            except WavemeterWS7Exception as e:
+                self.last_failed_read_at = time.time()
+            with self.profiler.measure("retry_wait", ch.channel_num):
+                if self._sleep(0.05):
+                    break
+
+        # last chance before throwing out errors
+        with self.profiler.measure("frequency", ch.channel_num):
+            return self.wavemeter.get_frequency()
+
+    def _measurement_timeout(self, ch: ChannelModel):
+        # a measurement needs both exposures, give it some room on top of that
+        return self.event_acquisition_timeout + \
+            ((ch.expo_time or 0) + (ch.expo2_time or 0)) / 1000
+
+    def _wait_piece(self, deadline):
+        return min(max(deadline - time.time(), 0), self.stop_check_interval)
+
+    def _wait_for_pattern(self, ch: ChannelModel, wide):
+        deadline = time.time() + self._measurement_timeout(ch)
+
+        while True:
+            try:
+                return self.wavemeter.get_next_pattern(
+                    wide, self._wait_piece(deadline))
+            except WavemeterWS7TimeoutException:
+                if self.stop_event.is_set() or time.time() >= deadline:
+                    raise
+
+    def _wait_for_frequency(self, ch: ChannelModel, fresh):
+        deadline = time.time() + self._measurement_timeout(ch)
+
+        while True:
+            try:
+                with self.profiler.measure("frequency", ch.channel_num):
+                    return self.wavemeter.wait_for_frequency(
+                        self._wait_piece(deadline), fresh)
+            except WavemeterWS7TimeoutException:
+                if self.stop_event.is_set() or time.time() >= deadline:
+                    raise
+            except WavemeterWS7Exception:
+                # e.g. the wavemeter hasn't settled down after switching,
+                # the next measurement might be fine
+                self.last_failed_read_at = time.time()
+                if time.time() >= deadline:
+                    raise
+            fresh = False
+
+    def get_latency_report(self, fmt="text", per_channel=False):
+        return self.profiler.report(fmt, per_channel)
+
+    def reset_latency_profile(self):
+        self.profiler.reset()
 
     def get_auto_expo_params(self, channel_num):
         with self.monitoring_lock:
-            self.fiberswitch.switch_channel(channel_num)
-            time.sleep(0.2)
+            if self.switcher == "internal":
+                self.wavemeter.set_switcher_mode(False)
+                self.wavemeter.set_switcher_channel(channel_num - self.channel_offset)
+            else:
+                self.fiberswitch.switch_channel(channel_num - self.channel_offset)
+            time.sleep(self.after_switch_wait_time)
             self.wavemeter.set_auto_exposure(True)
             time.sleep(1)
             exposure, exposure2 = self.wavemeter.get_exposure()
             return exposure, exposure2
 
     def stop_monitoring(self):
-        if not self.monitoring_lock.locked():
+        if not self.monitoring:
             return
         self.on_monitor_stop_req.emit()
 
-        self.stop_monitoring_flag = True
-        with self.monitor_stop_cv:
-            self.monitor_stop_cv.wait()
+        self.monitoring = False
+        self.stop_event.set()
 
-            for channel in self.channels.values():
-                if channel.monitor_enabled:
-                    channel.on_alert_cleared.emit(ChannelAlertCode.QUEUED_FOR_MONITORING)
-                    channel.on_alert_cleared.emit(ChannelAlertCode.PID_ENGAGED)
-                    channel.on_alert_cleared.emit(ChannelAlertCode.PID_LOCKED)
-                    channel.on_alert_clear_dismissed.emit()
+        # A thread stuck in a device call is left to finish its visit and
+        # quit by itself. A new start_monitoring waits for it to let go of
+        # monitoring_lock, on the new thread.
+        self.monitor_thread.join(self.stop_timeout)
 
-                    channel.on_new_alert.emit(ChannelAlertCode.IDLE)
+        for channel in self.channels.values():
+            if channel.monitor_enabled:
+                channel.on_alert_cleared.emit(ChannelAlertCode.QUEUED_FOR_MONITORING)
+                channel.on_alert_cleared.emit(ChannelAlertCode.PID_ENGAGED)
+                channel.on_alert_cleared.emit(ChannelAlertCode.PID_LOCKED)
+                channel.on_alert_clear_dismissed.emit()
 
-            self.on_monitor_stopped.emit()
+                channel.on_new_alert.emit(ChannelAlertCode.IDLE)
+
+        self.on_monitor_stopped.emit()
 
     def is_monitoring(self):
-        return self.monitoring_lock.locked()
+        return self.monitoring
 
     def add_channel(self, channel: ChannelModel):
         # should be called by the frontend
@@ -260,10 +762,23 @@ class Monitor(QObject):
                 partial(self.reset_channel_dac, channel.channel_num)
             )
 
+            if self.pattern_archive:
+                # in the thread of the alert, the patterns are still recent
+                channel.on_new_alert.connect(
+                    partial(self.pattern_archive.on_alert, channel.channel_num),
+                    Qt.DirectConnection)
+                channel.on_alert_cleared.connect(
+                    partial(self.pattern_archive.on_alert, channel.channel_num,
+                            cleared=True),
+                    Qt.DirectConnection)
+
+            if self.history_store and not len(channel.history):
+                self.history_store.preload(channel.channel_num, channel.history)
+
         return channel
 
     def on_channel_monitor_enabled(self, channel_num, enabled):
-        if self.monitoring_lock.locked():
+        if self.monitoring:
             channel = self.channels[channel_num]
 
             if enabled:
@@ -275,7 +790,10 @@ class Monitor(QObject):
 
     def reset_channel_dac(self, channel_num):
         ch = self.channels[channel_num]
-        self.dac.reset_dac(ch.dac_channel_num)
+        if self.dac_worker:
+            self.dac_worker.reset_dac(ch.dac_channel_num)
+        else:
+            self.dac.reset_dac(ch.dac_channel_num)
 
     def remove_channel(self, channel_num):
         # should be called by the frontend
@@ -285,3 +803,13 @@ class Monitor(QObject):
             self.stop_monitoring()
 
         del self.channels[channel_num]
+        self.dac_records.pop(channel_num, None)
+
+    def close(self):
+        self.stop_monitoring()
+        if self.dac_worker:
+            self.dac_worker.close()
+        if self.history_store:
+            self.history_store.close()
+        if self.pattern_archive:
+            self.pattern_archive.close()
@@ -0,0 +1,131 @@
+from PyQt5.QtCore import pyqtSignal, QObject
+
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.controller.devices import (
+    create_devices, get_instruments, find_instrument, is_simulating)
+from wavemeter_dashboard.controller.monitor import Monitor
+from wavemeter_dashboard.controller.monitor_process import MonitorProcess
+from wavemeter_dashboard.model.channel_model import ChannelModel
+
+
+class MonitorGroupException(Exception):
+    pass
+
+
+class MonitorGroup(QObject):
+    # Several wave meters, each with its own fiber switch and DAC, measured
+    # in parallel by a Monitor (or MonitorProcess) apiece. Has the same
+    # interface as Monitor; every channel goes to the monitor of the wave
+    # meter its fiber switch is on, see devices.find_instrument.
+    on_monitor_started = pyqtSignal()
+    on_monitor_stop_req = pyqtSignal()
+    on_monitor_stopped = pyqtSignal()
+    on_monitoring_channel = pyqtSignal(int)
+    on_channel_error = pyqtSignal(int, str)
+
+    def __init__(self, monitors):
+        # monitors: in the order of get_instruments()
+        super().__init__()
+        self.monitors = monitors
+        self.channels = {}
+
+        for monitor in monitors:
+            monitor.on_monitoring_channel.connect(self.on_monitoring_channel)
+            monitor.on_channel_error.connect(self.on_channel_error)
+
+    def _monitor_of(self, channel_num):
+        instrument = find_instrument(channel_num)
+        if instrument is None or instrument >= len(self.monitors):
+            raise MonitorGroupException(
+                f"Channel {channel_num} isn't on any fiber switch")
+        return self.monitors[instrument]
+
+    def start_monitoring(self):
+        for monitor in self.monitors:
+            monitor.start_monitoring()
+        self.on_monitor_started.emit()
+
+    def stop_monitoring(self):
+        if not self.is_monitoring():
+            return
+        self.on_monitor_stop_req.emit()
+
+        for monitor in self.monitors:
+            monitor.stop_monitoring()
+
+        self.on_monitor_stopped.emit()
+
+    def is_monitoring(self):
+        return any(monitor.is_monitoring() for monitor in self.monitors)
+
+    def add_channel(self, channel: ChannelModel):
+        # should be called by the frontend
+        if channel.channel_num not in self.channels:
+            self._monitor_of(channel.channel_num).add_channel(channel)
+            self.channels[channel.channel_num] = channel
+
+        return channel
+
+    def on_channel_monitor_enabled(self, channel_num, enabled):
+        self._monitor_of(channel_num).on_channel_monitor_enabled(
+            channel_num, enabled)
+
+    def reset_channel_dac(self, channel_num):
+        self._monitor_of(channel_num).reset_channel_dac(channel_num)
+
+    def get_auto_expo_params(self, channel_num):
+        return self._monitor_of(channel_num).get_auto_expo_params(channel_num)
+
+    def get_latency_report(self, fmt="text", per_channel=False):
+        reports = [monitor.get_latency_report(fmt, per_channel)
+                   for monitor in self.monitors]
+
+        if fmt == "csv":
+            # one table, the wave meter in the first column
+            lines = []
+            for i, report in enumerate(reports):
+                header, *rows = report.splitlines()
+                if not lines:
+                    lines.append("wavemeter," + header)
+                lines.extend(f"{i},{row}" for row in rows)
+            return "\n".join(lines) + "\n"
+
+        return "\n\n".join(f"WAVEMETER {i}\n{report}"
+                           for i, report in enumerate(reports))
+
+    def reset_latency_profile(self):
+        for monitor in self.monitors:
+            monitor.reset_latency_profile()
+
+    def remove_channel(self, channel_num):
+        # should be called by the frontend
+        assert channel_num in self.channels
+
+        self._monitor_of(channel_num).remove_channel(channel_num)
+        del self.channels[channel_num]
+
+    def close(self):
+        for monitor in self.monitors:
+            monitor.close()
+
+
+def create_monitor(simulate=None):
+    # Monitor, MonitorProcess, or a MonitorGroup of either, as the config says
+    instruments = get_instruments()
+
+    # the wlm dll talks to one wave meter per process
+    in_subprocess = config.get("monitor_in_subprocess", False) or \
+        (len(instruments) > 1 and not is_simulating(simulate))
+
+    def create(i):
+        if in_subprocess:
+            # the devices are opened by the child process
+            return MonitorProcess(simulate, i)
+
+        wm, fs, dac = create_devices(simulate, i)
+        return Monitor(wm, fs, dac, instruments[i].get("channel_offset", 0))
+
+    if len(instruments) == 1:
+        return create(0)
+
+    return MonitorGroup([create(i) for i in range(len(instruments))])
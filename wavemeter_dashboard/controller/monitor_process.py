@@ -0,0 +1,461 @@
+import time
+import queue
+import multiprocessing
+from functools import partial
+from threading import Lock
+
+import numpy as np
+from PyQt5.QtCore import pyqtSignal, QObject, QTimer, Qt
+
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.controller.sample_ring import (
+    SampleRing, PatternRing, RingRecordKind)
+from wavemeter_dashboard.model.channel_alert import ChannelAlertCode
+from wavemeter_dashboard.model.channel_model import ChannelModel
+from wavemeter_dashboard.model.history_store import open_history_store
+
+
+class MonitorProcessException(Exception):
+    pass
+
+
+class MonitorProcess(QObject):
+    # Runs Monitor and the PID loop in a child process, away from the GIL of
+    # the GUI. Has the same interface as Monitor, so the views can't tell.
+    #
+    # The child publishes samples, PID outputs, alerts and pattern frames
+    # into shared-memory rings. A timer in the GUI drains them and feeds the
+    # GUI's ChannelModels, firing the same signals Monitor would. Commands
+    # (start, stop, channel settings) go the other way through a queue.
+    on_monitor_started = pyqtSignal()
+    on_monitor_stop_req = pyqtSignal()
+    on_monitor_stopped = pyqtSignal()
+    on_monitoring_channel = pyqtSignal(int)
+    on_channel_error = pyqtSignal(int, str)
+
+    def __init__(self, simulate=None, instrument=None):
+        # instrument: index of the wave meter in get_instruments() to run
+        super().__init__()
+        self.channels = {}
+
+        self.sample_ring = SampleRing(
+            capacity=config.get('monitor_process_ring_capacity', 65536))
+        self.pattern_ring = PatternRing()
+
+        ctx = multiprocessing.get_context("spawn")
+        self.commands = ctx.Queue()
+        self.replies = ctx.Queue()
+        self.reply_lock = Lock()
+        # replies still to come to requests that timed out
+        self.late_replies = 0
+
+        self.process = ctx.Process(
+            name="Monitor", target=run_monitor_process, daemon=True,
+            args=(config.path, simulate, instrument, self.sample_ring.name,
+                  self.sample_ring.capacity, self.pattern_ring.name,
+                  self.pattern_ring.slots, self.pattern_ring.max_length,
+                  self.commands, self.replies))
+        self.process.start()
+
+        self.monitoring = False
+        self.stop_timeout = config.get('monitor_process_stop_timeout', 5)
+
+        self.history_store = open_history_store(read_only=True)
+
+        # what the child last heard about each channel
+        self._sent_settings = {}
+        self._sent_pattern_requests = {}
+
+        self.drain_timer = QTimer()
+        self.drain_timer.timeout.connect(self._drain)
+        self.drain_timer.start(config.get('monitor_process_drain_interval', 20))
+
+    def _send(self, *command):
+        self.commands.put(command)
+
+    def _request(self, *command):
+        # for commands with a reply, waits for it up to stop_timeout
+        with self.reply_lock:
+            self._send(*command)
+            deadline = time.time() + self.stop_timeout
+            while True:
+                try:
+                    status, result = self.replies.get(timeout=0.1)
+                except queue.Empty:
+                    if not self.process.is_alive():
+                        raise MonitorProcessException("Monitor process died")
+                    if time.time() > deadline:
+                        # the child answers in order, the next request
+                        # skips this one's reply
+                        self.late_replies += 1
+                        raise MonitorProcessException(
+                            "Monitor process doesn't respond")
+                    continue
+
+                if self.late_replies:
+                    self.late_replies -= 1
+                    continue
+                break
+
+        if status != "ok":
+            raise MonitorProcessException(result)
+        return result
+
+    def _sync_channels(self):
+        # channel settings are edited in place by the views, so keep
+        # comparing them with what the child has
+        for num, channel in self.channels.items():
+            settings = channel.dump_settings_dict()
+            if self._sent_settings.get(num) != settings:
+                self._send("update_channel", settings)
+                self._sent_settings[num] = settings
+
+            # Monitor only reads patterns while somebody is watching them
+            wanted = (channel.isSignalConnected(channel.on_pattern_changed_meta),
+                      channel.isSignalConnected(channel.on_wide_pattern_changed_meta))
+            if self._sent_pattern_requests.get(num) != wanted:
+                self._send("request_patterns", num, *wanted)
+                self._sent_pattern_requests[num] = wanted
+
+    def _drain(self):
+        self._sync_channels()
+
+        records = self.sample_ring.get_new()
+        if not len(records):
+            return
+
+        kinds = records['kind']
+        samples = records[kinds == RingRecordKind.SAMPLE.value]
+        for num in np.unique(samples['channel']):
+            channel_samples = samples[samples['channel'] == num]
+            self._on_samples(int(num), channel_samples['time'],
+                             channel_samples['value'])
+
+        for record in records[kinds != RingRecordKind.SAMPLE.value]:
+            self._on_record(record)
+
+    def _on_samples(self, channel_num, times, frequencies):
+        ch = self.channels.get(channel_num)
+        if not ch:
+            return
+
+        ch.frequency = float(frequencies[-1])
+
+        errors = None
+        if ch.freq_setpoint:
+            errors = frequencies - ch.freq_setpoint
+            ch.error = float(errors[-1])
+
+        ch.history.extend(times, frequencies, errors)
+
+        ch.on_freq_changed.emit()
+
+    def _on_record(self, record):
+        kind = RingRecordKind(record['kind'])
+        ch = self.channels.get(int(record['channel']))
+
+        if kind == RingRecordKind.MONITOR_STARTED:
+            self.monitoring = True
+        elif kind == RingRecordKind.MONITOR_STOPPED:
+            self.monitoring = False
+            self.on_monitor_stopped.emit()
+        elif kind == RingRecordKind.MONITORING_CHANNEL:
+            self.on_monitoring_channel.emit(int(record['channel']))
+        elif not ch:
+            return
+        elif kind == RingRecordKind.PID:
+            ch.dac_output = float(record['value'])
+            ch.dac_railed = bool(record['extra'])
+            # the time is of the sample the output was worked out from
+            ch.history.set_dac(ch.dac_output, ch.dac_railed, record['time'])
+            ch.on_pid_changed.emit()
+        elif kind == RingRecordKind.SAMPLE_RATE:
+            ch.sample_rate = float(record['value'])
+        elif kind == RingRecordKind.NEW_ALERT:
+            ch.on_new_alert.emit(ChannelAlertCode(int(record['code'])))
+        elif kind == RingRecordKind.ALERT_CLEARED:
+            ch.on_alert_cleared.emit(ChannelAlertCode(int(record['code'])))
+        elif kind == RingRecordKind.ALERT_CLEAR_DISMISSED:
+            ch.on_alert_clear_dismissed.emit()
+        elif kind == RingRecordKind.PATTERN:
+            pattern = self.pattern_ring.get(int(record['extra']))
+            if pattern is None:
+                return  # we were too slow, a newer one will come
+            if record['code']:
+                ch.wide_pattern_data = pattern
+                ch.on_wide_pattern_changed.emit()
+            else:
+                ch.pattern_data = pattern
+                ch.on_pattern_changed.emit()
+
+    def start_monitoring(self):
+        self._sync_channels()
+        self.monitoring = True
+        self._send("start")
+        self.on_monitor_started.emit()
+
+    def stop_monitoring(self):
+        if not self.monitoring:
+            return
+        self.on_monitor_stop_req.emit()
+
+        self._send("stop")
+
+        # the alerts of the teardown come through the ring as well
+        deadline = time.time() + self.stop_timeout
+        while self.monitoring and time.time() < deadline:
+            time.sleep(0.01)
+            self._drain()
+
+        if self.monitoring:
+            raise MonitorProcessException("Monitor process doesn't respond")
+
+    def is_monitoring(self):
+        return self.monitoring
+
+    def add_channel(self, channel: ChannelModel):
+        # should be called by the frontend
+        if channel.channel_num not in self.channels:
+            self.channels[channel.channel_num] = channel
+            channel.on_channel_monitor_enabled.connect(
+                partial(self.on_channel_monitor_enabled, channel.channel_num)
+            )
+            channel.on_channel_dac_reset.connect(
+                partial(self.reset_channel_dac, channel.channel_num)
+            )
+
+            # the child writes the store, this copy is for the charts
+            if self.history_store and not len(channel.history):
+                self.history_store.preload(channel.channel_num, channel.history)
+
+            self._sync_channels()
+
+        return channel
+
+    def on_channel_monitor_enabled(self, channel_num, enabled):
+        if self.monitoring:
+            channel = self.channels[channel_num]
+
+            if enabled:
+                channel.on_new_alert.emit(ChannelAlertCode.QUEUED_FOR_MONITORING)
+                if channel.pid_enabled:
+                    channel.on_new_alert.emit(ChannelAlertCode.PID_ENGAGED)
+            else:
+                channel.on_new_alert.emit(ChannelAlertCode.IDLE)
+
+    def reset_channel_dac(self, channel_num):
+        self._request("reset_channel_dac", channel_num)
+
+    def get_auto_expo_params(self, channel_num):
+        return self._request("get_auto_expo_params", channel_num)
+
+    def get_latency_report(self, fmt="text", per_channel=False):
+        return self._request("get_latency_report", fmt, per_channel)
+
+    def reset_latency_profile(self):
+        self._request("reset_latency_profile")
+
+    def remove_channel(self, channel_num):
+        # should be called by the frontend
+        assert channel_num in self.channels
+
+        if self.channels[channel_num].monitor_enabled:
+            self.stop_monitoring()
+
+        del self.channels[channel_num]
+        self._sent_settings.pop(channel_num, None)
+        self._sent_pattern_requests.pop(channel_num, None)
+        self._send("remove_channel", channel_num)
+
+    def close(self):
+        self.drain_timer.stop()
+        if self.process.is_alive():
+            self._send("quit")
+            self.process.join(self.stop_timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+
+        self.sample_ring.close(unlink=True)
+        self.pattern_ring.close(unlink=True)
+
+
+class RingPublisher:
+    # Lives in the child process. Forwards what Monitor does to its
+    # ChannelModels into the rings.
+    #
+    # There is no event loop in the child, so everything is connected with
+    # Qt.DirectConnection and runs on the monitor thread.
+
+    def __init__(self, monitor, sample_ring: SampleRing, pattern_ring: PatternRing):
+        self.monitor = monitor
+        self.sample_ring = sample_ring
+        self.pattern_ring = pattern_ring
+        self.last_sample_time = {}
+        self.slots = {}
+
+        monitor.on_monitoring_channel.connect(
+            self.publish_monitoring_channel, Qt.DirectConnection)
+        monitor.on_monitor_stopped.connect(
+            self.publish_monitor_stopped, Qt.DirectConnection)
+
+    def attach(self, channel: ChannelModel):
+        num = channel.channel_num
+        # what the history store had, the GUI loads that itself
+        newest = channel.history.tail(1)
+        if len(newest):
+            self.last_sample_time[num] = newest['time'][0]
+
+        self.slots[num] = {
+            'freq': partial(self.publish_samples, channel),
+            'pid': partial(self.publish_pid, channel),
+            'new_alert': partial(self.publish_new_alert, channel),
+            'alert_cleared': partial(self.publish_alert_cleared, channel),
+            'alert_clear_dismissed': partial(self.publish_alert_clear_dismissed, channel),
+            'pattern': partial(self.publish_pattern, channel, False),
+            'wide_pattern': partial(self.publish_pattern, channel, True),
+        }
+        slots = self.slots[num]
+
+        channel.on_freq_changed.connect(slots['freq'], Qt.DirectConnection)
+        channel.on_pid_changed.connect(slots['pid'], Qt.DirectConnection)
+        channel.on_new_alert.connect(slots['new_alert'], Qt.DirectConnection)
+        channel.on_alert_cleared.connect(slots['alert_cleared'], Qt.DirectConnection)
+        channel.on_alert_clear_dismissed.connect(
+            slots['alert_clear_dismissed'], Qt.DirectConnection)
+
+    def request_patterns(self, channel: ChannelModel, narrow, wide):
+        slots = self.slots[channel.channel_num]
+
+        for signal, key, wanted in [
+            (channel.on_pattern_changed, 'pattern', narrow),
+            (channel.on_wide_pattern_changed, 'wide_pattern', wide),
+        ]:
+            try:
+                signal.disconnect(slots[key])
+            except TypeError:
+                pass  # wasn't connected
+            if wanted:
+                signal.connect(slots[key], Qt.DirectConnection)
+
+    def publish_monitoring_channel(self, channel_num):
+        self.sample_ring.put(RingRecordKind.MONITORING_CHANNEL, channel_num)
+
+    def publish_monitor_stopped(self):
+        self.sample_ring.put(RingRecordKind.MONITOR_STOPPED)
+
+    def publish_samples(self, channel: ChannelModel):
+        # a visit may have taken a burst of samples, send all the new ones
+        num = channel.channel_num
+        records = channel.history.since(self.last_sample_time.get(num, 0))
+        if not len(records):
+            return
+
+        self.sample_ring.put_many(RingRecordKind.SAMPLE, num,
+                                  records['time'], records['frequency'])
+        self.last_sample_time[num] = records['time'][-1]
+        # as of the visit before, it's worked out after the visit
+        self.sample_ring.put(RingRecordKind.SAMPLE_RATE, num,
+                             value=channel.sample_rate)
+
+    def publish_pid(self, channel: ChannelModel):
+        # goes with the newest sample, published before this
+        newest = channel.history.tail(1)
+        t = newest['time'][0] if len(newest) else time.time()
+        self.sample_ring.put(RingRecordKind.PID, channel.channel_num,
+                             extra=int(channel.dac_railed), t=t,
+                             value=channel.dac_output)
+
+    def publish_new_alert(self, channel: ChannelModel, code: ChannelAlertCode):
+        # Monitor looks at total_alerts to not raise the same alert again.
+        # The AlertTracker keeping it is in the GUI, so do the bookkeeping here.
+        if code not in channel.total_alerts:
+            channel.total_alerts.append(code)
+        self.sample_ring.put(RingRecordKind.NEW_ALERT, channel.channel_num,
+                             code=code.value)
+
+    def publish_alert_cleared(self, channel: ChannelModel, code: ChannelAlertCode):
+        if code in channel.total_alerts:
+            channel.total_alerts.remove(code)
+        self.sample_ring.put(RingRecordKind.ALERT_CLEARED, channel.channel_num,
+                             code=code.value)
+
+    def publish_alert_clear_dismissed(self, channel: ChannelModel):
+        self.sample_ring.put(RingRecordKind.ALERT_CLEAR_DISMISSED,
+                             channel.channel_num)
+
+    def publish_pattern(self, channel: ChannelModel, wide):
+        pattern = channel.wide_pattern_data if wide else channel.pattern_data
+        index = self.pattern_ring.put(pattern)
+        self.sample_ring.put(RingRecordKind.PATTERN, channel.channel_num,
+                             code=int(wide), extra=index)
+
+
+def _update_channel(monitor, publisher, settings):
+    num = settings['channel_num']
+    new = ChannelModel.from_settings_dict(settings)
+
+    if num not in monitor.channels:
+        monitor.add_channel(new)
+        publisher.attach(new)
+        return
+
+    # update in place, the monitor thread may be holding on to it
+    channel = monitor.channels[num]
+    for key in settings:
+        setattr(channel, key, getattr(new, key))
+    channel.generate_always_dismiss()
+
+
+def run_monitor_process(config_path, simulate, instrument, sample_ring_name,
+                        ring_capacity, pattern_ring_name, pattern_slots,
+                        pattern_max_length, commands, replies):
+    # entry point of the child process
+    from wavemeter_dashboard.controller.devices import (
+        create_devices, get_instruments)
+    from wavemeter_dashboard.controller.monitor import Monitor
+
+    config.load_config(config_path)
+
+    sample_ring = SampleRing(sample_ring_name, ring_capacity)
+    pattern_ring = PatternRing(pattern_ring_name, pattern_slots, pattern_max_length)
+
+    wm, fs, dac = create_devices(simulate, instrument)
+    offset = get_instruments()[instrument or 0].get("channel_offset", 0)
+    monitor = Monitor(wm, fs, dac, offset)
+    publisher = RingPublisher(monitor, sample_ring, pattern_ring)
+
+    while True:
+        try:
+            command, *args = commands.get(timeout=1)
+        except queue.Empty:
+            continue
+
+        if command == "quit":
+            break
+        elif command == "start":
+            if not monitor.is_monitoring():
+                sample_ring.put(RingRecordKind.MONITOR_STARTED)
+                monitor.start_monitoring()
+        elif command == "stop":
+            if monitor.is_monitoring():
+                monitor.stop_monitoring()
+            else:
+                sample_ring.put(RingRecordKind.MONITOR_STOPPED)
+        elif command == "update_channel":
+            _update_channel(monitor, publisher, args[0])
+        elif command == "remove_channel":
+            if args[0] in monitor.channels:
+                monitor.remove_channel(args[0])
+        elif command == "request_patterns":
+            if args[0] in monitor.channels:
+                publisher.request_patterns(monitor.channels[args[0]], *args[1:])
+        elif command in ("get_auto_expo_params", "reset_channel_dac",
+                         "get_latency_report", "reset_latency_profile"):
+            try:
+                replies.put(("ok", getattr(monitor, command)(*args)))
+            except Exception as e:
+                replies.put(("error", repr(e)))
+
+    monitor.close()
+    sample_ring.close()
+    pattern_ring.close()
@@ -0,0 +1,161 @@
+from enum import Enum
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class RingRecordKind(Enum):
+    SAMPLE = 1  # value: frequency
+    PID = 2  # value: DAC output, extra: DAC railed
+    NEW_ALERT = 3  # code: ChannelAlertCode
+    ALERT_CLEARED = 4  # code: ChannelAlertCode
+    ALERT_CLEAR_DISMISSED = 5
+    MONITORING_CHANNEL = 6
+    PATTERN = 7  # extra: pattern ring index, code: 1 if wide
+    MONITOR_STARTED = 8
+    MONITOR_STOPPED = 9
+    SAMPLE_RATE = 10  # value: samples per second
+
+
+def _attach(name, size):
+    # name=None creates a new block, which the creator has to unlink. Children
+    # started by multiprocessing share the resource tracker of the creator,
+    # so attaching doesn't take over the ownership.
+    return shared_memory.SharedMemory(name=name, create=name is None, size=size)
+
+
+class SampleRing:
+    # Single-producer single-consumer ring of fixed-size records in shared
+    # memory. The first 8 bytes hold the number of records ever written. The
+    # producer fills a record before bumping the counter, the consumer only
+    # reads up to the counter. A consumer lagging more than `capacity`
+    # records behind loses the oldest ones.
+
+    dtype = np.dtype([
+        ('kind', np.uint8),
+        ('channel', np.uint8),
+        ('code', np.int16),
+        ('extra', np.int32),
+        ('time', np.float64),
+        ('value', np.float64),
+    ])
+    HEADER_SIZE = 64
+
+    def __init__(self, name=None, capacity=65536):
+        self.capacity = capacity
+        self.shm = _attach(name, self.HEADER_SIZE + capacity * self.dtype.itemsize)
+        self.name = self.shm.name
+
+        self._write_count = np.ndarray((1,), np.uint64, self.shm.buf)
+        self.records = np.ndarray((capacity,), self.dtype, self.shm.buf,
+                                  offset=self.HEADER_SIZE)
+
+        if name is None:
+            self._write_count[0] = 0
+        self.read_count = int(self._write_count[0])
+        self.lost = 0
+
+    def put(self, kind: RingRecordKind, channel=0, code=0, extra=0, t=0.0, value=0.0):
+        count = int(self._write_count[0])
+        self.records[count % self.capacity] = (kind.value, channel, code,
+                                               extra, t, value)
+        self._write_count[0] = count + 1
+
+    def put_many(self, kind: RingRecordKind, channel, times, values):
+        n = len(times)
+        if n == 0:
+            return
+        # the ones that don't fit are counted as written, so the consumer
+        # knows it lost them
+        count = int(self._write_count[0]) + n
+        if n > self.capacity:
+            times, values = times[-self.capacity:], values[-self.capacity:]
+            n = self.capacity
+
+        idx = (count - n + np.arange(n)) % self.capacity
+        batch = self.records[idx]
+        batch['kind'] = kind.value
+        batch['channel'] = channel
+        batch['code'] = 0
+        batch['extra'] = 0
+        batch['time'] = times
+        batch['value'] = values
+        self.records[idx] = batch
+        self._write_count[0] = count
+
+    def get_new(self):
+        # returns a copy of the records written since the last call
+        count = int(self._write_count[0])
+        if count - self.read_count > self.capacity:
+            self.lost += count - self.read_count - self.capacity
+            self.read_count = count - self.capacity
+
+        if count == self.read_count:
+            return self.records[:0].copy()
+
+        idx = np.arange(self.read_count, count) % self.capacity
+        self.read_count = count
+        return self.records[idx]
+
+    def close(self, unlink=False):
+        del self._write_count
+        del self.records
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class PatternRing:
+    # Ring of interferometer pattern frames in shared memory. put() returns
+    # an index which get() turns back into a copy of the frame, as long as
+    # it hasn't been overwritten yet.
+
+    HEADER_SIZE = 64
+
+    def __init__(self, name=None, slots=16, max_length=8192):
+        self.slots = slots
+        self.max_length = max_length
+        size = self.HEADER_SIZE + slots * 4 + slots * max_length * 2
+        self.shm = _attach(name, size)
+        self.name = self.shm.name
+
+        self._write_count = np.ndarray((1,), np.uint64, self.shm.buf)
+        self.lengths = np.ndarray((slots,), np.int32, self.shm.buf,
+                                  offset=self.HEADER_SIZE)
+        self.frames = np.ndarray((slots, max_length), np.uint16, self.shm.buf,
+                                 offset=self.HEADER_SIZE + slots * 4)
+
+        if name is None:
+            self._write_count[0] = 0
+
+    def put(self, pattern):
+        count = int(self._write_count[0])
+        slot = count % self.slots
+        length = 0 if pattern is None else min(len(pattern), self.max_length)
+        if length:
+            self.frames[slot, :length] = pattern[:length]
+        self.lengths[slot] = length
+        self._write_count[0] = count + 1
+
+        return count
+
+    def get(self, index):
+        count = int(self._write_count[0])
+        if index >= count or index < count - self.slots:
+            return None
+
+        slot = index % self.slots
+        frame = self.frames[slot, :self.lengths[slot]].copy()
+
+        # it might have been overwritten while being copied
+        if index < int(self._write_count[0]) - self.slots:
+            return None
+        return frame
+
+    def close(self, unlink=False):
+        del self._write_count
+        del self.lengths
+        del self.frames
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
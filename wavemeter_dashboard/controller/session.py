@@ -0,0 +1,285 @@
+import io
+import os
+import time
+import zlib
+from typing import Dict
+from functools import partial
+from threading import Thread, Lock, Event
+
+import numpy as np
+from PyQt5.QtCore import pyqtSignal, QObject, Qt
+
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.model.channel_alert import ChannelAlertCode
+from wavemeter_dashboard.model.channel_model import ChannelModel
+from wavemeter_dashboard.model.longterm_data import ChannelHistory
+
+
+class SessionException(Exception):
+    pass
+
+
+MAGIC = b"WMSESSION1\n"
+
+# what a frame holds
+SAMPLES = 0  # the new ChannelHistory records
+PID = 1  # the record the DAC output was set on
+PATTERN = 2
+WIDE_PATTERN = 3
+NEW_ALERT = 4  # value: the ChannelAlertCode
+ALERT_CLEARED = 5  # value: the ChannelAlertCode
+ALERT_CLEAR_DISMISSED = 6
+
+FRAME_DTYPE = np.dtype([
+    ('kind', 'u1'),
+    ('channel', 'u2'),
+    ('time', 'f8'),  # when it was recorded
+    ('value', 'i8'),
+    ('length', 'u4'),  # of the payload after it
+])
+
+
+def _pack(array):
+    f = io.BytesIO()
+    np.save(f, array, allow_pickle=False)
+    return zlib.compress(f.getvalue(), 1)
+
+
+def _unpack(payload):
+    return np.load(io.BytesIO(zlib.decompress(payload)), allow_pickle=False)
+
+
+class SessionRecorder:
+    # Writes everything the channels get from Monitor to a session file, to
+    # be played back by SessionReplay: the samples, DAC outputs, patterns
+    # and alerts, each in a frame stamped with the time it came.
+    #
+    # The file is a run of frames, a FRAME_DTYPE header each and then the
+    # payload, a zlib-compressed .npy of the records or the pattern. Every
+    # frame is one unbuffered write, so a crash loses at most the last one.
+    #
+    # The slots are connected directly, they run in the thread emitting the
+    # signal, while Monitor's state is the one of that signal.
+
+    def __init__(self, path, patterns=True):
+        # patterns: record them as well. Monitor only reads the patterns
+        # when someone listens, recording them makes it read them all the
+        # time.
+        self.path = path
+        self.patterns = patterns
+        self.lock = Lock()
+        self.file = open(path, "wb", buffering=0)
+        self.file.write(MAGIC)
+
+        self.channels: Dict[int, ChannelModel] = {}
+        self.slots = {}  # channel_num -> [(signal, slot)]
+        self.recorded = {}  # channel_num -> history.total written
+
+    def add_channel(self, channel: ChannelModel):
+        num = channel.channel_num
+        if num in self.channels:
+            return
+
+        self.channels[num] = channel
+        self.recorded[num] = channel.history.total
+
+        slots = [
+            (channel.on_freq_changed, partial(self.on_freq_changed, num)),
+            (channel.on_pid_changed, partial(self.on_pid_changed, num)),
+            (channel.on_new_alert, partial(self.write_frame, NEW_ALERT, num)),
+            (channel.on_alert_cleared,
+             partial(self.write_frame, ALERT_CLEARED, num)),
+            (channel.on_alert_clear_dismissed,
+             partial(self.write_frame, ALERT_CLEAR_DISMISSED, num, None)),
+        ]
+        if self.patterns:
+            slots += [
+                (channel.on_pattern_changed,
+                 partial(self.on_pattern_changed, num, False)),
+                (channel.on_wide_pattern_changed,
+                 partial(self.on_pattern_changed, num, True)),
+            ]
+
+        for signal, slot in slots:
+            signal.connect(slot, Qt.DirectConnection)
+        self.slots[num] = slots
+
+    def remove_channel(self, channel_num):
+        for signal, slot in self.slots.pop(channel_num, []):
+            signal.disconnect(slot)
+        self.channels.pop(channel_num, None)
+
+    def write_frame(self, kind, channel_num, value=None, payload=b""):
+        # value: a ChannelAlertCode or an int
+        header = np.zeros(1, dtype=FRAME_DTYPE)
+        header['kind'] = kind
+        header['channel'] = channel_num
+        header['time'] = time.time()
+        if isinstance(value, ChannelAlertCode):
+            value = value.value
+        header['value'] = value or 0
+        header['length'] = len(payload)
+
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(header.tobytes() + payload)
+
+    def on_freq_changed(self, channel_num):
+        history = self.channels[channel_num].history
+        total = history.total
+        # more than the history keeps only if it's cleared in between
+        new = min(total - self.recorded[channel_num], len(history))
+        self.recorded[channel_num] = total
+        if new > 0:
+            self.write_frame(SAMPLES, channel_num,
+                             payload=_pack(history.tail(new)))
+
+    def on_pid_changed(self, channel_num):
+        # the newest record with a DAC output, the one just set
+        recent = self.channels[channel_num].history.tail(
+            ChannelHistory.DAC_SEARCH_DEPTH)
+        found = np.flatnonzero(~np.isnan(recent['dac']))
+        if len(found):
+            self.write_frame(PID, channel_num,
+                             payload=_pack(recent[found[-1]:found[-1] + 1]))
+
+    def on_pattern_changed(self, channel_num, wide):
+        channel = self.channels[channel_num]
+        pattern = channel.wide_pattern_data if wide else channel.pattern_data
+        self.write_frame(WIDE_PATTERN if wide else PATTERN, channel_num,
+                         payload=_pack(pattern))
+
+    def close(self):
+        for num in list(self.slots.keys()):
+            self.remove_channel(num)
+        with self.lock:
+            self.file.close()
+
+
+def open_session_recorder():
+    # a SessionRecorder writing a new file in "session_record_path", None if
+    # not set
+    root = config.get('session_record_path', None)
+    if not root:
+        return None
+
+    os.makedirs(root, exist_ok=True)
+    name = time.strftime("session-%Y%m%d-%H%M%S.wms")
+    return SessionRecorder(os.path.join(root, name),
+                           config.get('session_record_patterns', True))
+
+
+def read_session(path):
+    # yields (header, payload) for every whole frame in the file
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise SessionException(f"{path} isn't a session file.")
+
+        while True:
+            header = f.read(FRAME_DTYPE.itemsize)
+            if len(header) < FRAME_DTYPE.itemsize:
+                return
+            header = np.frombuffer(header, dtype=FRAME_DTYPE)[0]
+            payload = f.read(int(header['length']))
+            if len(payload) < header['length']:
+                return  # cut short by a crash
+            yield header, payload
+
+
+class SessionReplay(QObject):
+    # Plays a recorded session back through the signals of the channels, as
+    # Monitor would, at speed times the recorded pace. The times are
+    # brought forward to now, and squeezed by the speed, so the charts show
+    # the session as if it was happening. The channels not in the session
+    # are left alone, the ones in the session but not in channels skipped.
+
+    on_replay_finished = pyqtSignal()
+
+    def __init__(self, path, channels: Dict[int, ChannelModel], speed=1.0):
+        super().__init__()
+        if speed <= 0:
+            raise SessionException("The replay speed must be positive.")
+
+        self.path = path
+        self.channels = channels
+        self.speed = speed
+
+        self.replay_thread = None
+        self.stop_event = Event()
+        self.frames = 0  # played so far
+
+    def start(self):
+        self.stop_event = Event()
+        self.replay_thread = Thread(name="SessionReplay", target=self._replay,
+                                    args=(self.stop_event,), daemon=True)
+        self.replay_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.replay_thread:
+            self.replay_thread.join()
+
+    def is_running(self):
+        return bool(self.replay_thread and self.replay_thread.is_alive())
+
+    def _replay(self, stop_event):
+        started_at = time.time()
+        session_start = None
+
+        for header, payload in read_session(self.path):
+            if session_start is None:
+                session_start = header['time']
+
+            def replay_time(t):
+                return started_at + (t - session_start) / self.speed
+
+            # wait for its turn; behind time, as fast as it goes
+            wait = replay_time(header['time']) - time.time()
+            if stop_event.wait(wait) if wait > 0 else stop_event.is_set():
+                return
+
+            channel = self.channels.get(int(header['channel']))
+            if channel:
+                self._play(channel, header, payload, replay_time)
+            self.frames += 1
+
+        self.on_replay_finished.emit()
+
+    @staticmethod
+    def _play(ch: ChannelModel, header, payload, replay_time):
+        kind = header['kind']
+
+        if kind == SAMPLES:
+            records = _unpack(payload)
+            records['time'] = replay_time(records['time'])
+            ch.frequency = float(records['frequency'][-1])
+            if not np.isnan(records['error'][-1]):
+                ch.error = float(records['error'][-1])
+            ch.history.extend_records(records)
+            ch.on_freq_changed.emit()
+
+        elif kind == PID:
+            record = _unpack(payload)[0]
+            railed = bool(record['flags'] & ChannelHistory.FLAG_DAC_RAILED)
+            ch.dac_output = float(record['dac'])
+            ch.dac_railed = railed
+            ch.history.set_dac(ch.dac_output, railed,
+                               replay_time(record['time']))
+            ch.on_pid_changed.emit()
+
+        elif kind == PATTERN:
+            ch.pattern_data = _unpack(payload)
+            ch.on_pattern_changed.emit()
+
+        elif kind == WIDE_PATTERN:
+            ch.wide_pattern_data = _unpack(payload)
+            ch.on_wide_pattern_changed.emit()
+
+        elif kind == NEW_ALERT:
+            ch.on_new_alert.emit(ChannelAlertCode(int(header['value'])))
+
+        elif kind == ALERT_CLEARED:
+            ch.on_alert_cleared.emit(ChannelAlertCode(int(header['value'])))
+
+        elif kind == ALERT_CLEAR_DISMISSED:
+            ch.on_alert_clear_dismissed.emit()
@@ -0,0 +1,68 @@
+class SettleTimeLearner:
+    # Learns how long the wavemeter needs after a fiber switch before the
+    # readings belong to the new channel, separately for each channel and
+    # exposure setting.
+    #
+    # The estimate is probed downwards a little every time the first reading
+    # after the wait is already good, and pushed up to the time of the last
+    # transient reading whenever the wait turns out to be too short. The wait
+    # is the estimate plus a safety margin.
+
+    def __init__(self, initial_wait=0.2, margin=0.02, min_wait=0.0,
+                 max_wait=1.0, decay=0.1, tolerance=1e9):
+        # initial_wait: used for channels without any experience yet
+        # margin: added to the estimate, in seconds
+        # max_wait: readings after this long are never taken as transient
+        # decay: fraction the estimate shrinks by after a clean switch
+        # tolerance: readings closer than this (Hz) to the previous channel
+        #     are taken as leftovers of the previous channel
+        self.initial_wait = initial_wait
+        self.margin = margin
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.decay = decay
+        self.tolerance = tolerance
+
+        self.estimates = {}  # (channel_num, expo, expo2) -> seconds
+        self.last_frequencies = {}  # channel_num -> Hz
+
+    @staticmethod
+    def make_key(channel_num, expo, expo2):
+        return channel_num, expo, expo2
+
+    def get_wait_time(self, key):
+        if key not in self.estimates:
+            return self.initial_wait
+
+        wait = self.estimates[key] + self.margin
+        return min(max(wait, self.min_wait), self.max_wait)
+
+    def remember_frequency(self, channel_num, frequency):
+        self.last_frequencies[channel_num] = frequency
+
+    def is_transient(self, channel_num, previous_channel_num, frequency):
+        # a reading is transient if it looks like the previous channel and
+        # doesn't look like this channel
+        if previous_channel_num is None or \
+                previous_channel_num not in self.last_frequencies:
+            return False
+
+        previous = self.last_frequencies[previous_channel_num]
+        if abs(frequency - previous) > self.tolerance:
+            return False
+
+        if channel_num in self.last_frequencies:
+            return abs(frequency - self.last_frequencies[channel_num]) > self.tolerance
+
+        return True
+
+    def record(self, key, last_transient_after=None):
+        # last_transient_after: seconds between the switch and the last bad
+        # or transient reading, None if the first reading was good already
+        if last_transient_after is None:
+            if key not in self.estimates:
+                self.estimates[key] = self.initial_wait
+            self.estimates[key] = max(self.min_wait,
+                                      self.estimates[key] * (1 - self.decay))
+        else:
+            self.estimates[key] = min(last_transient_after, self.max_wait)
@@ -2,4 +2,7 @@ from .wavemeter_ws7 import (WavemeterWS7, WavemeterWS7Exception,
                             WavemeterWS7BadSignalException,
                             WavemeterWS7HighSignalException,
                             WavemeterWS7LowSignalException,
-                            WavemeterWS7NoSignalException)
+                            WavemeterWS7NoSignalException,
+                            WavemeterWS7TimeoutException)
+from .simulated_ws7 import SimulatedWavemeterWS7
+from .pattern_buffer_pool import PatternBufferPool
@@ -0,0 +1,26 @@
+import time
+
+
+class InstrumentClock:
+    # Turns the millisecond timestamps of the wavemeter (the IntVal of its
+    # measurement events) into time.time(). The offset between the two
+    # clocks is the smallest (arrival - timestamp) seen so far, i.e. the
+    # quickest event is taken as delivered right away.
+
+    def __init__(self, resync_after=1.0):
+        # resync_after: seconds the offset may grow by before it's taken as
+        #     the wavemeter clock restarting or wrapping around, not as a
+        #     late event
+        self.resync_after = resync_after
+        self.offset = None
+
+    def to_wall_clock(self, stamp_ms, received_at=None):
+        if received_at is None:
+            received_at = time.time()
+
+        offset = received_at - stamp_ms / 1000
+        if self.offset is None or offset < self.offset or \
+                offset - self.offset > self.resync_after:
+            self.offset = offset
+
+        return stamp_ms / 1000 + self.offset
@@ -0,0 +1,82 @@
+import sys
+import weakref
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+
+class PatternBufferPool:
+    # Reuses the arrays interference patterns are read into, instead of
+    # allocating a new one for every read.
+    #
+    # acquire() gives a writable buffer to fill, view() a read-only view of it
+    # to hand out. Once a pattern is retired (replaced by a newer one, told by
+    # Monitor), its buffer goes back to the pool as soon as nothing refers to
+    # it any more: no view of it left in a channel, a chart, a queued signal
+    # or the pattern archive. Whoever reads the pattern doesn't have to say
+    # when they're done with it.
+
+    def __init__(self, keep=8):
+        # keep: free buffers kept for each pattern length, and retired ones
+        #     still referred to. Beyond that they're left to the garbage
+        #     collector.
+        self.keep = keep
+
+        self._lock = Lock()
+        self._free = {}  # length -> deque of buffers
+        self._handed_out = weakref.WeakValueDictionary()  # id -> buffer
+        self._retired = deque()  # buffers, maybe still referred to
+
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, count):
+        with self._lock:
+            self._collect()
+            free = self._free.get(count)
+            if free:
+                buffer = free.pop()
+                self.reuses += 1
+            else:
+                buffer = np.empty(count, dtype=np.ushort)
+                self.allocations += 1
+
+            self._handed_out[id(buffer)] = buffer
+
+        return buffer
+
+    @staticmethod
+    def view(buffer):
+        view = buffer.view()
+        view.flags.writeable = False
+        return view
+
+    def retire(self, pattern):
+        if not isinstance(pattern, np.ndarray):
+            return
+        # views of views have the buffer as their base as well
+        buffer = pattern if pattern.base is None else pattern.base
+        del pattern
+
+        with self._lock:
+            if self._handed_out.get(id(buffer)) is not buffer:
+                return  # not one of ours, or retired already
+            del self._handed_out[id(buffer)]
+            self._retired.append(buffer)
+
+    def _collect(self):
+        # moves the retired buffers nothing else refers to to the free ones
+        for _ in range(len(self._retired)):
+            buffer = self._retired.popleft()
+            # the one of buffer, and the one of getrefcount's argument
+            if sys.getrefcount(buffer) > 2:
+                self._retired.append(buffer)
+                continue
+
+            free = self._free.setdefault(len(buffer), deque())
+            if len(free) < self.keep:
+                free.append(buffer)
+
+        while len(self._retired) > self.keep:
+            self._retired.popleft()
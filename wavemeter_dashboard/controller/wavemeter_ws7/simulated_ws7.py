@@ -0,0 +1,318 @@
+import math
+import time
+import random
+
+import numpy as np
+
+from .pattern_buffer_pool import PatternBufferPool
+from .wavemeter_ws7 import (WavemeterWS7Exception,
+                            WavemeterWS7BadSignalException,
+                            WavemeterWS7NoSignalException,
+                            WavemeterWS7LowSignalException,
+                            WavemeterWS7HighSignalException,
+                            WavemeterWS7TimeoutException)
+
+
+class SimulatedWavemeterWS7:
+    # A stand-in for WavemeterWS7 that does not need wlmData.dll. It follows
+    # the same interface so Monitor can be run and timed without the
+    # instrument. Which channel is "in the fiber" is told by the simulated
+    # fiber switch through select_channel().
+
+    PATTERN_LENGTH = 1024
+    WIDE_PATTERN_LENGTH = 2048
+
+    # seconds the internal switcher takes to go to the next channel
+    SWITCHER_SWITCH_TIME = 0.005
+
+    def __init__(self, base_frequencies=None, latency=0.0, noise=1e6,
+                 drift=0.0, dropout_rate=0.0, bad_signal_rate=0.0,
+                 settle_time=0.0, seed=None):
+        # base_frequencies: {channel_num: frequency in Hz}
+        # latency: seconds spent inside each call, like a slow DLL round trip
+        # noise: standard deviation of the reading, in Hz
+        # drift: linear drift of every channel, in Hz/s
+        # dropout_rate: probability of a reading failing with no signal
+        # bad_signal_rate: probability of a reading failing with bad signal
+        # settle_time: seconds after a switch during which the old channel
+        #     is still being read
+        self.base_frequencies = dict(base_frequencies) if base_frequencies else {}
+        self.latency = latency
+        self.noise = noise
+        self.drift = drift
+        self.dropout_rate = dropout_rate
+        self.bad_signal_rate = bad_signal_rate
+        self.settle_time = settle_time
+
+        self.random = random.Random(seed)
+        self.version = "simulated"
+
+        self.active_channel = 1
+        self.previous_channel = None
+        self.switched_at = 0
+        self.start_time = time.time()
+
+        self.auto_exposure = False
+        self.exposure = 10
+        self.exposure2 = 10
+        self._optimal_exposure = {}
+        self.pattern_pool = PatternBufferPool()
+
+        # measurements finish every (exposure + exposure2) ms, counted from
+        # the last time the exposure got restarted
+        self._cycle_origin = time.time()
+        self._last_measurement = 0
+        self.measurement_times = {}  # like WavemeterWS7
+
+        # the internal switcher, measuring the channels in use in turn
+        self.switcher_mode = False
+        self.switcher_signals = set()
+        self._switcher_exposures = {}  # channel -> (expo, expo2)
+        self._switcher_results = {}  # channel -> frequency in THz, or exception
+        self._switcher_index = -1
+        self._switcher_done_at = time.time()
+
+    def _restart_exposure(self):
+        self._cycle_origin = time.time()
+        self._last_measurement = 0
+
+    def _measurement_period(self):
+        return max((self.exposure + self.exposure2) / 1000, 0.001)
+
+    def select_channel(self, channel):
+        if channel != self.active_channel:
+            self.previous_channel = self.active_channel
+            self.active_channel = channel
+            self.switched_at = time.time()
+            self._restart_exposure()
+
+    def _wait_latency(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _base_frequency(self, channel):
+        if channel not in self.base_frequencies or \
+                not self.base_frequencies[channel]:
+            # somewhere in the visible/near IR
+            self.base_frequencies[channel] = 4e14 + channel * 1e12
+        return self.base_frequencies[channel]
+
+    def _optimal_exposure_of(self, channel):
+        if channel not in self._optimal_exposure:
+            self._optimal_exposure[channel] = (self.random.randint(5, 50),
+                                               self.random.randint(5, 50))
+        return self._optimal_exposure[channel]
+
+    def _channel_being_read(self):
+        if self.previous_channel is not None and \
+                time.time() - self.switched_at < self.settle_time:
+            return self.previous_channel
+        return self.active_channel
+
+    def _check_signal(self, channel, exposure):
+        if self.random.random() < self.dropout_rate:
+            raise WavemeterWS7NoSignalException
+        if self.random.random() < self.bad_signal_rate:
+            raise WavemeterWS7BadSignalException
+
+        if not self.auto_exposure:
+            optimal, _ = self._optimal_exposure_of(channel)
+            if exposure < optimal / 4:
+                raise WavemeterWS7LowSignalException
+            elif exposure > optimal * 4:
+                raise WavemeterWS7HighSignalException
+
+    def _measure(self, channel, exposure):
+        self._check_signal(channel, exposure)
+
+        elapsed = time.time() - self.start_time
+        frequency = self._base_frequency(channel) + self.drift * elapsed + \
+            self.random.gauss(0, self.noise)
+
+        return frequency / 1e12  # in THz, like the dll
+
+    def get_frequency(self):
+        self._wait_latency()
+        return self._measure(self._channel_being_read(), self.exposure)
+
+    def get_measurement_time(self, channel=1):
+        return self.measurement_times.get(channel)
+
+    def _next_switcher_channel(self):
+        # (index, channel, time it's done) of the next switcher measurement
+        channels = sorted(self.switcher_signals)
+        index = (self._switcher_index + 1) % len(channels)
+        expo, expo2 = self._switcher_exposures.get(
+            channels[index], (self.exposure, self.exposure2))
+        done_at = self._switcher_done_at + self.SWITCHER_SWITCH_TIME + \
+            max((expo + expo2) / 1000, 0.001)
+        return index, channels[index], done_at
+
+    def _run_switcher(self):
+        # catches up with the measurements finished by now
+        if not self.switcher_mode or not self.switcher_signals:
+            self._switcher_done_at = time.time()
+            return
+
+        while True:
+            index, channel, done_at = self._next_switcher_channel()
+            if done_at > time.time():
+                return
+
+            self._switcher_index = index
+            self._switcher_done_at = done_at
+            self.measurement_times[channel] = done_at
+            expo, _ = self._switcher_exposures.get(
+                channel, (self.exposure, self.exposure2))
+            try:
+                self._switcher_results[channel] = self._measure(channel, expo)
+            except WavemeterWS7Exception as e:
+                self._switcher_results[channel] = e
+
+    def get_frequency_num(self, channel):
+        self._wait_latency()
+        self._run_switcher()
+
+        result = self._switcher_results.get(channel)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def is_switcher_mode(self):
+        return self.switcher_mode
+
+    def set_switcher_mode(self, on):
+        self._wait_latency()
+        self._run_switcher()
+        self.switcher_mode = bool(on)
+
+    def set_switcher_channel(self, channel):
+        self._wait_latency()
+        self.select_channel(channel)
+
+    def set_switcher_signal(self, channel, use, show=True):
+        self._wait_latency()
+        self._run_switcher()
+        if use:
+            self.switcher_signals.add(channel)
+        else:
+            self.switcher_signals.discard(channel)
+            self._switcher_results.pop(channel, None)
+
+    def set_exposure_num(self, channel, expo, expo2):
+        self._wait_latency()
+        if expo is None or expo2 is None or expo < 0 or expo2 < 0:
+            raise WavemeterWS7Exception("WLM Error: ResERR_ParmOutOfRange")
+        self._switcher_exposures[channel] = (expo, expo2)
+
+    def wait_for_switcher_measurement(self, timeout):
+        self._wait_latency()
+        self._run_switcher()
+
+        wait = math.inf
+        if self.switcher_mode and self.switcher_signals:
+            wait = self._next_switcher_channel()[2] - time.time()
+
+        if wait > timeout:
+            time.sleep(timeout)
+            raise WavemeterWS7TimeoutException(
+                f"No measurement within {timeout:.2f}s")
+
+        time.sleep(max(wait, 0))
+
+    def wait_for_frequency(self, timeout, fresh=False):
+        self._wait_latency()
+
+        now = time.time()
+        period = self._measurement_period()
+        completed = int((now - self._cycle_origin) / period)
+
+        if fresh or completed <= self._last_measurement:
+            target = completed + 1
+            wait = self._cycle_origin + target * period - now
+        else:
+            target = completed
+            wait = 0
+
+        if wait > timeout:
+            time.sleep(timeout)
+            raise WavemeterWS7TimeoutException(
+                f"No measurement within {timeout:.2f}s")
+
+        time.sleep(wait)
+        self._last_measurement = target
+        self.measurement_times[1] = self._cycle_origin + target * period
+
+        return self.get_frequency()
+
+    def get_temperature(self):
+        self._wait_latency()
+        return 25.0 + self.random.gauss(0, 0.01)
+
+    def get_pressure(self):
+        self._wait_latency()
+        return 1013.0 + self.random.gauss(0, 0.1)
+
+    def is_auto_exposure(self):
+        return self.auto_exposure
+
+    def set_auto_exposure(self, on):
+        self._wait_latency()
+        self.auto_exposure = bool(on)
+        if self.auto_exposure:
+            self.exposure, self.exposure2 = \
+                self._optimal_exposure_of(self.active_channel)
+
+    def get_exposure(self):
+        self._wait_latency()
+        if self.auto_exposure:
+            self.exposure, self.exposure2 = \
+                self._optimal_exposure_of(self.active_channel)
+        return self.exposure, self.exposure2
+
+    def set_exposure(self, expo, expo2):
+        self._wait_latency()
+        if expo is None or expo2 is None or expo < 0 or expo2 < 0:
+            raise WavemeterWS7Exception("WLM Error: ResERR_ParmOutOfRange")
+        self.exposure = expo
+        self.exposure2 = expo2
+        self._restart_exposure()
+
+    def _make_pattern(self, wide):
+        length = self.WIDE_PATTERN_LENGTH if wide else self.PATTERN_LENGTH
+        frequency = self._base_frequency(self._channel_being_read())
+        # fringe spacing loosely follows the frequency, so channels look
+        # different from each other
+        period = 20 + (frequency / 1e12) % 30
+        x = np.arange(length)
+        envelope = np.exp(-((x - length / 2) / (length / 3)) ** 2)
+        fringe = 0.5 + 0.5 * np.cos(2 * math.pi * x / period)
+        noise = np.array([self.random.random() for _ in range(0, length, 64)])
+        noise = np.repeat(noise, 64)[:length]
+        pattern = 3000 * envelope * fringe + 50 * noise
+
+        buffer = self.pattern_pool.acquire(length)
+        np.copyto(buffer, pattern, casting='unsafe')
+        return self.pattern_pool.view(buffer)
+
+    def get_next_pattern(self, wide=False, timeout=None):
+        # the real one waits for the next exposure to finish
+        now = time.time()
+        period = self._measurement_period()
+        done_at = self._cycle_origin + \
+            (int((now - self._cycle_origin) / period) + 1) * period
+
+        if timeout is not None and done_at - now > timeout:
+            time.sleep(timeout)
+            raise WavemeterWS7TimeoutException(
+                f"No pattern within {timeout:.2f}s")
+
+        time.sleep(done_at - now)
+        return self.get_pattern(wide)
+
+    def get_pattern(self, wide=False):
+        self._wait_latency()
+        return self._make_pattern(wide)
+
+    def error_msg_for_set_func(self, code):
+        return f"simulated error {code}"
@@ -1,7 +1,10 @@
+import time
 from . import const
 from . import api
-from ctypes import c_double, c_long, c_ulong, c_ushort, byref, POINTER, cast
-import numpy as np
+from ctypes import c_double, c_long, c_ulong, byref, POINTER
+
+from .pattern_buffer_pool import PatternBufferPool
+from .instrument_clock import InstrumentClock
 
 DLL_PATH = "wlmData.dll"
 
@@ -26,8 +29,25 @@ class WavemeterWS7HighSignalException(WavemeterWS7Exception):
     pass
 
 
+class WavemeterWS7TimeoutException(WavemeterWS7Exception):
+    pass
+
+
 class WavemeterWS7:
-    def __init__(self):
+    # how long a single WaitForWLMEvent call may block, in ms. Longer waits
+    # are made of several calls.
+    EVENT_WAIT_TIMEOUT = 100
+
+    # a new wavelength on channel 1 to 8 of the internal switcher
+    SWITCHER_EVENTS = (const.cmiWavelength1, const.cmiWavelength2,
+                       const.cmiWavelength3, const.cmiWavelength4,
+                       const.cmiWavelength5, const.cmiWavelength6,
+                       const.cmiWavelength7, const.cmiWavelength8)
+
+    def __init__(self, wlm_index=None):
+        # wlm_index: which wlmServer instance to talk to, if there are more
+        # than one. The dll addresses one at a time for the whole process,
+        # so every wave meter needs a process of its own.
         try:
             api.LoadDLL(DLL_PATH)
         except Exception:
@@ -36,6 +56,10 @@ class WavemeterWS7:
         if api.dll.GetWLMCount(0) == 0:
             raise WavemeterWS7Exception("There is no running wlmServer instance(s).")
 
+        if wlm_index is not None:
+            api.dll.PresetWLMIndex(wlm_index)
+        self.wlm_index = wlm_index
+
         version_type = api.dll.GetWLMVersion(0)
         version_ver = api.dll.GetWLMVersion(1)
         version_rev = api.dll.GetWLMVersion(2)
@@ -43,11 +67,28 @@ class WavemeterWS7:
         self.version = "%s.%s.%s.%s" % (version_type, version_ver,
                                         version_rev, version_build)
 
-        self._pattern_wait_event_registered = False
+        self._wait_event_registered = False
+        self.pattern_pool = PatternBufferPool()
+
+        # signal (switcher channel) -> time.time() of its last measurement,
+        # known from the events
+        self.measurement_times = {}
+        self.clock = InstrumentClock()
         api.dll.Operation(const.cCtrlStartMeasurement)
 
     def get_frequency(self):
-        frequency = api.dll.GetFrequency(0.0)
+        return self._check_frequency(api.dll.GetFrequency(0.0))
+
+    def get_frequency_num(self, channel):
+        # latest frequency of a channel of the internal switcher, None if it
+        # hasn't been measured yet
+        frequency = api.dll.GetFrequencyNum(channel, 0.0)
+        if frequency == const.ErrNoValue:
+            return None
+
+        return self._check_frequency(frequency)
+
+    def _check_frequency(self, frequency):
         if frequency == const.ErrWlmMissing:
             raise WavemeterWS7Exception("WLM inactive")
         elif frequency == const.ErrNoSignal:
@@ -105,50 +146,118 @@ class WavemeterWS7:
             raise WavemeterWS7Exception(
                 f"WLM Error: {self.error_msg_for_set_func(ret)}")
 
-    def get_next_pattern(self, wide=False):
-        if not self._pattern_wait_event_registered:
-            # the last arg is timeout, -1 means keep waiting
+    def is_switcher_mode(self):
+        return bool(api.dll.GetSwitcherMode(0))
+
+    def set_switcher_mode(self, on):
+        # on: the wavemeter cycles through the channels in use by itself
+        ret = api.dll.SetSwitcherMode(int(on))
+        if ret != 0:
+            raise WavemeterWS7Exception(
+                f"WLM Error: {self.error_msg_for_set_func(ret)}")
+
+    def set_switcher_channel(self, channel):
+        # the channel measured while not in switcher mode
+        ret = api.dll.SetSwitcherChannel(channel)
+        if ret != 0:
+            raise WavemeterWS7Exception(
+                f"WLM Error: {self.error_msg_for_set_func(ret)}")
+
+    def set_switcher_signal(self, channel, use, show=True):
+        ret = api.dll.SetSwitcherSignalStates(channel, int(use), int(show))
+        if ret != 0:
+            raise WavemeterWS7Exception(
+                f"WLM Error: {self.error_msg_for_set_func(ret)}")
+
+    def set_exposure_num(self, channel, expo, expo2):
+        # exposure of a channel of the internal switcher, in ms
+        for array, value in ((1, expo), (2, expo2)):
+            ret = api.dll.SetExposureNum(channel, array, value)
+            if ret != 0:
+                raise WavemeterWS7Exception(
+                    f"WLM Error: {self.error_msg_for_set_func(ret)}")
+
+    def wait_for_switcher_measurement(self, timeout):
+        # block until the internal switcher finishes measuring some channel
+        event = self._wait_for_event(self.SWITCHER_EVENTS, timeout)
+
+        if event is None:
+            raise WavemeterWS7TimeoutException(
+                f"No measurement within {timeout:.2f}s")
+
+        mode, stamp, _ = event
+        self.measurement_times[self.SWITCHER_EVENTS.index(mode) + 1] = \
+            self.clock.to_wall_clock(stamp)
+
+    def _register_wait_event(self):
+        if not self._wait_event_registered:
             api.dll.Instantiate(const.cInstNotification,
                                 const.cNotifyInstallWaitEvent,
-                                c_long(500), c_long(0))
-            self._pattern_wait_event_registered = True                    
+                                c_long(self.EVENT_WAIT_TIMEOUT), c_long(0))
+            self._wait_event_registered = True
+
+    def _wait_for_event(self, modes, timeout=None, fresh=False):
+        # wait until one of the modes shows up in the WLM event queue,
+        # returns (mode, intval, dblval), or None if timed out.
+        # fresh=True ignores the events queued before the call.
+        self._register_wait_event()
 
         mode = c_long(0)
-        intval = c_long(1)
+        intval = c_long(0)
         dblval = c_double(0)
 
-        pattern_flag = const.cSignal1Interferometers if not wide else \
-            const.cSignal1WideInterferometer
+        deadline = None if timeout is None else time.time() + timeout
+        wait_func = api.dll.WaitForNextWLMEvent if fresh else \
+            api.dll.WaitForWLMEvent
 
-        while True:
-            ret = api.dll.WaitForWLMEvent(byref(mode), byref(intval), byref(dblval))
+        while deadline is None or time.time() < deadline:
+            mode.value = 0
+            wait_func(byref(mode), byref(intval), byref(dblval))
+            wait_func = api.dll.WaitForWLMEvent
 
-            if mode.value == const.cmiPatternAnalysisWritten:
-                break
+            # on timeout mode is left untouched
+            if mode.value in modes:
+                return mode.value, intval.value, dblval.value
 
-        count = api.dll.GetPatternItemCount(pattern_flag)
+        return None
 
-        if count == 0:
-            return None
+    def wait_for_frequency(self, timeout, fresh=False):
+        # block until the wavemeter finishes a new measurement, then read it
+        event = self._wait_for_event(
+            (const.cmiWavelength1, const.cmiFrequency1), timeout, fresh)
 
-        assert api.dll.GetPatternItemSize(pattern_flag) == 2
+        if event is None:
+            raise WavemeterWS7TimeoutException(
+                f"No measurement within {timeout:.2f}s")
+        self.measurement_times[1] = self.clock.to_wall_clock(event[1])
+
+        return self.get_frequency()
+
+    def get_measurement_time(self, channel=1):
+        # when the measurement last waited for was taken, None if unknown
+        return self.measurement_times.get(channel)
+
+    def get_next_pattern(self, wide=False, timeout=None):
+        pattern_flag = const.cSignal1Interferometers if not wide else \
+            const.cSignal1WideInterferometer
 
-        patterns = (c_ushort * count)()
-        unit_size = api.dll.GetPatternData(pattern_flag, cast(patterns, POINTER(c_ulong)))
+        event = self._wait_for_event((const.cmiPatternAnalysisWritten,), timeout)
+        if timeout is not None and event is None:
+            raise WavemeterWS7TimeoutException(
+                f"No pattern within {timeout:.2f}s")
 
-        return np.frombuffer(patterns, dtype=np.ushort)
+        return self._read_pattern(pattern_flag)
 
     def get_pattern(self, wide=False):
-        if not self._pattern_wait_event_registered:
-            # -1 means keep waiting no timeout (for WaitForWLMEvent)
-            api.dll.Instantiate(const.cInstNotification,
-                                const.cNotifyInstallWaitEvent,
-                                c_long(500), c_long(0))
-            self._pattern_wait_event_registered = True
+        self._register_wait_event()
 
         pattern_flag = const.cSignal1Interferometers if not wide else \
             const.cSignal1WideInterferometer
 
+        return self._read_pattern(pattern_flag)
+
+    def _read_pattern(self, pattern_flag):
+        # returns a read-only view into a buffer of pattern_pool
         count = api.dll.GetPatternItemCount(pattern_flag)
 
         if count == 0:
@@ -156,10 +265,11 @@ class WavemeterWS7:
 
         assert api.dll.GetPatternItemSize(pattern_flag) == 2
 
-        patterns = (c_ushort * count)()
-        unit_size = api.dll.GetPatternData(pattern_flag, cast(patterns, POINTER(c_ulong)))
+        buffer = self.pattern_pool.acquire(count)
+        api.dll.GetPatternData(
+            pattern_flag, buffer.ctypes.data_as(POINTER(c_ulong)))
 
-        return np.frombuffer(patterns, dtype=np.ushort)
+        return self.pattern_pool.view(buffer)
 
     def error_msg_for_set_func(self, code):
         _lookup = {
@@ -17,6 +17,7 @@ class ChannelAlertCode(Enum):
     MONTIROING = 11
     PID_ENGAGED = 12
     PID_LOCKED = 13
+    FIBER_SWITCH_ERROR = 14
 
 
 class ChannelAlertAction(Enum):
@@ -107,6 +108,12 @@ CHANNEL_ALERTS = {
         "DAC RAILED",
         ChannelAlertAction.FLASH_ERROR
     ),
+    ChannelAlertCode.FIBER_SWITCH_ERROR: ChannelAlert(
+        ChannelAlertCode.FIBER_SWITCH_ERROR,
+        90,
+        "SWITCH ERR",
+        ChannelAlertAction.FLASH_ERROR
+    ),
     ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING: ChannelAlert(
         ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING,
         80,
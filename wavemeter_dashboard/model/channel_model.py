@@ -1,11 +1,13 @@
 import random
 import numpy as np
 
-from PyQt5.QtCore import pyqtSignal, QObject, QMetaMethod 
+from PyQt5.QtCore import pyqtSignal, QObject, QMetaMethod, Qt
 from PyQt5.QtGui import QColor
 
 from wavemeter_dashboard.model.channel_alert import ChannelAlertCode, ChannelAlertAction
-from wavemeter_dashboard.model.longterm_data import LongtermData
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.model.longterm_data import ChannelHistory, LongtermData
+from wavemeter_dashboard.model.rolling_statistics import RollingStatistics
 
 colors = [QColor(204, 0, 0),
           QColor(204, 102, 0),
@@ -49,7 +51,8 @@ class ChannelModel(QObject):
     def __init__(self, channel_num, channel_name=None, channel_color=None,
                  dac_channel_num=None):
         super().__init__()
-        assert 1 <= channel_num <= 16
+        # the upper end is up to the fiber switches, see devices.get_channel_range
+        assert 1 <= channel_num
         self.channel_name = channel_name if channel_name else str(channel_num)
         self.channel_color = channel_color if channel_color else \
             colors[random.randint(0, len(colors) - 1)]
@@ -64,6 +67,12 @@ class ChannelModel(QObject):
         self.pid_p_prop_val = None
         self.pid_i_prop_val = None
 
+        # samples taken in a row every time the channel is visited, either
+        # dwell_samples readings, or for dwell_time ms if it is set
+        self.dwell_samples = 1
+        self.dwell_time = None
+        self.dwell_pid_every_sample = False
+
         self.alert_error_out_of_bound_enabled = True
         self.alert_dac_railed_enabled = True
         self.alert_wmt_enabled = True
@@ -75,17 +84,29 @@ class ChannelModel(QObject):
         self.frequency = None
         self.pattern_data = np.array([])
         self.wide_pattern_data = np.array([])
-        self.freq_longterm_data = LongtermData()
-        self.err_longterm_data = LongtermData()
+        self.history = ChannelHistory()
+        self.freq_longterm_data = LongtermData(self.history, 'frequency')
+        self.err_longterm_data = LongtermData(self.history, 'error')
 
         self.freq_max_error = None
         self.pid_i = 0
         self.pid_i_last_time = 0
         self.error = 0
-        self.dac_longterm_data = LongtermData()
+        self.dac_longterm_data = LongtermData(self.history, 'dac')
         self.dac_railed = False
         self.deviate_since = 0
         self.stable_since = 0
+        self.sample_rate = 0  # samples per second, as seen by the scheduler
+
+        # over the last "error_statistics_windows" seconds, brought up to
+        # date in the thread adding the samples, before anyone hears of them
+        self.error_statistics = RollingStatistics(
+            self.history, 'error',
+            config.get('error_statistics_windows',
+                       RollingStatistics.DEFAULT_WINDOWS),
+            config.get('error_statistics_length', 4096))
+        self.on_freq_changed.connect(self.error_statistics.update,
+                                     Qt.DirectConnection)
 
         # maintained by AlertTracker
         self.always_dismiss_alerts = []
@@ -114,6 +135,9 @@ class ChannelModel(QObject):
             'freq_max_error': self.freq_max_error,
             'pid_i_prop_val': self.pid_i_prop_val,
             'pid_p_prop_val': self.pid_p_prop_val,
+            'dwell_samples': self.dwell_samples,
+            'dwell_time': self.dwell_time,
+            'dwell_pid_every_sample': self.dwell_pid_every_sample,
             'alert_error_out_of_bound_enabled': self.alert_error_out_of_bound_enabled,
             'alert_dac_railed_enabled': self.alert_dac_railed_enabled,
             'alert_wmt_enabled': self.alert_wmt_enabled
@@ -133,6 +157,9 @@ class ChannelModel(QObject):
         channel.freq_max_error = _dict['freq_max_error']
         channel.pid_i_prop_val = _dict['pid_i_prop_val']
         channel.pid_p_prop_val = _dict['pid_p_prop_val']
+        channel.dwell_samples = _dict.get('dwell_samples', 1)
+        channel.dwell_time = _dict.get('dwell_time', None)
+        channel.dwell_pid_every_sample = _dict.get('dwell_pid_every_sample', False)
         channel.alert_error_out_of_bound_enabled = _dict['alert_error_out_of_bound_enabled']
         channel.alert_dac_railed_enabled = _dict['alert_dac_railed_enabled']
         channel.alert_wmt_enabled = _dict['alert_wmt_enabled']
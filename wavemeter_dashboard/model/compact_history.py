@@ -0,0 +1,152 @@
+import numpy as np
+
+
+class CompactEncoder:
+    # Packs ChannelHistory records into 13 bytes instead of 33, for history
+    # kept long. What changes from sample to sample is small: the frequency
+    # is stored as a float32 offset from a reference, the time as the
+    # microseconds since the previous sample, and the error not at all, it
+    # is the frequency minus the setpoint.
+    #
+    # The reference, setpoint and starting time are in a segment header. A
+    # new segment begins whenever they stop fitting: the setpoint changed,
+    # the frequency jumped, or the gap is too long for a uint32. The
+    # records are still fixed-width, so they can be appended and mapped like
+    # the plain ones; decode() needs the segments as well.
+
+    DTYPE = np.dtype([
+        ('dt', 'u4'),  # us since the previous record, 0 starting a segment
+        ('offset', 'f4'),  # from the reference frequency
+        ('dac', 'f4'),
+        ('flags', 'u1'),
+    ])
+
+    SEGMENT_DTYPE = np.dtype([
+        ('index', 'i8'),  # of its first record
+        ('time', 'f8'),  # of its first record
+        ('reference', 'f8'),
+        ('setpoint', 'f8'),  # NaN if there's no error
+    ])
+
+    # a float32 offset bigger than this is off by more than a few Hz
+    MAX_JUMP = 1e8
+    # frequency - error comes back off by the rounding
+    SETPOINT_TOLERANCE = 1.0
+
+    def __init__(self, start_index=0):
+        # start_index: the index of the first record to encode, as the
+        # records are numbered in the segments
+        self.index = start_index
+        self.last_time = np.nan
+        self.last_frequency = np.nan
+        self.setpoint = np.nan
+        self.reference = 0.0
+        self.segment_time = np.nan
+        self.last_us = 0  # of the last record since segment_time
+
+    def encode(self, records):
+        # records of ChannelHistory.DTYPE, oldest first;
+        # returns (new segments, packed records)
+        times = records['time']
+        frequencies = records['frequency']
+        setpoints = frequencies - records['error']
+
+        prev_times = np.concatenate(([self.last_time], times[:-1]))
+        prev_setpoints = np.concatenate(([self.setpoint], setpoints[:-1]))
+        # the last frequency known, a DAC output alone has none
+        prev_frequencies = _fill_forward(np.concatenate(
+            ([self.last_frequency], frequencies[:-1])))
+
+        dt = np.round((times - prev_times) * 1e6)
+        new = ~(dt >= 0) | (dt > np.iinfo(np.uint32).max)
+        new |= np.abs(frequencies - prev_frequencies) > self.MAX_JUMP
+        new |= np.isnan(prev_frequencies) & ~np.isnan(frequencies)
+        new |= np.isnan(setpoints) != np.isnan(prev_setpoints)
+        new |= np.abs(setpoints - prev_setpoints) > self.SETPOINT_TOLERANCE
+
+        starts = np.flatnonzero(new)
+        segments = np.empty(len(starts), dtype=self.SEGMENT_DTYPE)
+        segments['index'] = self.index + starts
+        segments['time'] = times[starts]
+        segments['setpoint'] = setpoints[starts]
+        # the first frequency in the segment
+        segments['reference'] = np.nan_to_num(_fill_backward(frequencies)[starts])
+
+        # the segment of every record, the ones before the first new
+        # segment are still in the last one, at -1
+        segment_of = np.cumsum(new) - 1
+        references = np.append(segments['reference'], self.reference)[segment_of]
+        segment_times = np.append(segments['time'], self.segment_time)[segment_of]
+
+        # rounded from the segment start, not from the record before, so
+        # the rounding doesn't add up
+        us = np.round((times - segment_times) * 1e6).astype(np.int64)
+        prev_us = np.concatenate(([self.last_us], us[:-1]))
+
+        packed = np.empty(len(records), dtype=self.DTYPE)
+        packed['dt'] = np.where(new, 0, us - prev_us)
+        packed['offset'] = frequencies - references
+        packed['dac'] = records['dac']
+        packed['flags'] = records['flags']
+
+        self.index += len(records)
+        if len(records):
+            self.last_time = times[-1]
+            self.last_frequency = _fill_forward(
+                np.append(self.last_frequency, frequencies))[-1]
+            self.setpoint = setpoints[-1]
+            self.reference = references[-1]
+            self.segment_time = segment_times[-1]
+            self.last_us = us[-1]
+        return segments, packed
+
+
+def decode(segments, packed):
+    # the ChannelHistory records back, packed being all the records from
+    # index 0 on
+    from wavemeter_dashboard.model.longterm_data import ChannelHistory
+
+    records = np.empty(len(packed), dtype=ChannelHistory.DTYPE)
+    if not len(packed) or not len(segments):
+        return records[:0]
+
+    segment_of = np.searchsorted(
+        segments['index'], np.arange(len(packed)), 'right') - 1
+    # only if the segments were lost in a crash
+    segment_of = np.maximum(segment_of, 0)
+
+    # microseconds since the start of the segment
+    us = np.cumsum(packed['dt'], dtype=np.int64)
+    start_us = us[np.minimum(segments['index'], len(packed) - 1)]
+
+    records['time'] = segments['time'][segment_of] + \
+        (us - start_us[segment_of]) * 1e-6
+    records['frequency'] = segments['reference'][segment_of] + \
+        packed['offset'].astype('f8')
+    records['error'] = records['frequency'] - segments['setpoint'][segment_of]
+    records['dac'] = packed['dac']
+    records['flags'] = packed['flags']
+    return records
+
+
+class CompactChunk:
+    # A full chunk of a ChunkedRing, encoded
+
+    def __init__(self, records):
+        self.segments, self.packed = CompactEncoder().encode(records)
+        self.last = records[-1:].copy()
+        self.nbytes = self.segments.nbytes + self.packed.nbytes
+
+    def decode(self):
+        return decode(self.segments, self.packed)
+
+
+def _fill_forward(values):
+    # NaNs replaced by the value before them
+    index = np.where(np.isnan(values), 0, np.arange(len(values)))
+    np.maximum.accumulate(index, out=index)
+    return values[index]
+
+
+def _fill_backward(values):
+    return _fill_forward(values[::-1])[::-1]
@@ -11,6 +11,9 @@ class GraphableDataKind(Enum):
     FREQ_LONGTERM = 3
     DAC_LONGTERM = 4
     ERR_LONGTERM = 5
+    ERR_RMS = 6
+    ERR_STD = 7
+    ERR_PEAK_TO_PEAK = 8
 
 
 class DataType(Enum):
@@ -42,6 +45,11 @@ class GraphableDataProvider:
         # xs, ys could also be an iterator
         raise NotImplementedError
 
+    def get_data_for_display(self, x_min, x_max, points):
+        # like get_data, but only needs to be good enough to draw from x_min
+        # to x_max (None for all) at a width of `points`
+        return self.get_data()
+
     def transfer_data(self, append_method):
         # call append_method(x, y) in a loop until all data are appended
         raise NotImplementedError
@@ -130,6 +138,9 @@ class FreqLongtermDataProvider(GraphableDataProvider):
     def get_data(self):
         return self.channel.freq_longterm_data.get_data()
 
+    def get_data_for_display(self, x_min, x_max, points):
+        return self.channel.freq_longterm_data.query(x_min, x_max, points)
+
     def transfer_data(self, append_method):
         # not efficient, not recommended
         self.channel.freq_longterm_data.transfer_to(append_method)
@@ -161,6 +172,11 @@ class ErrLongtermDataProvider(GraphableDataProvider):
             return self.channel.err_longterm_data.get_data()
         return None
 
+    def get_data_for_display(self, x_min, x_max, points):
+        if self.channel.freq_setpoint:
+            return self.channel.err_longterm_data.query(x_min, x_max, points)
+        return None
+
     def transfer_data(self, append_method):
         # not efficient, not recommended
         if self.channel.freq_setpoint:
@@ -193,6 +209,9 @@ class DACLongtermDataProvider(GraphableDataProvider):
     def get_data(self):
         return self.channel.dac_longterm_data.get_data()
 
+    def get_data_for_display(self, x_min, x_max, points):
+        return self.channel.dac_longterm_data.query(x_min, x_max, points)
+
     def transfer_data(self, append_method):
         # not efficient, not recommended
         self.channel.dac_longterm_data.transfer_to(append_method)
@@ -201,10 +220,67 @@ class DACLongtermDataProvider(GraphableDataProvider):
         append_method(self.channel.dac_longterm_data.get_newest_point())
 
 
+class ErrStatisticsDataProvider(GraphableDataProvider):
+    # a statistic of the error over the first of "error_statistics_windows"
+    stat = ""
+
+    def __init__(self, channel: ChannelModel):
+        super().__init__(channel)
+
+        self.x_axis_label = "Time"
+        self.x_axis_unit = ""
+        self.x_axis_type = DataType.DATETIME
+        self.y_axis_label = self.name.title()
+        self.y_axis_unit = "MHz"
+        self.y_axis_type = DataType.INT
+        self.y_axis_scale = 10e-6
+        self.append_only = True
+
+        self.new_data_signal: pyqtSignal = channel.on_freq_changed
+
+    def get_data(self):
+        statistics = self.channel.error_statistics
+        if self.channel.freq_setpoint and statistics.windows:
+            return statistics.get_data(0, self.stat)
+        return None
+
+    def transfer_data(self, append_method):
+        data = self.get_data()
+        if data:
+            for x, y in zip(*data):
+                append_method(x, y)
+
+    def append_newest_data(self, append_method):
+        data = self.get_data()
+        if data and len(data[0]):
+            append_method(data[0][-1], data[1][-1])
+
+
+class ErrRmsDataProvider(ErrStatisticsDataProvider):
+    name = "ERROR RMS"
+    kind = GraphableDataKind.ERR_RMS
+    stat = "rms"
+
+
+class ErrStdDataProvider(ErrStatisticsDataProvider):
+    name = "ERROR STD DEV"
+    kind = GraphableDataKind.ERR_STD
+    stat = "std"
+
+
+class ErrPeakToPeakDataProvider(ErrStatisticsDataProvider):
+    name = "ERROR PEAK TO PEAK"
+    kind = GraphableDataKind.ERR_PEAK_TO_PEAK
+    stat = "peak_to_peak"
+
+
 GRAPHABLE_DATA = {
     GraphableDataKind.PATTERN: PatternDataProvider,
     GraphableDataKind.WIDE_PATTERN: WidePatternDataProvider,
     GraphableDataKind.FREQ_LONGTERM: FreqLongtermDataProvider,
     GraphableDataKind.ERR_LONGTERM: ErrLongtermDataProvider,
-    GraphableDataKind.DAC_LONGTERM: DACLongtermDataProvider
+    GraphableDataKind.DAC_LONGTERM: DACLongtermDataProvider,
+    GraphableDataKind.ERR_RMS: ErrRmsDataProvider,
+    GraphableDataKind.ERR_STD: ErrStdDataProvider,
+    GraphableDataKind.ERR_PEAK_TO_PEAK: ErrPeakToPeakDataProvider,
 }
\ No newline at end of file
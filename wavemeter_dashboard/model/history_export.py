@@ -0,0 +1,231 @@
+import os
+import time
+import argparse
+
+import numpy as np
+
+from wavemeter_dashboard.model.longterm_data import ChannelHistory
+from wavemeter_dashboard.model.history_store import HistoryStore
+
+
+class HistoryExportException(Exception):
+    pass
+
+
+# records written at a time, nothing bigger is ever held in memory
+CHUNK_LENGTH = 65536
+
+
+def iter_history(channel_num, start=None, end=None, store: HistoryStore = None,
+                 history: ChannelHistory = None, chunk_length=CHUNK_LENGTH):
+    # the records of a channel between start and end (None for no limit),
+    # chunk_length at a time. From the store if it has the channel, it has
+    # everything the memory has and more; from the history otherwise.
+    if store and store.days(channel_num):
+        for records in store.iter_segments(channel_num, start, end):
+            for i in range(0, len(records), chunk_length):
+                yield records[i:i + chunk_length]
+    elif history is not None:
+        yield from _iter_memory(history, start, end, chunk_length)
+
+
+def _iter_memory(history: ChannelHistory, start, end, chunk_length):
+    # Copied a chunk at a time while the monitor keeps appending. The
+    # chunks are located by the index of the record since the start
+    # (history.total counts them), the oldest records can be dropped in
+    # between. Stops at end, or when it has caught up with the monitor.
+    n = None  # of the next record to copy
+    while True:
+        first = history.total - len(history)
+        if n is None:
+            n = first + (0 if start is None else history.searchsorted(start))
+
+        i = max(n - first, 0)
+        records = history.slice(i, i + chunk_length).copy()
+        if history.total - len(history) != first:
+            continue  # dropped some while copying, they moved
+
+        if end is not None:
+            last = np.searchsorted(records['time'], end, 'right')
+            if last < len(records):
+                if last:
+                    yield records[:last]
+                return
+
+        if not len(records):
+            return
+        yield records
+        n = first + i + len(records)
+
+
+class CsvWriter:
+    COLUMNS = "channel,time,frequency,error,dac,dac_railed"
+    FORMAT = ["%d", "%.6f", "%.1f", "%.1f", "%.6f", "%d"]
+
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.file.write(self.COLUMNS + "\n")
+
+    def write(self, channel_num, records):
+        columns = np.column_stack([
+            np.full(len(records), channel_num),
+            records['time'],
+            records['frequency'],
+            records['error'],
+            records['dac'],
+            records['flags'] & ChannelHistory.FLAG_DAC_RAILED,
+        ])
+        np.savetxt(self.file, columns, self.FORMAT, delimiter=",")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    # one row group per chunk, the same columns as the CSV
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise HistoryExportException("Exporting to Parquet needs pyarrow.")
+
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([
+            ('channel', pyarrow.int32()),
+            ('time', pyarrow.float64()),
+            ('frequency', pyarrow.float64()),
+            ('error', pyarrow.float64()),
+            ('dac', pyarrow.float64()),
+            ('dac_railed', pyarrow.bool_()),
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, channel_num, records):
+        columns = [
+            np.full(len(records), channel_num, dtype=np.int32),
+            records['time'],
+            records['frequency'],
+            records['error'],
+            records['dac'],
+            (records['flags'] & ChannelHistory.FLAG_DAC_RAILED) != 0,
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(np.ascontiguousarray(c)) for c in columns],
+            schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class Hdf5Writer:
+    # a dataset of ChannelHistory records per channel, "ch<num>", grown by
+    # every chunk
+
+    def __init__(self, path):
+        try:
+            import h5py
+        except ImportError:
+            raise HistoryExportException("Exporting to HDF5 needs h5py.")
+
+        self.file = h5py.File(path, "w")
+
+    def write(self, channel_num, records):
+        name = f"ch{channel_num}"
+        if name not in self.file:
+            self.file.create_dataset(name, shape=(0,), maxshape=(None,),
+                                     dtype=ChannelHistory.DTYPE, chunks=True)
+
+        dataset = self.file[name]
+        n = len(dataset)
+        dataset.resize((n + len(records),))
+        dataset[n:] = np.asarray(records)
+
+    def close(self):
+        self.file.close()
+
+
+WRITERS = {
+    ".csv": CsvWriter,
+    ".parquet": ParquetWriter,
+    ".h5": Hdf5Writer,
+    ".hdf5": Hdf5Writer,
+}
+
+
+def export_history(path, channels, start=None, end=None,
+                   store: HistoryStore = None, histories=None,
+                   stop_event=None, progress=None):
+    # Writes the records of channels between start and end to path, the
+    # format by its extension. histories: channel_num -> ChannelHistory, for
+    # the channels not in the store. Checks stop_event (a threading.Event)
+    # and calls progress(channel_num, records written) after every chunk.
+    # Returns the number of records written.
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise HistoryExportException(f"Unknown export format {extension}.")
+
+    histories = histories or {}
+    writer = WRITERS[extension](path)
+    count = 0
+    try:
+        for channel_num in channels:
+            for records in iter_history(channel_num, start, end, store,
+                                        histories.get(channel_num)):
+                if stop_event and stop_event.is_set():
+                    return count
+
+                writer.write(channel_num, records)
+                count += len(records)
+                if progress:
+                    progress(channel_num, count)
+    finally:
+        writer.close()
+
+    return count
+
+
+def parse_time(text):
+    # local "yyyy-mm-dd", "yyyy-mm-dd hh:mm[:ss]" or seconds since the
+    # epoch; None if empty
+    text = text.strip()
+    if not text:
+        return None
+
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(text, fmt))
+        except ValueError:
+            pass
+
+    try:
+        return float(text)
+    except ValueError:
+        raise HistoryExportException(f"Can't read the time {text}.")
+
+
+if __name__ == "__main__":
+    # python -m wavemeter_dashboard.model.history_export out.csv --channels 9
+    from wavemeter_dashboard import config
+    from wavemeter_dashboard.model.history_store import open_history_store
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output", help=".csv, .parquet, .h5 or .hdf5")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--channels", type=int, nargs="+",
+                        help="all the ones recorded if not given")
+    parser.add_argument("--start", default="")
+    parser.add_argument("--end", default="")
+    args = parser.parse_args()
+
+    config.config.load_config(args.config)
+    store = open_history_store(read_only=True)
+    if not store:
+        parser.error("\"history_store_path\" isn't set in the config")
+
+    channels = args.channels or store.channels()
+    count = export_history(
+        args.output, channels, parse_time(args.start), parse_time(args.end),
+        store, progress=lambda num, n: print(f"\rch{num}: {n}", end=""))
+    print(f"\n{count} samples written to {args.output}")
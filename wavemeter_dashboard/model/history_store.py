@@ -0,0 +1,278 @@
+import os
+import time
+import calendar
+from threading import Thread, Lock, Event
+
+import numpy as np
+
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.model.longterm_data import ChannelHistory
+from wavemeter_dashboard.model.compact_history import CompactEncoder, decode
+
+
+class HistoryStore:
+    # The history of every channel on disk, so it outlives the program and
+    # isn't limited by the memory. Records are the ones of ChannelHistory,
+    # appended to one file per channel per day (UTC):
+    #
+    #     <root>/ch<num>/<yyyy-mm-dd>.bin
+    #
+    # The files are append-only and the records fixed-width, so a crash can
+    # at most leave half a record at the end, which the readers ignore.
+    # Appending is an unbuffered write() into the page cache; the fsync is
+    # done by a background thread every sync_interval seconds, the
+    # acquisition never waits for the disk.
+    #
+    # Reading maps the day files into numpy read-only, without copying.
+    #
+    # With compact, the records are written by a CompactEncoder instead, in
+    # <yyyy-mm-dd>.cbin, with their segments in <yyyy-mm-dd>.seg. A day is
+    # decoded as a whole when it's read.
+
+    DTYPE = ChannelHistory.DTYPE
+    SECONDS_PER_DAY = 86400
+
+    # records put back into a ChannelHistory without a length limit
+    PRELOAD_LENGTH = 65536
+
+    def __init__(self, root, sync_interval=10, compact=False):
+        self.root = root
+        self.sync_interval = sync_interval
+        self.compact = compact
+
+        self.lock = Lock()
+        self.files = {}  # channel_num -> (day, _DayFile) being appended to
+        self.unsynced = set()  # channel_nums written since the last fsync
+
+        self.stop_event = Event()
+        self.sync_thread = None
+        if sync_interval:
+            self.sync_thread = Thread(name="HistoryStore", target=self._sync_loop,
+                                      daemon=True)
+            self.sync_thread.start()
+
+    @classmethod
+    def day_of(cls, t):
+        return int(t // cls.SECONDS_PER_DAY)
+
+    def _channel_dir(self, channel_num):
+        return os.path.join(self.root, f"ch{channel_num}")
+
+    def _path(self, channel_num, day, extension=".bin"):
+        name = time.strftime("%Y-%m-%d", time.gmtime(day * self.SECONDS_PER_DAY))
+        return os.path.join(self._channel_dir(channel_num), name + extension)
+
+    def _file(self, channel_num, day):
+        day_file = self.files.get(channel_num)
+        if day_file and day_file[0] == day:
+            return day_file[1]
+
+        if day_file:
+            # the sync thread may have taken it already, it can't sync a
+            # closed file
+            day_file[1].sync()
+            day_file[1].close()
+
+        os.makedirs(self._channel_dir(channel_num), exist_ok=True)
+        if self.compact:
+            f = _CompactDayFile(self._path(channel_num, day, ".cbin"),
+                                self._path(channel_num, day, ".seg"))
+        else:
+            f = _DayFile(self._path(channel_num, day))
+        self.files[channel_num] = (day, f)
+        return f
+
+    def append(self, channel_num, records):
+        # records: of DTYPE, oldest first
+        records = np.ascontiguousarray(records, dtype=self.DTYPE)
+        if not len(records):
+            return
+
+        days = (records['time'] // self.SECONDS_PER_DAY).astype(np.int64)
+        with self.lock:
+            # a batch can go past midnight
+            for day in np.unique(days):
+                self._file(channel_num, int(day)).write(records[days == day])
+            self.unsynced.add(channel_num)
+
+    def sync(self):
+        with self.lock:
+            files = [self.files[num][1] for num in self.unsynced
+                     if num in self.files]
+            self.unsynced.clear()
+
+        for f in files:
+            f.sync()
+
+    def _sync_loop(self):
+        while not self.stop_event.wait(self.sync_interval):
+            self.sync()
+
+    def close(self):
+        self.stop_event.set()
+        with self.lock:
+            for _, f in self.files.values():
+                f.sync()
+                f.close()
+            self.files.clear()
+            self.unsynced.clear()
+
+    def channels(self):
+        # the channel numbers with a directory, sorted
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+
+        return sorted(int(name[2:]) for name in names
+                      if name.startswith("ch") and name[2:].isdigit())
+
+    def days(self, channel_num):
+        # the days with records, oldest first
+        try:
+            names = os.listdir(self._channel_dir(channel_num))
+        except FileNotFoundError:
+            return []
+
+        days = set()
+        for name in names:
+            base, extension = os.path.splitext(name)
+            if extension not in (".bin", ".cbin"):
+                continue
+            try:
+                t = time.strptime(base, "%Y-%m-%d")
+            except ValueError:
+                continue
+            days.add(self.day_of(calendar.timegm(t)))
+        return sorted(days)
+
+    def map_day(self, channel_num, day):
+        # the records of that day, mapped read-only, or an empty array.
+        # Compact ones are decoded, after the plain ones if the store was
+        # switched over that day.
+        records = _map(self._path(channel_num, day), self.DTYPE)
+        packed = _map(self._path(channel_num, day, ".cbin"), CompactEncoder.DTYPE)
+        if not len(packed):
+            return records
+
+        segments = _map(self._path(channel_num, day, ".seg"),
+                        CompactEncoder.SEGMENT_DTYPE)
+        decoded = decode(segments, packed)
+        if not len(records):
+            return decoded
+        return np.concatenate([records, decoded])
+
+    def iter_segments(self, channel_num, start=None, end=None):
+        # the records between start and end (None for no limit), one mapped
+        # day at a time
+        for day in self.days(channel_num):
+            if start is not None and (day + 1) * self.SECONDS_PER_DAY <= start:
+                continue
+            if end is not None and day * self.SECONDS_PER_DAY > end:
+                break
+
+            records = self.map_day(channel_num, day)
+            lo = 0 if start is None else \
+                np.searchsorted(records['time'], start)
+            hi = len(records) if end is None else \
+                np.searchsorted(records['time'], end, 'right')
+            if lo < hi:
+                yield records[lo:hi]
+
+    def read(self, channel_num, start=None, end=None):
+        # the same in one array; doesn't copy if it's within one day
+        segments = list(self.iter_segments(channel_num, start, end))
+        if not segments:
+            return np.empty(0, dtype=self.DTYPE)
+        if len(segments) == 1:
+            return segments[0]
+        return np.concatenate(segments)
+
+    def read_recent(self, channel_num, n):
+        # the newest n records
+        segments = []
+        for day in reversed(self.days(channel_num)):
+            if n <= 0:
+                break
+            records = self.map_day(channel_num, day)[-n:]
+            segments.insert(0, records)
+            n -= len(records)
+
+        if not segments:
+            return np.empty(0, dtype=self.DTYPE)
+        return np.concatenate(segments)
+
+    def preload(self, channel_num, history: ChannelHistory):
+        # what was recorded before, for the charts
+        history.extend_records(self.read_recent(
+            channel_num, history.points_limit or self.PRELOAD_LENGTH))
+
+
+def open_history_store(read_only=False):
+    # the HistoryStore at "history_store_path", None if not set
+    root = config.get('history_store_path', None)
+    if not root:
+        return None
+
+    sync_interval = 0 if read_only else \
+        config.get('history_store_sync_interval', 10)
+    return HistoryStore(root, sync_interval,
+                        config.get('history_store_compact', False))
+
+
+def _map(path, dtype):
+    # the whole records in the file, read-only
+    try:
+        n = os.path.getsize(path) // dtype.itemsize
+    except FileNotFoundError:
+        n = 0
+
+    if not n:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(n,))
+
+
+def _open_for_append(path, dtype):
+    # drops half a record left behind by a crash while appending
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        size = 0
+    if size % dtype.itemsize:
+        os.truncate(path, size - size % dtype.itemsize)
+
+    return open(path, "ab", buffering=0), size // dtype.itemsize
+
+
+class _DayFile:
+    def __init__(self, path):
+        self.files = [_open_for_append(path, HistoryStore.DTYPE)[0]]
+
+    def write(self, records):
+        self.files[0].write(records.tobytes())
+
+    def sync(self):
+        for f in self.files:
+            try:
+                os.fsync(f.fileno())
+            except (OSError, ValueError):
+                pass  # closed by a day change in the meantime, synced before
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+class _CompactDayFile(_DayFile):
+    def __init__(self, path, segment_path):
+        packed, n = _open_for_append(path, CompactEncoder.DTYPE)
+        segments, _ = _open_for_append(segment_path, CompactEncoder.SEGMENT_DTYPE)
+        self.files = [packed, segments]
+        # a new segment after what's there
+        self.encoder = CompactEncoder(n)
+
+    def write(self, records):
+        segments, packed = self.encoder.encode(records)
+        # the segments first, so the records always have theirs
+        self.files[1].write(segments.tobytes())
+        self.files[0].write(packed.tobytes())
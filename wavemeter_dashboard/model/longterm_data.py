@@ -1,107 +1,541 @@
 import time
-from abc import ABC
 
 import numpy as np
 
 from wavemeter_dashboard.config import config
+from wavemeter_dashboard.model.compact_history import CompactChunk
 
 
-class Array(ABC):
-    def __init__(self):
-        self.length = 0
-        pass
+class StructuredRing:
+    # Keeps the newest `capacity` records of a structured dtype.
+    #
+    # Unlike a round-robin array, the records are always one contiguous
+    # slice of the buffer, so view() never copies. The buffer has some slack
+    # after the newest records; when it runs out, the newest capacity
+    # records are moved to the front, once every slack records.
+
+    def __init__(self, dtype, capacity, slack=0.25):
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        size = capacity + max(int(capacity * slack), 16)
+        self.array = np.zeros(size, dtype=dtype)
+        self.start = 0
+        self.end = 0
+        self.total = 0  # records ever added
+
+    def __len__(self):
+        return self.end - self.start
+
+    def extend(self, records):
+        records = np.asarray(records, dtype=self.array.dtype)
+        n = len(records)
+        self.total += n
+        if n >= self.capacity:
+            records = records[-self.capacity:]
+            n = self.capacity
+            self.start, self.end = 0, 0
+
+        if self.end + n > len(self.array):
+            self._make_room(n)
 
-    def append(self, item):
-        raise NotImplementedError
+        self.array[self.end:self.end + n] = records
+        self.end += n
+        self.start = max(self.start, self.end - self.capacity)
+
+    def _make_room(self, n):
+        # the ones that are still kept after adding n
+        keep = min(self.capacity - n, len(self))
+        self.array[:keep] = self.array[self.end - keep:self.end]
+        self.start, self.end = 0, keep
 
     def view(self):
-        raise NotImplementedError
+        view = self.array[self.start:self.end]
+        view.flags.writeable = False
+        return view
+
+    def tail(self, n):
+        # the newest n records
+        view = self.array[max(self.start, self.end - n):self.end]
+        view.flags.writeable = False
+        return view
+
+    def record(self, i):
+        # the i-th record (negative from the newest), writable
+        i = self.start + i if i >= 0 else self.end + i
+        return self.array[i:i + 1]
+
+    def slice(self, i, j):
+        i, j = max(i, 0), min(j, len(self))
+        view = self.array[self.start + i:self.start + max(i, j)]
+        view.flags.writeable = False
+        return view
+
+    def searchsorted(self, field, value, side='left'):
+        # on a column that only goes up, like np.searchsorted on view()
+        return int(np.searchsorted(self.view()[field], value, side))
+
+    def like(self, dtype, factor):
+        # an empty ring of dtype keeping 1/factor as many records
+        return StructuredRing(dtype, self.capacity // factor + 2)
+
+
+class ChunkedRing:
+    # Records of a structured dtype in chunks of chunk_size, for when there's
+    # no length limit. Growing is adding a chunk, the old records are never
+    # copied or reallocated, so a multi-week run doesn't need twice its
+    # history in memory every time it grows. Past memory_limit bytes the
+    # oldest chunk is dropped.
+    #
+    # With `seal`, e.g. CompactChunk, the chunks before the newest two are
+    # replaced by seal(chunk), which has to have decode(), `last` (its last
+    # record) and `nbytes`. They are decoded again when read.
+    #
+    # There is no view() of everything, it would have to join all the
+    # chunks. tail() and slice() only copy if they go past a chunk.
+
+    def __init__(self, dtype, chunk_size=65536, memory_limit=None, seal=None):
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.memory_limit = memory_limit
+        self.seal = seal
+
+        self.chunks = []
+        self.nbytes = 0
+        self.fill = 0  # records in the newest chunk
+        self.decoded = (None, None)  # the sealed chunk read last, decoded
+        self.total = 0  # records ever added
+
+    def __len__(self):
+        if not self.chunks:
+            return 0
+        return (len(self.chunks) - 1) * self.chunk_size + self.fill
+
+    def _chunk(self, k):
+        # the records of the k-th chunk
+        chunk = self.chunks[k]
+        if isinstance(chunk, np.ndarray):
+            return chunk[:self.fill] if k in (-1, len(self.chunks) - 1) else chunk
+
+        if self.decoded[0] is not chunk:
+            self.decoded = (chunk, chunk.decode())
+        return self.decoded[1]
+
+    def _last(self, k, field):
+        chunk = self.chunks[k]
+        if isinstance(chunk, np.ndarray):
+            return self._chunk(k)[field][-1]
+        return chunk.last[field][0]
+
+    def _add_chunk(self):
+        if self.seal and len(self.chunks) >= 2 and \
+                isinstance(self.chunks[-2], np.ndarray):
+            sealed = self.seal(self.chunks[-2])
+            self.nbytes += sealed.nbytes - self.chunks[-2].nbytes
+            self.chunks[-2] = sealed
+
+        chunk = np.empty(self.chunk_size, dtype=self.dtype)
+        self.chunks.append(chunk)
+        self.nbytes += chunk.nbytes
+        self.fill = 0
+
+        while self.memory_limit and self.nbytes > self.memory_limit and \
+                len(self.chunks) > 1:
+            self.nbytes -= self.chunks[0].nbytes
+            del self.chunks[0]
+
+    def extend(self, records):
+        records = np.asarray(records, dtype=self.dtype)
+        self.total += len(records)
+
+        while len(records):
+            if not self.chunks or self.fill == self.chunk_size:
+                self._add_chunk()
+
+            n = min(len(records), self.chunk_size - self.fill)
+            self.chunks[-1][self.fill:self.fill + n] = records[:n]
+            self.fill += n
+            records = records[n:]
+
+    def tail(self, n):
+        if not self.chunks:
+            return np.empty(0, dtype=self.dtype)
+
+        if n <= self.fill:
+            view = self.chunks[-1][self.fill - n:self.fill]
+            view.flags.writeable = False
+            return view
+
+        return self.slice(len(self) - n, len(self))
+
+    def record(self, i):
+        # the i-th record (negative from the newest), writable; only in the
+        # newest two chunks if they are sealed
+        if i < 0:
+            i += len(self)
+        chunk, i = divmod(i, self.chunk_size)
+        return self.chunks[chunk][i:i + 1]
+
+    def slice(self, i, j):
+        # doesn't copy within a chunk that isn't sealed
+        i, j = max(i, 0), min(j, len(self))
+        if i >= j:
+            return np.empty(0, dtype=self.dtype)
+
+        first, i = divmod(i, self.chunk_size)
+        last, j = divmod(j - 1, self.chunk_size)
+        if first == last:
+            view = self._chunk(first)[i:j + 1]
+            view.flags.writeable = False
+            return view
+
+        return np.concatenate([self._chunk(first)[i:]] +
+                              [self._chunk(k) for k in range(first + 1, last)] +
+                              [self._chunk(last)[:j + 1]])
+
+    def searchsorted(self, field, value, side='left'):
+        # on a column that only goes up, like np.searchsorted on view()
+        if not self.chunks:
+            return 0
+
+        lasts = [self._last(k, field) for k in range(len(self.chunks))]
+        chunk = int(np.searchsorted(lasts, value, side))
+        if chunk == len(self.chunks):
+            return len(self)
+
+        return chunk * self.chunk_size + int(np.searchsorted(
+            self._chunk(chunk)[field], value, side))
+
+    def like(self, dtype, factor):
+        # an empty ring of dtype keeping 1/factor as many records
+        chunk_size = max(self.chunk_size // factor, 64)
+        memory_limit = None
+        if self.memory_limit:
+            memory_limit = (self.memory_limit // self.dtype.itemsize // factor +
+                            chunk_size) * np.dtype(dtype).itemsize
+        return ChunkedRing(dtype, chunk_size, memory_limit)
+
+
+class ChannelHistory:
+    # Everything measured on a channel over time. One record per sample, so
+    # the frequency, its error and the DAC output share one time column.
+    # The error is NaN without a setpoint. The DAC output is NaN when the
+    # PID didn't act on that sample.
 
+    FLAG_DAC_RAILED = 1
+
+    DTYPE = np.dtype([
+        ('time', 'f8'),
+        ('frequency', 'f8'),
+        ('error', 'f8'),
+        ('dac', 'f8'),
+        ('flags', 'u1'),
+    ])
+
+    # how far back set_dac looks for the sample
+    DAC_SEARCH_DEPTH = 256
 
-class ExtendableArray(Array):
     def __init__(self):
-        super().__init__()
-        self._list = []
+        self.points_limit = config.get('longterm_length_limit', 0)
+        if self.points_limit:
+            self.records = StructuredRing(self.DTYPE, self.points_limit)
+        else:
+            memory_limit = config.get('longterm_memory_limit_mb', None)
+            # old chunks in 13 bytes a record instead of 33
+            seal = CompactChunk if config.get('longterm_compact', False) else None
+            self.records = ChunkedRing(
+                self.DTYPE, config.get('longterm_chunk_size', 65536),
+                memory_limit * 2 ** 20 if memory_limit else None, seal)
 
-    def append(self, item):
-        self._list.append(item)
+    def extend(self, times, frequencies, errors=None):
+        records = np.empty(len(times), dtype=self.DTYPE)
+        records['time'] = times
+        records['frequency'] = frequencies
+        records['error'] = np.nan if errors is None else errors
+        records['dac'] = np.nan
+        records['flags'] = 0
+        self.records.extend(records)
 
-    def view(self):
-        return self._list
+    def extend_records(self, records):
+        # records of DTYPE, e.g. from a HistoryStore
+        self.records.extend(records)
+
+    def set_dac(self, value, railed=False, t=None):
+        # the DAC output set after the sample at time t, the newest one if
+        # t is None or not found
+        if not len(self.records):
+            # nothing measured yet, it gets a record of its own
+            self.extend([time.time() if t is None else t], [np.nan])
+
+        index = -1
+        if t is not None:
+            recent = self.records.tail(self.DAC_SEARCH_DEPTH)
+            found = np.searchsorted(recent['time'], t)
+            if found < len(recent) and recent['time'][found] == t:
+                index = found - len(recent)
+
+        record = self.records.record(index)
+        record['dac'] = value
+        if railed:
+            record['flags'] |= self.FLAG_DAC_RAILED
+        else:
+            record['flags'] &= ~np.uint8(self.FLAG_DAC_RAILED)
+
+    def tail(self, n):
+        return self.records.tail(n)
+
+    def since(self, t):
+        # the records after time t, without joining the whole history
+        n = 64
+        while True:
+            tail = self.records.tail(n)
+            if len(tail) < n or tail['time'][0] <= t:
+                return tail[np.searchsorted(tail['time'], t, 'right'):]
+            n *= 4
+
+    def slice(self, i, j):
+        return self.records.slice(i, j)
+
+    def searchsorted(self, t, side='left'):
+        return self.records.searchsorted('time', t, side)
 
     @property
-    def length(self):
-        return len(self._list)
+    def total(self):
+        # records ever added; the first one kept is record total - len(self)
+        return self.records.total
 
+    def __len__(self):
+        return len(self.records)
 
-class RoundRobinArray(Array):
-    # Before writing this class, I have thousands of complaints to make.
-    # Round-robin array is undoubtedly a very common kind of data structure,
-    # nut why there isn't an implementation ready on the shelf?
-    # Why QtChart and pyqtgraph use different methods to handle plot data (
-    # appending vs. passing array), etc.
-    # I'm very unpleasant about these weird things because they cost me extra
-    # labor.
 
-    # Yeah, it is short, but it still took me 20min. And now I have to refactor
-    # a lot of things...
+class MinMaxPyramid:
+    # The min and max of a ChannelHistory column over buckets of FACTOR,
+    # FACTOR ** 2, ... samples, so that any time span can be drawn with
+    # about as many points as the chart has pixels. Every bucket keeps when
+    # its min and max happened, so the spikes survive the downsampling.
+    #
+    # Buckets are numbered from the first sample ever added, so they don't
+    # move when the history drops its oldest samples. The pyramid catches
+    # up when it's asked for a window, and leaves the newest
+    # DAC_SEARCH_DEPTH samples to the level below, since set_dac can still
+    # change them.
 
-    def __init__(self, length):
-        super().__init__()
-        self.length = length
-        self.index = 0
-        self.array = np.zeros(length * 2)  # trade time with space
+    FACTOR = 16
 
-        self.full = False
+    DTYPE = np.dtype([
+        ('tmin', 'f8'),
+        ('vmin', 'f8'),
+        ('tmax', 'f8'),
+        ('vmax', 'f8'),
+    ])
 
-    def append(self, item):
-        self.array[self.index] = item
-        self.array[self.length + self.index] = item
-        self.index += 1
+    def __init__(self, history: ChannelHistory, field):
+        self.history = history
+        self.field = field
+        self.levels = []  # [ring of buckets, number of the next bucket]
 
-        if self.index == self.length:
-            self.index = 0
-            self.full = True
+    def _units(self, level, i, j):
+        # buckets i to j of the level, level 0 being the samples
+        if level == 0:
+            first = self.history.total - len(self.history)
+            records = self.history.slice(i - first, j - first)
+            times, values = records['time'], records[self.field]
+            return times, values, times, values
 
-    def view(self):
-        if not self.full:
-            return self.array[:self.index].view()
+        ring, next_bucket = self.levels[level - 1]
+        first = next_bucket - len(ring)
+        buckets = ring.slice(i - first, j - first)
+        return buckets['tmin'], buckets['vmin'], buckets['tmax'], buckets['vmax']
+
+    def _first_unit(self, level):
+        if level == 0:
+            return self.history.total - len(self.history)
+        ring, next_bucket = self.levels[level - 1]
+        return next_bucket - len(ring)
+
+    def _merge(self, tmin, vmin, tmax, vmax, factor=FACTOR):
+        # factor units at a time into buckets, NaN for all NaN. The last
+        # bucket may be short.
+        short = -len(vmin) % factor
+        if short:
+            pad = np.full(short, np.nan)
+            tmin, tmax = np.append(tmin, pad), np.append(tmax, pad)
+            vmin, vmax = np.append(vmin, pad), np.append(vmax, pad)
+
+        rows = np.arange(len(vmin) // factor)
+        shape = (len(rows), factor)
+        tmin, vmin = tmin.reshape(shape), vmin.reshape(shape)
+        tmax, vmax = tmax.reshape(shape), vmax.reshape(shape)
+
+        imin = np.argmin(np.where(np.isnan(vmin), np.inf, vmin), axis=1)
+        imax = np.argmax(np.where(np.isnan(vmax), -np.inf, vmax), axis=1)
+        return (tmin[rows, imin], vmin[rows, imin],
+                tmax[rows, imax], vmax[rows, imax])
+
+    def update(self):
+        # units of the level below that are done and won't change
+        done = self.history.total - ChannelHistory.DAC_SEARCH_DEPTH
+        level = 1
+        while done >= self.FACTOR:
+            if len(self.levels) < level:
+                ring = self.history.records.like(self.DTYPE, self.FACTOR ** level)
+                self.levels.append([ring, 0])
+
+            ring, next_bucket = self.levels[level - 1]
+            end = done // self.FACTOR
+            first = -(-self._first_unit(level - 1) // self.FACTOR)
+            if next_bucket < first:
+                # fell behind what's kept below, start over from there
+                ring = self.history.records.like(self.DTYPE, self.FACTOR ** level)
+                self.levels[level - 1][0] = ring
+                next_bucket = first
+
+            if next_bucket < end:
+                buckets = np.empty(end - next_bucket, dtype=self.DTYPE)
+                (buckets['tmin'], buckets['vmin'],
+                 buckets['tmax'], buckets['vmax']) = self._merge(*self._units(
+                    level - 1, next_bucket * self.FACTOR, end * self.FACTOR))
+                ring.extend(buckets)
+                self.levels[level - 1][1] = end
+
+            done = self.levels[level - 1][1]
+            level += 1
+
+    def window(self, i, j, points):
+        # samples i to j (numbered like the buckets) in about `points` points
+        self.update()
+
+        # two points for every `size` samples, out of the coarsest level
+        # that still has enough buckets
+        size = max(-(-(j - i) * 2 // max(points, 2)), 1)
+        level = 0
+        while level < len(self.levels) and \
+                self.FACTOR ** (level + 1) <= size:
+            level += 1
+
+        times, values = self._collect(level, i, j, size)
+        has_value = ~np.isnan(values)
+        return times[has_value], values[has_value]
+
+    def _collect(self, level, i, j, size):
+        # size: samples per point pair; the buckets of the level are merged
+        # further to get there, and what the level doesn't have yet comes
+        # from the one below. So do the ends of the window that only fill
+        # part of a bucket, the rest of it is outside.
+        bucket = self.FACTOR ** level
+        if level == 0:
+            first, end = i, j
         else:
-            return self.array[self.index:self.index + self.length].view()
+            ring, next_bucket = self.levels[level - 1]
+            first = max(-(-i // bucket), next_bucket - len(ring))
+            end = min(j // bucket, next_bucket)
+            if first >= end:
+                return self._collect(level - 1, i, j, size)
+
+        units = self._units(level, first, end)
+        if size // bucket > 1:
+            units = self._merge(*units, factor=size // bucket)
+        elif level == 0:
+            return units[:2]
+
+        parts = [self._points(*units)]
+        if i < first * bucket:
+            parts.insert(0, self._collect(level - 1, i, first * bucket, size))
+        if end * bucket < j:
+            parts.append(self._collect(level - 1, end * bucket, j, size))
+
+        return (np.concatenate([times for times, _ in parts]),
+                np.concatenate([values for _, values in parts]))
+
+    @staticmethod
+    def _points(tmin, vmin, tmax, vmax):
+        # the two points of a bucket in the order they happened
+        min_first = tmin <= tmax
+        times = np.empty((len(tmin), 2))
+        values = np.empty((len(tmin), 2))
+        times[:, 0] = np.where(min_first, tmin, tmax)
+        times[:, 1] = np.where(min_first, tmax, tmin)
+        values[:, 0] = np.where(min_first, vmin, vmax)
+        values[:, 1] = np.where(min_first, vmax, vmin)
+        return times.ravel(), values.ravel()
 
 
 class LongtermData:
-    def __init__(self):
-        self.points_limit = 0
-        if config.has('longterm_length_limit'):
-            self.points_limit = config.get('longterm_length_limit')
+    # One column of a ChannelHistory against time, what the charts plot.
+    # Columns other than the frequency skip the samples without a value, so
+    # their get_data() copies.
 
-            self.time = RoundRobinArray(self.points_limit)
-            self.values = RoundRobinArray(self.points_limit)
-        else:
-            self.time = ExtendableArray()
-            self.values = ExtendableArray()
+    def __init__(self, history: ChannelHistory, field):
+        self.history = history
+        self.field = field
+        self.sparse = field != 'frequency'
+        self.pyramid = MinMaxPyramid(history, field)
 
-    def append(self, data):
-        self.time.append(time.time())
-        self.values.append(data)
+    @property
+    def points_limit(self):
+        return self.history.points_limit
 
     def get_time_range(self):
-        view = self.time.view()
-        return view[0], view[-1]
+        if self.sparse:
+            return self.get_oldest_point()[0], self.get_newest_point()[0]
+        return self.history.slice(0, 1)['time'][0], self.history.tail(1)['time'][0]
+
+    def get_oldest_point(self):
+        # the oldest value that isn't NaN, looking at the oldest few first
+        n = 1 if not self.sparse else 64
+        while True:
+            head = self.history.slice(0, n)
+            found = np.flatnonzero(~np.isnan(head[self.field]))
+            if len(found):
+                record = head[found[0]]
+                return record['time'], record[self.field]
+            if len(head) < n:
+                raise IndexError("no data")
+            n *= 4
 
     def get_newest_point(self):
-        return self.time.view()[-1], self.values.view()[-1]
+        # the newest value that isn't NaN, looking at the newest few first
+        n = 1 if not self.sparse else 64
+        while True:
+            tail = self.history.tail(n)
+            found = np.flatnonzero(~np.isnan(tail[self.field]))
+            if len(found):
+                record = tail[found[-1]]
+                return record['time'], record[self.field]
+            if len(tail) < n:
+                raise IndexError("no data")
+            n *= 4
 
     def get_data(self):
-        return self.time.view(), self.values.view()
+        return self.query()
+
+    def query(self, t_start=None, t_end=None, max_points=None):
+        # (times, values) from t_start to t_end, None for no limit. The
+        # times are binary searched, and the frequencies are views of the
+        # history if they are within one chunk. With max_points, a longer
+        # span is downsampled to about that many points, keeping the min
+        # and max.
+        i = 0 if t_start is None else self.history.searchsorted(t_start)
+        j = len(self.history) if t_end is None else \
+            self.history.searchsorted(t_end, 'right')
+
+        if max_points and j - i > max_points:
+            first = self.history.total - len(self.history)
+            return self.pyramid.window(first + i, first + j, max_points)
+
+        # a view within a chunk, joined across them
+        records = self.history.slice(i, j)
+        if not self.sparse:
+            return records['time'], records[self.field]
+
+        has_value = ~np.isnan(records[self.field])
+        return records['time'][has_value], records[self.field][has_value]
 
     def transfer_to(self, append_method, pre_process_func=None):
         # not efficient, should use get_data or get_newest_point instead
+        times, values = self.get_data()
         if not pre_process_func:
-            for t, v in zip(self.time.view(), self.values.view()):
+            for t, v in zip(times, values):
                 append_method(t, v)
         else:
-            for t, v in zip(self.time.view(), self.values.view()):
+            for t, v in zip(times, values):
                 append_method(*pre_process_func(t, v))
-
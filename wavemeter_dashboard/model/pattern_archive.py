@@ -0,0 +1,271 @@
+import os
+import time
+import zlib
+import calendar
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+from wavemeter_dashboard.config import config
+from wavemeter_dashboard.model.channel_alert import ChannelAlertCode
+from wavemeter_dashboard.model.history_store import HistoryStore, _map, \
+    _open_for_append
+
+
+class PatternArchive:
+    # The interference patterns around the alerts of every channel, kept on
+    # disk. The newest pre_trigger patterns of each channel are held in
+    # memory, compressed. When one of the trigger alerts comes up or clears,
+    # they are written out together with the post_trigger patterns after
+    # it, and the alert goes in the index:
+    #
+    #     <root>/ch<num>/<yyyy-mm-dd>.pat   the frames, as they're written
+    #     <root>/ch<num>/index.bin          INDEX_DTYPE, one per alert
+    #
+    # A frame is a FRAME_DTYPE header and the pattern, as the differences
+    # between neighbouring points (wrapping around in uint16), deflated. The
+    # fringes are smooth, so the differences are small and compress well.
+
+    FRAME_DTYPE = np.dtype([
+        ('time', 'f8'),
+        ('wide', 'u1'),
+        ('length', 'u4'),  # of the pattern
+        ('size', 'u4'),  # of the compressed pattern after the header
+    ])
+
+    INDEX_DTYPE = np.dtype([
+        ('time', 'f8'),
+        ('code', 'i2'),  # ChannelAlertCode
+        ('cleared', 'u1'),
+        ('day', 'i4'),  # of the file with the first frame
+        ('offset', 'u8'),  # of the first frame in it
+    ])
+
+    DEFAULT_TRIGGERS = [
+        ChannelAlertCode.WAVEMETER_UNKNOWN_ERROR,
+        ChannelAlertCode.WAVEMETER_UNDER_EXPOSED,
+        ChannelAlertCode.WAVEMETER_OVER_EXPOSED,
+        ChannelAlertCode.WAVEMETER_NO_SIGNAL,
+        ChannelAlertCode.WAVEMETER_BAD_SIGNAL,
+        ChannelAlertCode.PID_ERROR_OUT_OF_BOUND_LASTING,
+        ChannelAlertCode.PID_DAC_RAILED,
+    ]
+
+    def __init__(self, root, pre_trigger=32, post_trigger=32, triggers=None):
+        self.root = root
+        self.pre_trigger = pre_trigger
+        self.post_trigger = post_trigger
+        self.triggers = set(self.DEFAULT_TRIGGERS if triggers is None
+                            else triggers)
+
+        self.lock = Lock()
+        self.channels = {}  # channel_num -> _ChannelArchive
+
+    def _channel_dir(self, channel_num):
+        return os.path.join(self.root, f"ch{channel_num}")
+
+    def _path(self, channel_num, day):
+        name = time.strftime("%Y-%m-%d",
+                             time.gmtime(day * HistoryStore.SECONDS_PER_DAY))
+        return os.path.join(self._channel_dir(channel_num), name + ".pat")
+
+    def _index_path(self, channel_num):
+        return os.path.join(self._channel_dir(channel_num), "index.bin")
+
+    def _channel(self, channel_num):
+        if channel_num not in self.channels:
+            os.makedirs(self._channel_dir(channel_num), exist_ok=True)
+            self.channels[channel_num] = _ChannelArchive(
+                self, channel_num, self.pre_trigger)
+        return self.channels[channel_num]
+
+    def add(self, channel_num, pattern, wide=False, t=None):
+        # a pattern just read, from the monitor thread
+        header = np.zeros(1, dtype=self.FRAME_DTYPE)
+        header['time'] = time.time() if t is None else t
+        header['wide'] = wide
+        header['length'] = len(pattern)
+        payload = compress_pattern(pattern)
+        header['size'] = len(payload)
+
+        with self.lock:
+            self._channel(channel_num).add(header.tobytes() + payload)
+
+    def on_alert(self, channel_num, code: ChannelAlertCode, cleared=False):
+        # connected to on_new_alert and on_alert_cleared (cleared=True). The
+        # alerts come again and again while they last, only the changes
+        # count.
+        if code not in self.triggers:
+            return
+
+        with self.lock:
+            self._channel(channel_num).trigger(code, cleared)
+
+    def close(self):
+        with self.lock:
+            for channel in self.channels.values():
+                channel.close()
+            self.channels.clear()
+
+    def events(self, channel_num, start=None, end=None):
+        # the index records between start and end, oldest first
+        index = _map(self._index_path(channel_num), self.INDEX_DTYPE)
+        lo = 0 if start is None else np.searchsorted(index['time'], start)
+        hi = len(index) if end is None else \
+            np.searchsorted(index['time'], end, 'right')
+        return index[lo:hi]
+
+    def iter_frames(self, channel_num, day=None, offset=0):
+        # (time, wide, pattern) from offset in the file of day on, going
+        # through the later days as well
+        if day is None:
+            days = self._days(channel_num)
+            day = days[0] if days else 0
+
+        for d in self._days(channel_num):
+            if d < day:
+                continue
+            try:
+                with open(self._path(channel_num, d), "rb") as f:
+                    f.seek(offset if d == day else 0)
+                    while True:
+                        header = f.read(self.FRAME_DTYPE.itemsize)
+                        if len(header) < self.FRAME_DTYPE.itemsize:
+                            break
+                        header = np.frombuffer(header, self.FRAME_DTYPE)[0]
+                        payload = f.read(int(header['size']))
+                        if len(payload) < header['size']:
+                            break  # the end of a crash
+                        yield (float(header['time']), bool(header['wide']),
+                               decompress_pattern(payload, header['length']))
+            except FileNotFoundError:
+                continue
+
+    def read_event(self, channel_num, event):
+        # the patterns before and after an index record
+        frames = []
+        after = 0
+        for frame in self.iter_frames(channel_num, int(event['day']),
+                                      int(event['offset'])):
+            if frame[0] > event['time']:
+                after += 1
+                if after > self.post_trigger:
+                    break
+            frames.append(frame)
+        return frames
+
+    def _days(self, channel_num):
+        try:
+            names = os.listdir(self._channel_dir(channel_num))
+        except FileNotFoundError:
+            return []
+
+        days = []
+        for name in names:
+            base, extension = os.path.splitext(name)
+            if extension != ".pat":
+                continue
+            try:
+                t = time.strptime(base, "%Y-%m-%d")
+            except ValueError:
+                continue
+            days.append(HistoryStore.day_of(calendar.timegm(t)))
+        return sorted(days)
+
+
+class _ChannelArchive:
+    def __init__(self, archive: PatternArchive, channel_num, pre_trigger):
+        self.archive = archive
+        self.channel_num = channel_num
+        # [frame, (day, offset) once written]
+        self.recent = deque(maxlen=pre_trigger)
+        self.post_left = 0  # frames still to write after a trigger
+        self.active = set()  # trigger alerts up
+
+        self.day = None
+        self.file = None
+        self.index, _ = _open_for_append(archive._index_path(channel_num),
+                                         PatternArchive.INDEX_DTYPE)
+
+    def _open(self):
+        # the file of today, positioned at its end
+        day = HistoryStore.day_of(time.time())
+        if day != self.day:
+            if self.file:
+                self.file.close()
+            self.file = open(self.archive._path(self.channel_num, day), "ab",
+                             buffering=0)
+            self.day = day
+        return day
+
+    def _write(self, item):
+        day = self._open()
+        item[1] = (day, self.file.tell())
+        self.file.write(item[0])
+
+    def add(self, frame):
+        item = [frame, None]
+        if self.post_left > 0:
+            self._write(item)
+            self.post_left -= 1
+        if self.recent.maxlen:
+            self.recent.append(item)
+
+    def trigger(self, code, cleared):
+        if cleared != (code in self.active):
+            return  # no change
+        if cleared:
+            self.active.discard(code)
+        else:
+            self.active.add(code)
+
+        # the ones written already are the oldest
+        for item in self.recent:
+            if item[1] is None:
+                self._write(item)
+        self.post_left = self.archive.post_trigger
+
+        if self.recent:
+            day, offset = self.recent[0][1]
+        else:
+            # from the next one on, after what's in today's file already
+            day = self._open()
+            offset = self.file.tell()
+
+        record = np.zeros(1, dtype=PatternArchive.INDEX_DTYPE)
+        record['time'] = time.time()
+        record['code'] = code.value
+        record['cleared'] = cleared
+        record['day'] = day
+        record['offset'] = offset
+        self.index.write(record.tobytes())
+
+    def close(self):
+        if self.file:
+            self.file.close()
+        self.index.close()
+
+
+def compress_pattern(pattern):
+    pattern = np.asarray(pattern, dtype=np.uint16)
+    return zlib.compress(np.diff(pattern, prepend=np.uint16(0)).tobytes(), 1)
+
+
+def decompress_pattern(payload, length):
+    differences = np.frombuffer(zlib.decompress(payload), np.uint16, int(length))
+    return np.cumsum(differences, dtype=np.uint16)
+
+
+def open_pattern_archive():
+    # the PatternArchive at "pattern_archive_path", None if not set
+    root = config.get('pattern_archive_path', None)
+    if not root:
+        return None
+
+    triggers = config.get('pattern_archive_triggers', None)
+    if triggers is not None:
+        triggers = [ChannelAlertCode[name] for name in triggers]
+    return PatternArchive(root, config.get('pattern_archive_pre_trigger', 32),
+                          config.get('pattern_archive_post_trigger', 32),
+                          triggers)
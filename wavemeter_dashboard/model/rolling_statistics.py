@@ -0,0 +1,162 @@
+import math
+import time
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+from wavemeter_dashboard.model.longterm_data import StructuredRing
+
+
+class RollingWindow:
+    # The statistics of the samples of the last `length` seconds, kept up to
+    # date as they come and go: the mean and the sum of squared deviations
+    # the Welford way, the min and max at the front of monotonic deques.
+    # Every sample is added and removed once, O(1) each on average.
+
+    def __init__(self, length):
+        self.length = length
+        self.samples = deque()  # (t, x)
+        self.minima = deque()  # (t, x), x increasing
+        self.maxima = deque()  # (t, x), x decreasing
+
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of (x - mean) ** 2
+
+    def add(self, t, x):
+        self.samples.append((t, x))
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+        while self.minima and self.minima[-1][1] >= x:
+            self.minima.pop()
+        self.minima.append((t, x))
+        while self.maxima and self.maxima[-1][1] <= x:
+            self.maxima.pop()
+        self.maxima.append((t, x))
+
+    def expire(self, now):
+        # drops the samples older than the window before now
+        oldest = now - self.length
+        while self.samples and self.samples[0][0] <= oldest:
+            _, x = self.samples.popleft()
+            self.n -= 1
+            if not self.n:
+                self.mean = self.m2 = 0.0
+                continue
+            d = x - self.mean
+            self.mean -= d / self.n
+            # can come out a hair below 0 after rounding
+            self.m2 = max(self.m2 - d * (x - self.mean), 0.0)
+
+        while self.minima and self.minima[0][0] <= oldest:
+            self.minima.popleft()
+        while self.maxima and self.maxima[0][0] <= oldest:
+            self.maxima.popleft()
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.n) if self.n else math.nan
+
+    @property
+    def rms(self):
+        return math.sqrt(self.mean ** 2 + self.m2 / self.n) if self.n else math.nan
+
+    @property
+    def min(self):
+        return self.minima[0][1] if self.minima else math.nan
+
+    @property
+    def max(self):
+        return self.maxima[0][1] if self.maxima else math.nan
+
+    @property
+    def peak_to_peak(self):
+        return self.max - self.min
+
+    def get(self, stat):
+        if stat == 'mean':
+            return self.mean if self.n else math.nan
+        return getattr(self, stat)
+
+
+class RollingStatistics:
+    # Rolling statistics of a ChannelHistory column (the error, normally)
+    # over windows of several lengths. update() takes in the records added
+    # since the last time, the windows end at the newest sample. A snapshot
+    # of every statistic is kept after each update, for the charts.
+    #
+    # update() runs in the thread adding the samples, the GUI reads at the
+    # same time, so both go through the lock. get() lets the windows move
+    # on to now, a channel that stopped getting samples runs empty.
+
+    STATS = ('mean', 'rms', 'std', 'min', 'max', 'peak_to_peak')
+    DEFAULT_WINDOWS = [10, 60, 600]
+
+    def __init__(self, history, field='error', windows=DEFAULT_WINDOWS,
+                 length=4096):
+        # windows: lengths in seconds
+        # length: snapshots kept
+        self.history = history
+        self.field = field
+        self.windows = [RollingWindow(w) for w in windows]
+        self.consumed = history.total  # records taken in
+
+        self.dtype = np.dtype([('time', 'f8')] + [
+            (self.column(i, stat), 'f8')
+            for i in range(len(self.windows)) for stat in self.STATS])
+        self.snapshots = StructuredRing(self.dtype, length)
+        self.lock = Lock()
+
+    @staticmethod
+    def column(window_index, stat):
+        return f"{stat}_{window_index}"
+
+    def update(self):
+        with self.lock:
+            self._update()
+
+    def _update(self):
+        total = self.history.total
+        # the ones already dropped from the history are lost
+        new = min(total - self.consumed, len(self.history))
+        self.consumed = total
+        if new <= 0 or not self.windows:
+            return
+
+        records = self.history.tail(new)
+        times = records['time']
+        values = records[self.field]
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return
+
+        for t, x in zip(times[valid].tolist(), values[valid].tolist()):
+            for window in self.windows:
+                window.add(t, x)
+
+        now = times[valid][-1]
+        snapshot = np.empty(1, dtype=self.dtype)
+        snapshot['time'] = now
+        for i, window in enumerate(self.windows):
+            window.expire(now)
+            for stat in self.STATS:
+                snapshot[self.column(i, stat)] = window.get(stat)
+        self.snapshots.extend(snapshot)
+
+    def get(self, window_index, stat, now=None):
+        # the value over the window before now (the current time if None)
+        with self.lock:
+            window = self.windows[window_index]
+            window.expire(time.time() if now is None else now)
+            return window.get(stat)
+
+    def get_data(self, window_index, stat):
+        # (times, values) of the snapshots, copied
+        with self.lock:
+            snapshots = self.snapshots.view()
+            return (snapshots['time'].copy(),
+                    snapshots[self.column(window_index, stat)].copy())
@@ -4,13 +4,14 @@ import random
 import numpy as np
 
 from PyQt5.QtGui import QColor
-from PyQt5.QtCore import QObject
+from PyQt5.QtCore import QObject, QTimer
 
 from .widgets.channel_alert_label import ChannelAlertLabel
 from .widgets.freq_wavelength_label import FreqWavelengthLabel
 from .widgets.thumbnail_line_chart import ThumbnailLineChart
 from .widgets.channel_name_widget import ChannelNameWidget
 from .widgets.color_strip import ColorStrip
+from .widgets.misc import ErrorStatisticsLabel
 from ..model.channel_alert import ChannelAlertAction
 from ..model.channel_model import ChannelModel
 from ..model.graphable_data_provider import GraphableDataKind
@@ -21,6 +22,7 @@ if TYPE_CHECKING:
 
 class ChannelView(QObject):
     long_term_time_window = 300
+    error_statistics_refresh_interval = 1000  # ms
 
     def __init__(self, dashboard: 'Dashboard', channel_model: ChannelModel, color_strip: ColorStrip):
         super().__init__(dashboard)
@@ -38,15 +40,22 @@ class ChannelView(QObject):
         self.freq_longterm = ThumbnailLineChart(self.dashboard)
         self.dac_longterm = ThumbnailLineChart(self.dashboard)
         self.alert_label = ChannelAlertLabel(self.dashboard, channel_model)
+        self.error_statistics_label = ErrorStatisticsLabel(self.dashboard)
 
         self.channel_name_widget.hide()
         self.freq_label.hide()
         self.freq_longterm.hide()
         self.dac_longterm.hide()
         self.alert_label.hide()
+        self.error_statistics_label.hide()
 
         self.bind_model(channel_model)
 
+        # the windows move on without new samples as well
+        self.error_statistics_timer = QTimer(self)
+        self.error_statistics_timer.timeout.connect(self.refresh_error_statistics)
+        self.error_statistics_timer.start(self.error_statistics_refresh_interval)
+
         self.channel_name_widget.on_set_clicked.connect(self.show_channel_setup)
         self.channel_name_widget.on_mon_toggled.connect(self.toggle_monitor_state)
 
@@ -94,6 +103,8 @@ class ChannelView(QObject):
 
     def on_freq_changed(self):
         self.freq_label.frequency = self.channel_model.frequency
+        self.channel_name_widget.show_sample_rate(
+            self.channel_model.channel_num, self.channel_model.sample_rate)
         now = time.time()
         self.freq_longterm.set_x_display_range(
             now - self.long_term_time_window, now)
@@ -103,16 +114,44 @@ class ChannelView(QObject):
         # self.freq_longterm.update_longterm_data(
         #     self.channel_model.freq_longterm_data)
 
+        # x is when the wavemeter measured it
+        self.dashboard.display_profiler.record(
+            "display", self.channel_model.channel_num, time.time() - x)
+
+        self.refresh_error_statistics()
+
+    def refresh_error_statistics(self):
+        if self.error_statistics_label.isVisible():
+            self.update_error_statistics()
+
+    def update_error_statistics(self):
+        # over the windows up to now, "---" if no sample is left in one
+        statistics = self.channel_model.error_statistics
+        if not self.channel_model.freq_setpoint:
+            self.error_statistics_label.setText("")
+            return
+
+        lines = []
+        for i, window in enumerate(statistics.windows):
+            rms = statistics.get(i, 'rms')
+            peak_to_peak = statistics.get(i, 'peak_to_peak')
+            if np.isnan(rms):
+                lines.append(f"{window.length:g} S  ---")
+                continue
+            lines.append(f"{window.length:g} S  {rms / 1e6:.3f}  "
+                         f"{peak_to_peak / 1e6:.3f} MHZ")
+        self.error_statistics_label.setText("\n".join(lines))
+
     def on_pattern_changed(self):
-        max_amp = np.max(self.channel_model.wide_pattern_data)
+        pattern = self.channel_model.wide_pattern_data
+        max_amp = np.max(pattern)
         if max_amp > self.dashboard.pattern_max_amp:
             self.dashboard.pattern_max_amp = max_amp
         if self.pattern.isVisible():
             # don't do futile work
             # copy this array really takes sometime!
             # TODO: consider downsampling here
-            self.pattern.update_data(range(len(self.channel_model.wide_pattern_data)),
-                                     self.channel_model.wide_pattern_data)
+            self.pattern.update_data(range(len(pattern)), pattern)
 
     def on_pid_changed(self):
         now = time.time()
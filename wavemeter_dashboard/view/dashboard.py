@@ -1,19 +1,23 @@
 from enum import Enum
 from typing import List, Dict
 
-from PyQt5.QtWidgets import QWidget, QLabel, QApplication
+from PyQt5.QtWidgets import QWidget, QLabel, QApplication, QPushButton
 from PyQt5.QtCore import pyqtSignal
 from .ui.ui_dashboard import Ui_dashboard
 from .widgets.misc import *
 from .widgets.add_channel_dialog import AddChannelDialog
+from .widgets.latency_report_dialog import LatencyReportDialog
+from .widgets.export_history_dialog import ExportHistoryDialog
 from .widgets.color_strip import ColorStrip
 from .channel_view import ChannelView
 from wavemeter_dashboard.model.channel_model import ChannelModel
 from wavemeter_dashboard.config import config
 from ..controller.alert_tracker import AlertTracker
 from ..controller.monitor import Monitor
+from ..controller.latency_profiler import LatencyProfiler
 from ..model.channel_alert import ChannelAlertCode
 from ..model.graphable_data_provider import GraphableDataKind
+from ..model.rolling_statistics import RollingStatistics
 
 
 class ColumnType(Enum):
@@ -23,6 +27,7 @@ class ColumnType(Enum):
     FREQ_LONGTERM = 4
     PID_OUTPUT_LONGTERM = 5
     STATUS = 6
+    ERROR_STATISTICS = 7
 
 
 column_name = {
@@ -31,6 +36,7 @@ column_name = {
     ColumnType.PATTERN: 'INTERFEROMETER',
     ColumnType.FREQ_LONGTERM: 'FREQ LONGTERM',
     ColumnType.PID_OUTPUT_LONGTERM: 'FDBK LONGTERM',
+    ColumnType.ERROR_STATISTICS: 'ERROR RMS / P-P',
     ColumnType.STATUS: 'STATUS'
 }
 
@@ -42,7 +48,8 @@ class Dashboard(QWidget):
         ColumnType.PATTERN: 2,
         ColumnType.FREQ_LONGTERM: 3,
         ColumnType.PID_OUTPUT_LONGTERM: 4,
-        ColumnType.STATUS: 5
+        ColumnType.ERROR_STATISTICS: 5,
+        ColumnType.STATUS: 6
     }
 
     row_height = 75
@@ -63,12 +70,32 @@ class Dashboard(QWidget):
 
         self.pattern_max_amp = 0
 
+        # how old the frequencies are by the time they are drawn, recorded
+        # by the ChannelViews
+        self.display_profiler = LatencyProfiler(config.get('latency_profiling', False))
+
         self.setAutoFillBackground(True)
         self.ui = Ui_dashboard()
         self.ui.setupUi(self)
 
         self.ui.monBtn.setEnabled(False)
 
+        # not in the .ui file, only useful with "latency_profiling" on
+        self.latencyBtn = QPushButton("TIMING", self)
+        self.ui.horizontalLayout_3.insertWidget(
+            self.ui.horizontalLayout_3.indexOf(self.ui.saveSettingsBtn),
+            self.latencyBtn)
+        self.latencyBtn.setVisible(config.get('latency_profiling', False))
+
+        self.exportBtn = QPushButton("EXPORT", self)
+        self.ui.horizontalLayout_3.insertWidget(
+            self.ui.horizontalLayout_3.indexOf(self.ui.saveSettingsBtn),
+            self.exportBtn)
+
+        # the column is left out without "error_statistics_windows"
+        self.show_error_statistics = bool(config.get(
+            'error_statistics_windows', RollingStatistics.DEFAULT_WINDOWS))
+
         self.ui.channelGridLayout.setVerticalSpacing(self.vertical_spacing)
         self.ui.channelGridLayout.setHorizontalSpacing(self.horizontal_spacing)
 
@@ -81,6 +108,8 @@ class Dashboard(QWidget):
         self.ui.monBtn.clicked.connect(self.on_monitor_toggled)
         self.ui.saveSettingsBtn.clicked.connect(self.save_channel_settings)
         self.ui.closeWindowButton.clicked.connect(QApplication.quit)
+        self.latencyBtn.clicked.connect(self.on_latency_clicked)
+        self.exportBtn.clicked.connect(self.on_export_clicked)
 
         self.center_floating_widget = None
 
@@ -91,6 +120,9 @@ class Dashboard(QWidget):
 
     def _init_table_header(self):
         for col, num in self.column_num_map.items():
+            if col == ColumnType.ERROR_STATISTICS and \
+                    not self.show_error_statistics:
+                continue
             if column_name[col]:
                 label = TableHeaderLabel(self)
             else:
@@ -163,6 +195,8 @@ class Dashboard(QWidget):
                 (ColumnType.PATTERN, view.pattern, True, True),
                 (ColumnType.FREQ_LONGTERM, view.freq_longterm, True, True),
                 (ColumnType.PID_OUTPUT_LONGTERM, view.dac_longterm, True, True),
+                (ColumnType.ERROR_STATISTICS, view.error_statistics_label,
+                 self.show_error_statistics, True),
                 (ColumnType.STATUS, view.alert_label, True, False),
             ]:
                 self.ui.channelGridLayout.addWidget(
@@ -228,6 +262,21 @@ class Dashboard(QWidget):
         dialog.on_remove_channel.connect(self.remove_channel)
         dialog.show()
 
+    def on_latency_clicked(self):
+        dialog = LatencyReportDialog(self, self.monitor, self.display_profiler)
+        self.latencyBtn.setEnabled(False)
+
+        dialog.on_close.connect(lambda status: self.latencyBtn.setEnabled(True))
+        dialog.show()
+
+    def on_export_clicked(self):
+        dialog = ExportHistoryDialog(
+            self, [chan.channel_model for chan in self.channels])
+        self.exportBtn.setEnabled(False)
+
+        dialog.on_close.connect(lambda status: self.exportBtn.setEnabled(True))
+        dialog.show()
+
     def display_message_box(self, title, message):
         pass
 
@@ -3,6 +3,8 @@ from PyQt5.QtWidgets import QMainWindow, QScrollArea
 from wavemeter_dashboard.config import config
 from wavemeter_dashboard.controller.alert_tracker import AlertTracker
 from wavemeter_dashboard.controller.monitor import Monitor
+from wavemeter_dashboard.controller.session import (
+    SessionReplay, open_session_recorder)
 from wavemeter_dashboard.model.channel_model import ChannelModel
 from wavemeter_dashboard.view.dashboard import Dashboard
 from wavemeter_dashboard.view.single_channel_display import SingleChannelDisplay
@@ -27,6 +29,12 @@ class MainWindow(QMainWindow):
         for chan in channel_configs:
             self.channels.append(ChannelModel.from_settings_dict(chan))
 
+        # everything the channels get is recorded, if "session_record_path"
+        # is set
+        self.session_recorder = open_session_recorder()
+        self.update_session_recorder()
+        self.session_replay = None
+
     def switch_to_dashboard(self):
         self.dashboard = Dashboard(self, self.monitor, self.alert_tracker, self.channels)
         self.dashboard.on_switch_to_single_channel_display_clicked.connect(
@@ -41,6 +49,26 @@ class MainWindow(QMainWindow):
     def update_channels_from_dashboard(self):
         if self.dashboard:
             self.channels = [channel_view.channel_model for channel_view in self.dashboard.channels]
+            self.update_session_recorder()
+
+    def update_session_recorder(self):
+        # the channels recorded follow the dashboard
+        if not self.session_recorder:
+            return
+
+        nums = [channel.channel_num for channel in self.channels]
+        for num in list(self.session_recorder.channels.keys()):
+            if num not in nums:
+                self.session_recorder.remove_channel(num)
+        for channel in self.channels:
+            self.session_recorder.add_channel(channel)
+
+    def start_replay(self, path, speed=1.0):
+        # plays a recorded session on the channels instead of the monitor
+        self.session_replay = SessionReplay(
+            path, {channel.channel_num: channel for channel in self.channels},
+            speed)
+        self.session_replay.start()
 
     def switch_to_single_channel_display(self, channel, default_graph):
         self.single_channel_display = SingleChannelDisplay(
@@ -33,10 +33,27 @@ class Graph(QObject):
 
         self.parent.add_plot_item(self.plot_item)
         self.data_provider.new_data_signal.connect(self.update)
+        # zoomed in, the details are fetched for the new range
+        self.plot_item.sigXRangeChanged.connect(self.on_x_range_changed)
 
     def update(self):
-        xs, ys = self.data_provider.get_data()
-        self.plot.setData(xs, ys)
+        # only what can be seen, at about one point per pixel
+        view_box = self.plot_item.getViewBox()
+        x_min = x_max = None
+        if not view_box.autoRangeEnabled()[0]:
+            # the plot is scaled as a whole, x included
+            scale = self.data_provider.y_axis_scale
+            x_min, x_max = (x / scale for x in view_box.viewRange()[0])
+
+        data = self.data_provider.get_data_for_display(
+            x_min, x_max, max(int(view_box.width()), 100))
+        if data is None:
+            return
+        self.plot.setData(*data)
+
+    def on_x_range_changed(self):
+        if not self.plot_item.getViewBox().autoRangeEnabled()[0]:
+            self.update()
 
     def remove(self):
         self.parent.remove_plot_item(self.plot_item)
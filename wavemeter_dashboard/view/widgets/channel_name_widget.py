@@ -57,6 +57,9 @@ class ChannelNameWidget(QWidget):
         self.ui.channNameLabel.change_name(channel_name, channel_num)
         self.ui.channNameLabel.change_background_color(color)
 
+    def show_sample_rate(self, channel_num, sample_rate):
+        self.ui.channNameLabel.show_sample_rate(channel_num, sample_rate)
+
     def btn_set_enable(self, enabled):
         self.ui.setBtn.setEnabled(enabled)
 
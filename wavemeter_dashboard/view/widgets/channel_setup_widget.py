@@ -4,6 +4,7 @@ from PyQt5.QtCore import pyqtSignal
 
 from ..ui.ui_channel_setup import Ui_channelSetup
 from ...controller.monitor import Monitor
+from ...controller.devices import get_channel_range
 from ...model.channel_model import ChannelModel
 from wavemeter_dashboard.util import convert_freq_for_forms, convert_freq_to_number
 
@@ -13,13 +14,13 @@ class ChannelSetupInvalidInputException(Exception):
 
 
 class ChannelSetupWidget(QWidget):
-    channel_range = (1, 16)
     _on_exposure_params_ready = pyqtSignal(int, int)
 
     def __init__(self, parent, monitor: Monitor = None, channel: ChannelModel = None):
         super().__init__(parent)
         self.ui = Ui_channelSetup()
         self.ui.setupUi(self)
+        self.channel_range = get_channel_range()
         self.monitor = monitor
         self.channel_model = channel
         self.ui.autoExpoBtn.clicked.connect(self.on_auto_clicked)
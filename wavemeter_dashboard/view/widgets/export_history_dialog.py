@@ -0,0 +1,128 @@
+from threading import Thread, Event
+from typing import TYPE_CHECKING, List
+
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, \
+    QGridLayout, QLineEdit, QFileDialog
+from PyQt5.QtCore import pyqtSignal
+
+from wavemeter_dashboard.view.widgets.dialog import Dialog, DialogStatus
+from wavemeter_dashboard.view.widgets.misc import ToggleButton
+from wavemeter_dashboard.model.channel_model import ChannelModel
+from wavemeter_dashboard.model.history_store import open_history_store
+from wavemeter_dashboard.model.history_export import export_history, \
+    parse_time, HistoryExportException
+
+if TYPE_CHECKING:
+    from wavemeter_dashboard.view.dashboard import Dashboard
+
+
+class ExportHistoryDialog(Dialog):
+    # writes the history of the chosen channels to a file, in a thread of
+    # its own so neither the screen nor the monitor waits for it
+    title = "EXPORT HISTORY"
+
+    # emitted from the export thread
+    on_progress = pyqtSignal(int)
+    on_finished = pyqtSignal(int, str)
+
+    def __init__(self, parent: 'Dashboard', channels: List[ChannelModel]):
+        self.channels = channels
+        self.thread = None
+        self.stop_event = Event()
+        super().__init__(parent)
+
+    def init_widget(self):
+        self.widget = QWidget(self)
+        layout = QVBoxLayout(self.widget)
+
+        buttons = QHBoxLayout()
+        self.channel_btns = {}
+        for channel in self.channels:
+            btn = ToggleButton(self.widget)
+            btn.setText(f"CH{channel.channel_num}")
+            btn.setChecked(True)
+            buttons.addWidget(btn)
+            self.channel_btns[channel.channel_num] = btn
+        buttons.addStretch()
+        layout.addLayout(buttons)
+
+        times = QGridLayout()
+        self.start_edit = QLineEdit(self.widget)
+        self.end_edit = QLineEdit(self.widget)
+        for row, (text, edit) in enumerate([("FROM", self.start_edit),
+                                            ("TO", self.end_edit)]):
+            edit.setPlaceholderText("YYYY-MM-DD HH:MM")
+            times.addWidget(QLabel(text, self.widget), row, 0)
+            times.addWidget(edit, row, 1)
+        layout.addLayout(times)
+
+        self.status_label = QLabel(self.widget)
+        layout.addWidget(self.status_label)
+
+        self.set_ok_button_text("EXPORT")
+        self.ui.applyBtn.clicked.connect(self.on_export_clicked)
+        self.on_progress.connect(self.on_export_progress)
+        self.on_finished.connect(self.on_export_finished)
+
+        return self.widget
+
+    def on_export_clicked(self):
+        try:
+            start = parse_time(self.start_edit.text())
+            end = parse_time(self.end_edit.text())
+        except HistoryExportException as e:
+            self.display_error(str(e))
+            return
+
+        channels = [num for num, btn in self.channel_btns.items()
+                    if btn.isChecked()]
+        if not channels:
+            self.display_error("No channel selected.")
+            return
+
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export", "history.csv",
+            "CSV (*.csv);;Parquet (*.parquet);;HDF5 (*.h5)")
+        if not path:
+            return
+
+        histories = {channel.channel_num: channel.history
+                     for channel in self.channels}
+        self.ui.applyBtn.setEnabled(False)
+        self.status_label.setText("EXPORTING")
+        self.thread = Thread(name="HistoryExport", target=self._export,
+                             args=(path, channels, start, end, histories),
+                             daemon=True)
+        self.thread.start()
+
+    def _export(self, path, channels, start, end, histories):
+        # in the export thread
+        store = open_history_store(read_only=True)
+        try:
+            count = export_history(
+                path, channels, start, end, store, histories, self.stop_event,
+                lambda num, n: self.on_progress.emit(n))
+            self.on_finished.emit(count, "")
+        except (HistoryExportException, OSError) as e:
+            self.on_finished.emit(0, str(e))
+        finally:
+            if store:
+                store.close()
+
+    def on_export_progress(self, count):
+        self.status_label.setText(f"EXPORTING: {count} SAMPLES")
+
+    def on_export_finished(self, count, error):
+        self.ui.applyBtn.setEnabled(True)
+        if error:
+            self.status_label.setText("")
+            self.display_error(error)
+            return
+
+        self.status_label.setText(f"EXPORTED {count} SAMPLES")
+        self.final_status = DialogStatus.OK
+
+    def close(self):
+        # an export still running stops after its chunk
+        self.stop_event.set()
+        super().close()
@@ -0,0 +1,94 @@
+from typing import TYPE_CHECKING
+
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, \
+    QPushButton, QFileDialog
+from PyQt5.QtCore import QTimer
+
+from wavemeter_dashboard.view.widgets.dialog import Dialog, DialogStatus
+from wavemeter_dashboard.view.widgets.misc import ToggleButton
+from wavemeter_dashboard.controller.monitor import Monitor
+from wavemeter_dashboard.controller.latency_profiler import LatencyProfiler
+
+if TYPE_CHECKING:
+    from wavemeter_dashboard.view.dashboard import Dashboard
+
+
+class LatencyReportDialog(Dialog):
+    # live view of where Monitor spends the sweep time
+    title = "SWEEP TIME"
+
+    refresh_interval = 1000  # ms
+
+    def __init__(self, parent: 'Dashboard', monitor: Monitor,
+                 display_profiler: LatencyProfiler = None):
+        # display_profiler: what the dashboard records, shown below
+        self.monitor = monitor
+        self.display_profiler = display_profiler
+        super().__init__(parent)
+
+    def init_widget(self):
+        self.widget = QWidget(self)
+        layout = QVBoxLayout(self.widget)
+
+        self.report_label = QLabel(self.widget)
+        layout.addWidget(self.report_label)
+
+        buttons = QHBoxLayout()
+        self.per_channel_btn = ToggleButton(self.widget)
+        self.per_channel_btn.setText("PER CHANNEL")
+        self.per_channel_btn.clicked.connect(self.refresh)
+        buttons.addWidget(self.per_channel_btn)
+
+        self.reset_btn = QPushButton("RESET", self.widget)
+        self.reset_btn.clicked.connect(self.on_reset_clicked)
+        buttons.addWidget(self.reset_btn)
+        buttons.addStretch()
+        layout.addLayout(buttons)
+
+        self.set_ok_button_text("EXPORT")
+        self.ui.applyBtn.clicked.connect(self.on_export_clicked)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(self.refresh_interval)
+        self.refresh()
+
+        return self.widget
+
+    def get_report(self, fmt="text"):
+        per_channel = self.per_channel_btn.isChecked()
+        report = self.monitor.get_latency_report(fmt, per_channel)
+        if not self.display_profiler:
+            return report
+
+        display = self.display_profiler.report(fmt, per_channel)
+        if fmt == "csv":
+            # same columns, without the header again
+            return report + display.split("\n", 1)[1]
+        return f"{report}\n\nON SCREEN\n{display}"
+
+    def refresh(self):
+        self.report_label.setText(self.get_report())
+        self.adjustSize()
+
+    def on_reset_clicked(self):
+        self.monitor.reset_latency_profile()
+        if self.display_profiler:
+            self.display_profiler.reset()
+        self.refresh()
+
+    def on_export_clicked(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export", "latency_report.csv", "CSV (*.csv);;Text (*.txt)")
+        if not path:
+            return
+
+        fmt = "csv" if path.endswith(".csv") else "text"
+        with open(path, "w") as f:
+            f.write(self.get_report(fmt))
+
+        self.final_status = DialogStatus.OK
+
+    def close(self):
+        self.timer.stop()
+        super().close()
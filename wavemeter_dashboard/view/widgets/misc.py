@@ -44,10 +44,18 @@ class ChannelNameLabel(FlipLabel):
         self.front = channel_name
         self.back = f"#{channel_num}"
 
+    def show_sample_rate(self, channel_num, sample_rate):
+        # on the back, after the number
+        self.back = f"#{channel_num}  {sample_rate:.1f}/S"
+
     def change_background_color(self, color):
         self.setStyleSheet(f"background: rgb({color.red()}, {color.green()}, {color.blue()})")
 
 
+class ErrorStatisticsLabel(QLabel):
+    pass
+
+
 class DialogTitleLabel(QLabel):
     def __init__(self, parent):
         super().__init__(parent)
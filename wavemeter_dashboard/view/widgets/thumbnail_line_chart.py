@@ -58,6 +58,10 @@ class ThumbnailLineChart(QChartView):
             # remove first point
             self.series.remove(0)
 
+        # nor keep what has scrolled out of the time window
+        while self.series.count() and self.series.at(0).x() < self.x_axis.min():
+            self.series.remove(0)
+
         self.series.append(x, y)
 
         self._chart.addSeries(self.series)